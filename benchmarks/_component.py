@@ -0,0 +1,51 @@
+"""基准脚本共用：不经过组件__init__（依赖Home Assistant）直接加载组件模块"""
+import importlib
+import importlib.util
+import os
+import struct
+import sys
+import types
+
+COMPONENT_DIR = os.path.normpath(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    os.pardir, "custom_components", "xiaozhi_ha_bridge",
+))
+PACKAGE = "xiaozhi_ha_bridge_bench"
+
+
+def load(name):
+    """加载组件子模块（支持模块内的相对导入）"""
+    if PACKAGE not in sys.modules:
+        package = types.ModuleType(PACKAGE)
+        package.__path__ = [COMPONENT_DIR]
+        sys.modules[PACKAGE] = package
+    return importlib.import_module(f"{PACKAGE}.{name}")
+
+
+def load_package():
+    """加载组件包本身（会执行__init__，需先安装Home Assistant桩模块）"""
+    spec = importlib.util.spec_from_file_location(
+        PACKAGE, os.path.join(COMPONENT_DIR, "__init__.py"),
+        submodule_search_locations=[COMPONENT_DIR],
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def read_frames(path):
+    """读取XZT1格式（与TTS磁盘缓存相同）的Opus帧文件"""
+    with open(path, "rb") as file:
+        data = file.read()
+    magic, count = struct.unpack_from("<4sI", data, 0)
+    if magic != b"XZT1":
+        raise SystemExit(f"不是XZT1帧文件: {path}")
+    offset = 8
+    frames = []
+    for _ in range(count):
+        (length,) = struct.unpack_from("<H", data, offset)
+        offset += 2
+        frames.append(data[offset:offset + length])
+        offset += length
+    return frames
@@ -0,0 +1,258 @@
+"""基准脚本共用：Home Assistant桩模块
+
+只实现组件在WebSocket路径上用到的接口，使ws_handler可以脱离HA，
+在独立的aiohttp应用中运行。pipeline桩按可配置的各阶段延迟依次产生事件，
+用于衡量桥接自身（而非STT/LLM/TTS）的开销。
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import types
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+
+# 各阶段的模拟耗时（秒），由基准脚本按参数设置
+TIMING = {"stt": 0.0, "intent": 0.0, "tts": 0.0}
+STT_TEXT = "打开客厅灯"
+REPLY = "好的，已为你打开客厅灯"
+
+
+class IntentResponseType(str, Enum):
+    ACTION_DONE = "action_done"
+    QUERY_ANSWER = "query_answer"
+    ERROR = "error"
+
+
+class IntentError(Exception):
+    pass
+
+
+class PipelineStage(str, Enum):
+    STT = "stt"
+    INTENT = "intent"
+    TTS = "tts"
+
+
+class AudioFormats(str, Enum):
+    WAV = "wav"
+    OPUS = "ogg"
+
+
+class AudioCodecs(str, Enum):
+    PCM = "pcm"
+    OPUS = "opus"
+
+
+class AudioBitRates(int, Enum):
+    BITRATE_16 = 16
+
+
+class AudioSampleRates(int, Enum):
+    SAMPLERATE_16000 = 16000
+
+
+class AudioChannels(int, Enum):
+    CHANNEL_MONO = 1
+
+
+class SpeechMetadata:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class _Event:
+    __slots__ = ("type", "data")
+
+    def __init__(self, event_type, data):
+        self.type = event_type
+        self.data = data
+
+
+class StubRunner:
+    """模拟pipeline：收音频、结束后依次产生stt/intent/tts/run-end事件"""
+
+    stt_binary_handler_id = 1
+
+    def __init__(self, event_callback, end_stage):
+        self._emit = lambda event_type, data=None: event_callback(_Event(event_type, data or {}))
+        self._end_stage = end_stage
+        self._task = None
+        self.frames = 0
+        self.bytes = 0
+
+    async def receive_audio(self, chunk):
+        self.frames += 1
+        self.bytes += len(chunk)
+
+    async def end_stream(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._finish())
+
+    async def abort(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _finish(self):
+        await asyncio.sleep(TIMING["stt"])
+        self._emit("stt-end", {"stt_output": {"text": STT_TEXT}})
+        if self._end_stage == PipelineStage.STT:
+            self._emit("run-end")
+            return
+        self._emit("intent-start", {"intent_input": STT_TEXT})
+        await asyncio.sleep(TIMING["intent"])
+        self._emit("intent-end", {
+            "intent_output": {"response": {"speech": {"plain": {"speech": REPLY}}}}
+        })
+        if self._end_stage != PipelineStage.INTENT:
+            self._emit("tts-start", {"tts_input": REPLY})
+            await asyncio.sleep(TIMING["tts"])
+            self._emit("tts-end", {"tts_output": {}})
+        self._emit("run-end")
+
+
+async def async_pipeline_from_audio_stream(hass, *, event_callback, end_stage=None, **kwargs):
+    event_callback(_Event("stt-start", {"engine": "stt.stub", "metadata": {}}))
+    return StubRunner(event_callback, end_stage)
+
+
+def async_get_pipeline(hass, pipeline_id=None):
+    return types.SimpleNamespace(
+        id=pipeline_id or "stub", name="stub",
+        stt_engine="stt.stub", stt_language="zh-CN",
+        tts_engine="tts.stub", tts_language="zh-CN", tts_voice=None,
+    )
+
+
+class StubServices:
+    def __init__(self):
+        self.calls = 0
+        self.registered = {}
+
+    def has_service(self, domain, service):
+        return (domain, service) in self.registered
+
+    def async_register(self, domain, service, handler, schema=None, supports_response=None):
+        self.registered[(domain, service)] = handler
+
+    def async_remove(self, domain, service):
+        self.registered.pop((domain, service), None)
+
+    async def async_call(self, domain, service, service_data=None, **kwargs):
+        self.calls += 1
+
+
+class StubRegistry:
+    """空的实体/设备/区域注册表"""
+
+    def __init__(self):
+        self.entities = {}
+
+    def async_get(self, item_id):
+        return None
+
+    def async_get_device(self, identifiers=None, connections=None):
+        return None
+
+    def async_list_areas(self):
+        return []
+
+
+_REGISTRY = StubRegistry()
+
+
+class FakeHass:
+    """ws_handler所需的最小hass对象"""
+
+    def __init__(self, app):
+        self.data = {}
+        self.http = types.SimpleNamespace(app=app)
+        self.services = StubServices()
+        self.bus = types.SimpleNamespace(async_listen=lambda event_type, listener: lambda: None)
+        self.states = types.SimpleNamespace(async_all=lambda: [], get=lambda entity_id: None)
+        config_dir = tempfile.mkdtemp(prefix="xiaozhi_bench_")
+        self.config = types.SimpleNamespace(path=lambda *parts: os.path.join(config_dir, *parts))
+        self.config_entries = types.SimpleNamespace(
+            async_forward_entry_setups=_noop_async,
+            async_unload_platforms=_noop_async,
+            async_reload=_noop_async,
+        )
+        self._executor = ThreadPoolExecutor(max_workers=4)
+        self._tasks = set()
+
+    def async_create_background_task(self, target, name, eager_start=False):
+        task = asyncio.get_running_loop().create_task(target, name=name)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def async_add_executor_job(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+
+class FakeEntry:
+    def __init__(self, options=None, entry_id="bench"):
+        self.entry_id = entry_id
+        self.title = "bench"
+        self.data = {}
+        self.options = options or {}
+        self._on_unload = []
+        self.setup_lock = asyncio.Lock()
+
+    def add_update_listener(self, listener):
+        return lambda: None
+
+    def async_on_unload(self, func):
+        self._on_unload.append(func)
+
+
+async def _noop_async(*args, **kwargs):
+    return True
+
+
+def _module(name, **attrs):
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    sys.modules[name] = module
+    parent, _, child = name.rpartition(".")
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
+
+
+def install():
+    """将桩模块注册为homeassistant.*（已安装真实HA时也会被覆盖，仅用于基准进程）"""
+    _module("homeassistant")
+    _module("homeassistant.core", HomeAssistant=FakeHass, Context=lambda **kw: None,
+            callback=lambda func: func, ServiceCall=object,
+            SupportsResponse=types.SimpleNamespace(NONE="none", OPTIONAL="optional", ONLY="only"))
+    _module("homeassistant.const", CONF_NAME="name")
+    _module("homeassistant.config_entries", ConfigEntry=FakeEntry)
+    _module("homeassistant.helpers")
+    _module("homeassistant.helpers.storage", STORAGE_DIR=".storage")
+    _module("homeassistant.helpers.intent", IntentResponseType=IntentResponseType, IntentError=IntentError)
+    _module("homeassistant.helpers.config_validation", string=str,
+            ensure_list=lambda value: value if isinstance(value, list) else [value])
+    for registry in ("entity", "device", "area"):
+        _module(f"homeassistant.helpers.{registry}_registry",
+                async_get=lambda hass: _REGISTRY,
+                **{f"EVENT_{registry.upper()}_REGISTRY_UPDATED": f"{registry}_registry_updated"})
+    _module("homeassistant.components")
+    _module(
+        "homeassistant.components.assist_pipeline",
+        async_pipeline_from_audio_stream=async_pipeline_from_audio_stream,
+        async_get_pipeline=async_get_pipeline,
+        PipelineStage=PipelineStage,
+        SpeechMetadata=SpeechMetadata,
+        AudioFormats=AudioFormats,
+        AudioCodecs=AudioCodecs,
+        AudioBitRates=AudioBitRates,
+        AudioSampleRates=AudioSampleRates,
+        AudioChannels=AudioChannels,
+    )
+    _module("homeassistant.components.stt", async_get_speech_to_text_engine=lambda hass, engine_id: None)
+    _module("homeassistant.components.tts", get_engine_instance=lambda hass, engine_id: None)
+    _module("homeassistant.components.conversation")
+    _module("homeassistant.components.http", HomeAssistantView=object)
+    _module("homeassistant.components.http.auth", async_sign_path=lambda *args, **kwargs: "")
+    _module("homeassistant.components.http.const", KEY_AUTHENTICATED="ha_authenticated")
@@ -0,0 +1,92 @@
+"""音频帧解析微基准：对比bytes切片、memoryview切片与framing.split_frame的内存分配
+
+用法:
+    python benchmarks/bench_audio_framing.py [--streams 100] [--seconds 5] [--frame-bytes 120]
+
+模拟N个终端各以60ms间隔发送Opus帧（1字节handler_id + 负载），
+统计每秒音频帧解析产生的分配次数与分配字节数。实际Opus上行帧约40~200字节，
+这一范围内memoryview切片的分配字节数与单帧耗时都高于直接复制，split_frame因此直接切片。
+"""
+import argparse
+import os
+import time
+import tracemalloc
+from collections import deque
+
+from _component import load
+
+FRAME_DURATION_MS = 60
+
+framing = load("framing")
+
+
+def bytes_split(data):
+    """bytes切片：复制负载"""
+    return data[0], data[1:]
+
+
+def memoryview_split(data):
+    """始终使用memoryview切片"""
+    return data[0], memoryview(data)[1:]
+
+
+def timed(split, frames):
+    """不开启tracemalloc时的单帧解析耗时（秒）"""
+    start = time.perf_counter()
+    for data in frames:
+        split(data)
+    return (time.perf_counter() - start) / len(frames)
+
+
+def run(split, frames, queue_depth):
+    """解析全部帧并保留最近queue_depth个负载（模拟音频队列），返回分配统计"""
+    retained = deque(maxlen=queue_depth)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for data in frames:
+        _handler_id, payload = split(data)
+        retained.append(payload)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    # 只统计解析函数所在文件产生的分配
+    filters = [tracemalloc.Filter(True, __file__), tracemalloc.Filter(True, framing.__file__)]
+    diff = after.filter_traces(filters).compare_to(before.filter_traces(filters), "filename")
+    blocks = sum(stat.count_diff for stat in diff)
+    size = sum(stat.size_diff for stat in diff)
+    return blocks, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=100)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--frame-bytes", type=int, default=120, help="Opus负载字节数")
+    args = parser.parse_args()
+
+    frames_per_stream = int(args.seconds * 1000 / FRAME_DURATION_MS)
+    total = frames_per_stream * args.streams
+    payload = os.urandom(args.frame_bytes)
+    # 每帧都是独立的bytes对象，与aiohttp每条消息分配一次一致
+    frames = [bytes((1,)) + payload for _ in range(total)]
+    # 保留全部负载，使分配在快照中可见
+    queue_depth = total
+
+    print(f"终端数: {args.streams}, 时长: {args.seconds}s, 帧数: {total}, 负载: {args.frame_bytes}B")
+    variants = (
+        ("bytes切片", bytes_split),
+        ("memoryview切片", memoryview_split),
+        ("split_frame", framing.split_frame),
+    )
+    for name, split in variants:
+        blocks, size = run(split, frames, queue_depth)
+        per_frame = timed(split, frames)
+        print(
+            f"{name:<14} 分配次数/秒: {blocks / args.seconds:>10.0f}  "
+            f"分配字节/秒: {size / args.seconds:>12.0f}  "
+            f"单帧耗时: {per_frame * 1e9:>7.0f} ns"
+        )
+
+
+if __name__ == "__main__":
+    main()
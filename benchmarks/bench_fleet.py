@@ -0,0 +1,263 @@
+"""模拟终端集群压测：在本地aiohttp应用中运行ws_handler，驱动N个小智终端
+
+用法:
+    python benchmarks/bench_fleet.py [--devices 100] [--turns 3] [--speech-ms 1500]
+                                     [--stt-ms 0] [--intent-ms 0] [--tts-ms 0] [--fixture FILE ...]
+
+assist_pipeline、conversation与hass.services均为桩实现（见_ha_stubs.py），
+各阶段耗时由--stt-ms/--intent-ms/--tts-ms模拟；默认为0，测得的即桥接自身开销。
+每个终端：建立连接 → hello握手 → 上报IoT描述与状态 → 反复进行
+listen start → 按实时节奏发送Opus帧 → 结束标记 → 等待run-end。
+
+输出：连接速率、每轮对话延迟（结束标记发出 → 收到run-end）p50/p95/p99、
+事件循环延迟、每设备内存（仅统计组件代码的分配）以及服务端指标计数。
+需要aiohttp与voluptuous。
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import time
+import tracemalloc
+
+import aiohttp
+from aiohttp import web
+
+import _ha_stubs
+from _component import COMPONENT_DIR, load_package, read_frames
+
+_ha_stubs.install()
+component = load_package()
+
+FRAME_INTERVAL = 0.06
+LAG_INTERVAL = 0.05
+IOT_DESCRIPTORS = [
+    {"name": "Speaker", "description": "扬声器", "properties": {"volume": {"type": "number"}}},
+    {"name": "Lamp", "description": "台灯", "properties": {"power": {"type": "boolean"}}},
+]
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Terminal:
+    """模拟一个小智终端"""
+
+    def __init__(self, session, url, index, frames):
+        self.session = session
+        self.url = url
+        self.device_id = f"bench-{index:04d}"
+        self.frames = frames
+        self.ws = None
+        self.inbox = asyncio.Queue()
+        self.turn_latencies = []
+        self.binary_received = 0
+        self._reader = None
+
+    async def connect(self):
+        self.ws = await self.session.ws_connect(self.url, headers={
+            "Authorization": "Bearer bench",
+            "Protocol-Version": "1",
+            "Device-Id": self.device_id,
+            "Client-Id": self.device_id,
+        })
+        self._reader = asyncio.get_running_loop().create_task(self._read())
+        await self.ws.send_json({
+            "type": "hello", "version": 1, "transport": "websocket",
+            "features": {"event_batch": True},
+            "audio_params": {"format": "opus", "sample_rate": 16000, "channels": 1, "frame_duration": 60},
+        })
+        await self.wait_for("hello")
+        await self.ws.send_json({"type": "iot", "descriptors": IOT_DESCRIPTORS})
+        await self.send_states(0)
+
+    async def send_states(self, turn):
+        await self.ws.send_json({"type": "iot", "states": [
+            {"name": "Speaker", "state": {"volume": 50 + turn % 10}},
+            {"name": "Lamp", "state": {"power": bool(turn % 2)}},
+        ]})
+
+    async def _read(self):
+        async for msg in self.ws:
+            if msg.type == aiohttp.WSMsgType.TEXT:
+                message = json.loads(msg.data)
+                if message.get("type") == "batch":
+                    for event in message["events"]:
+                        self.inbox.put_nowait(event)
+                else:
+                    self.inbox.put_nowait(message)
+            elif msg.type == aiohttp.WSMsgType.BINARY:
+                self.binary_received += 1
+
+    async def wait_for(self, message_type):
+        while True:
+            message = await self.inbox.get()
+            if message.get("type") == message_type:
+                return message
+
+    async def turn(self, speech_frames):
+        await self.ws.send_json({"type": "listen", "state": "start", "mode": "manual"})
+        run_start = await self.wait_for("run-start")
+        handler_id = run_start["data"]["runner_data"]["stt_binary_handler_id"]
+        prefix = bytes([handler_id])
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for index in range(speech_frames):
+            delay = start + index * FRAME_INTERVAL - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self.ws.send_bytes(prefix + self.frames[index % len(self.frames)])
+
+        sent_at = time.perf_counter()
+        await self.ws.send_bytes(prefix)
+        await self.ws.send_json({"type": "listen", "state": "stop"})
+        await self.wait_for("run-end")
+        self.turn_latencies.append(time.perf_counter() - sent_at)
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+        if self._reader is not None:
+            await self._reader
+
+
+async def monitor_lag(samples, stop):
+    """定时睡眠，记录实际唤醒时间与预期的偏差"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + LAG_INTERVAL
+        await asyncio.sleep(LAG_INTERVAL)
+        samples.append(max(0.0, loop.time() - expected))
+
+
+def component_memory():
+    """当前由组件代码分配的内存（字节）"""
+    gc.collect()
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(True, os.path.join(COMPONENT_DIR, "*"))]
+    )
+    return sum(stat.size for stat in snapshot.statistics("filename"))
+
+
+async def run(args):
+    _ha_stubs.TIMING.update(stt=args.stt_ms / 1000, intent=args.intent_ms / 1000, tts=args.tts_ms / 1000)
+    if args.fixture:
+        frames = [frame for path in args.fixture for frame in read_frames(path)]
+    else:
+        frames = [os.urandom(size) for size in (96, 112, 128, 120, 104, 136)]
+
+    app = web.Application()
+    hass = _ha_stubs.FakeHass(app)
+    entry = _ha_stubs.FakeEntry(options={
+        "debug": args.debug,
+        "tts_cache": False,
+        "audio_queue_size": args.queue_size,
+    })
+    await component.async_setup_entry(hass, entry)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f"http://127.0.0.1:{port}{component.websocket_api.WS_PATH}"
+
+    lag_samples = []
+    stop_lag = asyncio.Event()
+    lag_task = asyncio.get_running_loop().create_task(monitor_lag(lag_samples, stop_lag))
+
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        terminals = [Terminal(session, url, index, frames) for index in range(args.devices)]
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def connect(terminal):
+            async with semaphore:
+                await terminal.connect()
+
+        # 先在tracemalloc下连接一小部分终端估算每设备内存（tracemalloc会拖慢连接）
+        sample = max(1, min(20, args.devices // 5))
+        tracemalloc.start()
+        baseline = component_memory()
+        await asyncio.gather(*(connect(terminal) for terminal in terminals[:sample]))
+        per_device = (component_memory() - baseline) / sample
+        tracemalloc.stop()
+
+        # 其余终端用于测量连接速率
+        timed = terminals[sample:]
+        started = time.perf_counter()
+        await asyncio.gather(*(connect(terminal) for terminal in timed))
+        connect_elapsed = time.perf_counter() - started if timed else None
+
+        # 对话阶段
+        speech_frames = max(1, round(args.speech_ms / 1000 / FRAME_INTERVAL))
+
+        async def converse(index, terminal):
+            # 错开开始时间，避免所有终端同一时刻说话
+            await asyncio.sleep(index % 10 * FRAME_INTERVAL)
+            for turn in range(args.turns):
+                await terminal.turn(speech_frames)
+                await terminal.send_states(turn + 1)
+
+        lag_samples.clear()
+        started = time.perf_counter()
+        await asyncio.gather(*(converse(index, terminal) for index, terminal in enumerate(terminals)))
+        turns_elapsed = time.perf_counter() - started
+        stop_lag.set()
+        await lag_task
+
+        for terminal in terminals:
+            await terminal.close()
+
+    metrics = hass.data[component.DOMAIN][entry.entry_id]["metrics"]
+    await component.async_unload_entry(hass, entry)
+    await runner.cleanup()
+
+    latencies = [latency for terminal in terminals for latency in terminal.turn_latencies]
+    print(f"终端数: {args.devices}  每终端对话轮数: {args.turns}  每轮语音: {speech_frames}帧")
+    print(f"模拟耗时: stt={args.stt_ms}ms intent={args.intent_ms}ms tts={args.tts_ms}ms")
+    if connect_elapsed is not None:
+        print(f"\n连接速率: {len(timed) / connect_elapsed:,.1f} 连接/秒（含hello握手与IoT上报，并发{args.concurrency}）")
+    else:
+        print("\n连接速率: 终端数过少，未测量")
+    print(f"每设备内存: {per_device / 1024:,.1f} KiB（组件代码分配，{sample}台采样）")
+    print(f"\n对话延迟（结束标记 → run-end，{len(latencies)}轮，总耗时{turns_elapsed:.1f}s）:")
+    for q in (50, 95, 99):
+        print(f"  p{q}: {percentile(latencies, q) * 1000:8.1f} ms")
+    print("\n事件循环延迟:")
+    for q in (50, 99):
+        print(f"  p{q}: {percentile(lag_samples, q) * 1000:8.2f} ms")
+    print(f"  max: {max(lag_samples, default=0) * 1000:8.2f} ms")
+    print("\n服务端计数:")
+    for name, value in metrics.counters.items():
+        print(f"  {name}: {value:,}")
+    run_start = metrics.histograms["run_start"]
+    if run_start.count:
+        print(f"  run_start平均: {run_start.mean() * 1000:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--speech-ms", type=int, default=1500, help="每轮说话时长")
+    parser.add_argument("--stt-ms", type=int, default=0, help="模拟STT耗时")
+    parser.add_argument("--intent-ms", type=int, default=0, help="模拟意图处理耗时")
+    parser.add_argument("--tts-ms", type=int, default=0, help="模拟TTS耗时")
+    parser.add_argument("--concurrency", type=int, default=20, help="同时建立的连接数")
+    parser.add_argument("--queue-size", type=int, default=50, help="每设备音频队列长度")
+    parser.add_argument("--debug", default="off", help="组件日志级别")
+    parser.add_argument("--fixture", nargs="*", default=[], help="XZT1格式的Opus帧文件（默认随机负载）")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
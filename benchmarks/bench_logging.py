@@ -0,0 +1,77 @@
+"""热路径日志基准：每个音频帧的日志开销
+
+用法:
+    python benchmarks/bench_logging.py [--streams 100] [--frames 200]
+
+对比旧实现（每帧两条INFO日志）与BridgeLogger在各日志级别下的单帧开销。
+日志写入内存中的StreamHandler，包含真实的格式化成本。
+"""
+import argparse
+import io
+import logging
+import time
+
+from _component import load
+
+bridge_log = load("log")
+const = load("const")
+
+
+def make_logger(level):
+    """创建写入内存的独立logger"""
+    logger = logging.getLogger(f"bench.{level}")
+    logger.handlers[:] = []
+    logger.propagate = False
+    handler = logging.StreamHandler(io.StringIO())
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s (%(name)s) %(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    return logger
+
+
+def legacy(logger, device_ids, frames, payload):
+    """旧实现：每帧输出消息类型和二进制长度两条INFO日志"""
+    for _ in range(frames):
+        for device_id in device_ids:
+            logger.info("🔍 [DEBUG] 收到WebSocket消息: type=%s", "BINARY")
+            logger.info("🔍 [DEBUG] 收到二进制消息: %d bytes", len(payload))
+
+
+def bridge(log, device_ids, frames, payload):
+    """新实现：与audio_consumer中的调用方式一致"""
+    for _ in range(frames):
+        for device_id in device_ids:
+            if log.trace:
+                log.hot(device_id, "🎵 收到音频帧: %s %d bytes (队列深度: %d)",
+                        device_id, len(payload), 0)
+
+
+def measure(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=100)
+    parser.add_argument("--frames", type=int, default=200, help="每个终端的帧数")
+    args = parser.parse_args()
+
+    device_ids = [f"device-{i:03d}" for i in range(args.streams)]
+    payload = bytes(120)
+    total = args.streams * args.frames
+    print(f"终端数: {args.streams}, 每终端帧数: {args.frames}, 总帧数: {total}")
+
+    elapsed = measure(legacy, make_logger(logging.INFO), device_ids, args.frames, payload)
+    print(f"{'旧实现(INFO)':<22} 单帧开销: {elapsed / total * 1e9:>9.0f} ns")
+
+    for level in const.DEBUG_LEVELS:
+        python_level = logging.DEBUG if level == const.DEBUG_LEVEL_TRACE else logging.INFO
+        log = bridge_log.BridgeLogger(make_logger(python_level), level)
+        elapsed = measure(bridge, log, device_ids, args.frames, payload)
+        print(f"{'BridgeLogger(' + level + ')':<22} 单帧开销: {elapsed / total * 1e9:>9.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""上行Opus解码吞吐基准：每核每秒可解码的60ms帧数
+
+用法:
+    python benchmarks/bench_opus_decode.py [--fixture FILE ...] [--seconds 10] [--workers 1,2,4]
+
+--fixture 接受TTS缓存格式（XZT1）的帧文件，可直接使用
+.storage/xiaozhi_ha_bridge_tts/ 下缓存的真实语音；未指定时合成一段
+类语音信号并编码为Opus作为输入。需要opuslib和系统libopus。
+
+输出：
+- 单线程逐帧解码与批量解码的帧/秒（即每核吞吐）
+- 通过transcode模块的共享线程池、N路并发流时的总帧/秒
+"""
+import argparse
+import asyncio
+import math
+import os
+import struct
+import sys
+import time
+
+from _component import load, read_frames
+
+codec = load("codec")
+transcode = load("transcode")
+
+
+def synthetic_frames(seconds):
+    """合成带基频起伏和音节包络的信号并编码，近似语音的码率"""
+    encoder = codec.OpusEncoder()
+    samples = codec.FRAME_SAMPLES
+    rate = codec.SAMPLE_RATE
+    frames = []
+    phase = 0.0
+    for index in range(int(seconds * 1000 / codec.FRAME_DURATION_MS)):
+        pcm = bytearray()
+        for n in range(samples):
+            t = (index * samples + n) / rate
+            pitch = 140 + 40 * math.sin(2 * math.pi * 0.7 * t)
+            phase += 2 * math.pi * pitch / rate
+            envelope = 0.5 + 0.5 * math.sin(2 * math.pi * 4 * t)
+            value = envelope * (0.6 * math.sin(phase) + 0.3 * math.sin(2 * phase) + 0.1 * math.sin(3 * phase))
+            pcm += struct.pack("<h", int(value * 12000))
+        frames.append(encoder.encode(bytes(pcm)))
+    return frames
+
+
+def bench_single(frames, batch):
+    """单线程解码，返回帧/秒"""
+    decoder = codec.OpusDecoder()
+    start = time.perf_counter()
+    if batch <= 1:
+        for frame in frames:
+            decoder.decode(frame)
+    else:
+        for i in range(0, len(frames), batch):
+            decoder.decode_frames(frames[i:i + batch])
+    return len(frames) / (time.perf_counter() - start)
+
+
+async def bench_pool(frames, streams, batch):
+    """N路并发流通过共享线程池解码，返回总帧/秒"""
+    async def run_stream():
+        transcoder = transcode.OpusPcmTranscoder()
+        for i in range(0, len(frames), batch):
+            await transcoder.decode(frames[i:i + batch])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run_stream() for _ in range(streams)))
+    return streams * len(frames) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixture", nargs="*", default=[], help="XZT1格式的Opus帧文件")
+    parser.add_argument("--seconds", type=float, default=10, help="无fixture时合成音频的时长")
+    parser.add_argument("--batch", type=int, default=transcode.DECODE_BATCH_FRAMES)
+    parser.add_argument("--workers", default="1,2,4", help="线程池大小列表")
+    args = parser.parse_args()
+
+    if not codec.OPUS_AVAILABLE:
+        sys.exit("需要opuslib和libopus: pip install opuslib")
+
+    if args.fixture:
+        frames = [frame for path in args.fixture for frame in read_frames(path)]
+        source = ", ".join(os.path.basename(path) for path in args.fixture)
+    else:
+        frames = synthetic_frames(args.seconds)
+        source = f"合成信号 {args.seconds:g}s"
+    audio_seconds = len(frames) * codec.FRAME_DURATION_MS / 1000
+    avg_bytes = sum(len(frame) for frame in frames) / len(frames)
+    print(f"输入: {source}，{len(frames)}帧（{audio_seconds:.1f}s音频，平均{avg_bytes:.0f}字节/帧）")
+
+    print("\n单线程（每核）:")
+    for batch in (1, args.batch):
+        fps = bench_single(frames, batch)
+        print(f"  批量{batch:>2}: {fps:>10,.0f} 帧/秒  （约{fps * codec.FRAME_DURATION_MS / 1000:,.0f}路实时流）")
+
+    print(f"\n共享线程池（批量{args.batch}）:")
+    for workers in (int(value) for value in args.workers.split(",")):
+        transcode.shutdown_decode_executor()
+        transcode.DECODE_WORKERS = workers
+        streams = workers * 4
+        fps = asyncio.run(bench_pool(frames, streams, args.batch))
+        print(f"  {workers}线程 {streams:>3}路: {fps:>10,.0f} 帧/秒  每线程 {fps / workers:,.0f}")
+    transcode.shutdown_decode_executor()
+
+
+if __name__ == "__main__":
+    main()
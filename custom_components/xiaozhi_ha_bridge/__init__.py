@@ -1,21 +1,45 @@
 """小智HA桥接组件"""
+import asyncio
 import logging
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
 from homeassistant.const import CONF_NAME
+from homeassistant.helpers.storage import STORAGE_DIR
 
-from .websocket_api import async_setup_ws
+from .websocket_api import (
+    async_setup_ws,
+    async_update_ws,
+    async_remove_ws,
+    async_revoke_sessions,
+    async_release_device,
+)
+from .runtime import build_runtime
+from .tts_cache import TtsCache
+from .transcode import shutdown_decode_executor
+from .pipeline_cache import PipelineCache
+from .metrics import EntryMetrics
+from .registry import DeviceRegistry
+from .iot import DescriptorPool
+from .iot_entities import IotEntityManager
+from .entity_resolver import EntityResolver, INVALIDATING_EVENTS
+from .announce import async_setup_services, async_unload_services
+from .heartbeat import HeartbeatMonitor
+from .admission import AdmissionController
+from .intent_cache import IntentFastPath
 from .const import (
     DOMAIN, 
     CONF_PIPELINE_ID, 
     CONF_TTS_ENGINE, 
     CONF_LANGUAGE, 
-    CONF_DEBUG,
+    CONF_TTS_CACHE_MEMORY_MB,
+    CONF_TTS_CACHE_DISK_MB,
     CONF_REQUIRE_TOKEN,
     CONF_ALLOWED_TOKENS,
     DEFAULT_LANGUAGE,
-    DEFAULT_DEBUG,
-    DEFAULT_REQUIRE_TOKEN
+    DEFAULT_REQUIRE_TOKEN,
+    DEFAULT_TTS_CACHE_MEMORY_MB,
+    DEFAULT_TTS_CACHE_DISK_MB,
+    TTS_CACHE_MAX_TEXT_LENGTH
 )
 
 _LOGGER = logging.getLogger(__name__)
@@ -31,26 +55,59 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     config = dict(entry.data)
     config.update(entry.options)
     
+    # 预先解析运行时上下文，连接路径直接使用
+    runtime = build_runtime(entry.entry_id, config)
+    
     # 存储配置到 hass.data
+    devices = DeviceRegistry()
+    entity_resolver = EntityResolver(hass)
     hass.data[DOMAIN][entry.entry_id] = {
         "config": config,
-        "devices": {},  # 设备管理器
+        "runtime": runtime,
+        "devices": devices,  # 设备注册表
+        "tts_cache": None,
+        "pipelines": PipelineCache(hass),  # pipeline解析缓存
+        "metrics": EntryMetrics(),  # 分阶段耗时与计数指标
+        "iot_descriptors": DescriptorPool(),  # 按内容共享的IoT能力描述
+        "iot_entities": IotEntityManager(entry, devices) if runtime.iot_entities else None,
+        "entity_resolver": entity_resolver,  # IoT控制的名称/区域索引
+        "intent_fast_path": IntentFastPath(hass),  # 重复命令的意图缓存
         "entry": entry
     }
+    entry_data = hass.data[DOMAIN][entry.entry_id]
+    # 条目内所有连接共用一个心跳时间轮
+    entry_data["heartbeat"] = HeartbeatMonitor(hass, entry_data)
+    # 条目内所有终端共用的pipeline名额
+    entry_data["admission"] = AdmissionController(entry_data)
+    if runtime.tts_cache:
+        await _async_setup_tts_cache(hass, entry, config)
     
-    # 设置调试日志级别
-    if config.get(CONF_DEBUG, DEFAULT_DEBUG):
-        logging.getLogger(__name__).setLevel(logging.DEBUG)
-        _LOGGER.debug("小智HA桥接调试模式已启用")
+    _apply_debug_level(runtime)
+    
+    # 注册表变化时名称索引和命令意图缓存失效
+    for event_type in INVALIDATING_EVENTS:
+        entry.async_on_unload(hass.bus.async_listen(event_type, entity_resolver.invalidate))
+        entry.async_on_unload(hass.bus.async_listen(event_type, entry_data["intent_fast_path"].invalidate))
+    
+    # 选项变更时原地替换运行时上下文
+    entry.async_on_unload(entry.add_update_listener(async_update_options))
     
     # 启动 WebSocket 服务
     try:
         await async_setup_ws(hass, entry.entry_id)
+        # 路由注册成功后才启动，设置失败时不留下后台任务
+        entry_data["heartbeat"].start()
         _LOGGER.info("小智HA桥接组件已成功设置: %s", config.get(CONF_NAME, "小智HA桥接"))
     except Exception as e:
         _LOGGER.error("小智HA桥接WebSocket服务启动失败: %s", e)
         return False
     
+    async_setup_services(hass)
+    
+    # 可选的指标传感器与IoT实体
+    if runtime.platforms:
+        await hass.config_entries.async_forward_entry_setups(entry, runtime.platforms)
+    
     return True
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
@@ -59,15 +116,28 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         # 清理存储的数据
         if DOMAIN in hass.data and entry.entry_id in hass.data[DOMAIN]:
             entry_data = hass.data[DOMAIN][entry.entry_id]
+            # 先移出路由表，不再接受新连接
+            async_remove_ws(hass, entry.entry_id)
+            
+            if entry_data["runtime"].platforms:
+                await hass.config_entries.async_unload_platforms(entry, entry_data["runtime"].platforms)
+            if entry_data.get("iot_entities") is not None:
+                entry_data["iot_entities"].shutdown()
+            await entry_data["heartbeat"].stop()
             
-            # 断开所有设备连接
+            # 断开所有设备连接（并发关闭，不逐个等待关闭握手）
             devices = entry_data.get("devices", {})
-            for device in devices.values():
-                try:
-                    if hasattr(device, 'ws') and device.ws:
-                        await device.ws.close()
-                except Exception as e:
-                    _LOGGER.warning("关闭设备连接时出错: %s", e)
+            results = await asyncio.gather(
+                *(device.ws.close() for device in devices.values() if device.ws),
+                return_exceptions=True,
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    _LOGGER.warning("关闭设备连接时出错: %s", result)
+            
+            # 释放等待恢复的会话
+            for device in devices.parked():
+                await async_release_device(device, devices)
             
             # 移除数据
             del hass.data[DOMAIN][entry.entry_id]
@@ -75,6 +145,8 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
             # 如果没有其他条目，清理域数据
             if not hass.data[DOMAIN]:
                 del hass.data[DOMAIN]
+                shutdown_decode_executor()
+                async_unload_services(hass)
         
         _LOGGER.info("小智HA桥接组件已成功卸载")
         return True
@@ -89,5 +161,99 @@ async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
     await async_setup_entry(hass, entry)
 
 async def async_update_options(hass: HomeAssistant, entry: ConfigEntry) -> None:
-    """更新选项时调用"""
-    await async_reload_entry(hass, entry) 
\ No newline at end of file
+    """更新选项时调用：重建运行时上下文并整体替换
+
+    不重新加载条目，已连接的终端保持连接，从下一次会话开始使用新配置；
+    只有令牌策略变化时复核各连接，失去授权的连接分散断开。
+    """
+    entry_data = hass.data.get(DOMAIN, {}).get(entry.entry_id)
+    if entry_data is None:
+        await async_reload_entry(hass, entry)
+        return
+    
+    config = dict(entry.data)
+    config.update(entry.options)
+    runtime = build_runtime(entry.entry_id, config)
+    previous = entry_data["runtime"]
+    
+    # 指标传感器或IoT实体的启用状态变化时只重新加载实体平台
+    if (runtime.metrics_sensors != previous.metrics_sensors
+            or runtime.iot_entities != previous.iot_entities):
+        await _async_swap_platforms(hass, entry, entry_data, runtime)
+    
+    # TTS缓存随选项创建、调整预算或释放
+    tts_cache = entry_data.get("tts_cache")
+    if not runtime.tts_cache:
+        entry_data["tts_cache"] = None
+    elif tts_cache is None:
+        await _async_setup_tts_cache(hass, entry, config)
+    else:
+        try:
+            await tts_cache.async_set_budgets(*_tts_cache_budgets(config))
+        except OSError as e:
+            _LOGGER.warning("TTS缓存磁盘目录不可用，仅使用内存缓存: %s", e)
+            tts_cache.disk_budget = 0
+    
+    # 单次引用替换，连接侧下一次读取即获得新配置
+    entry_data["config"] = config
+    entry_data["runtime"] = runtime
+    entry_data["pipelines"].invalidate()
+    # 令牌或Device-Id前缀可能变化
+    async_update_ws(hass, entry.entry_id)
+    if (runtime.require_token != previous.require_token
+            or runtime.token_digests != previous.token_digests):
+        async_revoke_sessions(hass, entry.entry_id)
+    if runtime.heartbeat_interval != previous.heartbeat_interval:
+        entry_data["heartbeat"].reschedule()
+    # 名额增加时立即放行排队的会话
+    entry_data["admission"].pump()
+    _apply_debug_level(runtime)
+    _LOGGER.info("小智HA桥接配置已更新: %s", entry.title)
+
+async def _async_swap_platforms(hass: HomeAssistant, entry: ConfigEntry, entry_data: dict, runtime) -> None:
+    """按新的运行时上下文卸载/加载实体平台（不影响设备连接）"""
+    async with entry.setup_lock:
+        previous = entry_data["runtime"]
+        if previous.platforms:
+            await hass.config_entries.async_unload_platforms(entry, previous.platforms)
+        if entry_data.get("iot_entities") is not None:
+            entry_data["iot_entities"].shutdown()
+        # 平台加载时读取条目数据，先替换运行时上下文与IoT实体管理
+        entry_data["runtime"] = runtime
+        entry_data["iot_entities"] = (
+            IotEntityManager(entry, entry_data["devices"]) if runtime.iot_entities else None
+        )
+        if runtime.platforms:
+            await hass.config_entries.async_forward_entry_setups(entry, runtime.platforms)
+
+async def _async_setup_tts_cache(hass: HomeAssistant, entry: ConfigEntry, config: dict) -> None:
+    """按配置创建TTS缓存并加载磁盘索引"""
+    memory_budget, disk_budget = _tts_cache_budgets(config)
+    tts_cache = TtsCache(
+        hass,
+        hass.config.path(STORAGE_DIR, f"{DOMAIN}_tts", entry.entry_id),
+        memory_budget=memory_budget,
+        disk_budget=disk_budget,
+        max_text_length=TTS_CACHE_MAX_TEXT_LENGTH,
+    )
+    try:
+        await tts_cache.async_load()
+    except OSError as e:
+        _LOGGER.warning("TTS缓存磁盘目录不可用，仅使用内存缓存: %s", e)
+        tts_cache.disk_budget = 0
+    hass.data[DOMAIN][entry.entry_id]["tts_cache"] = tts_cache
+
+def _tts_cache_budgets(config: dict) -> tuple:
+    """TTS缓存的(内存, 磁盘)字节预算"""
+    return (
+        int(config.get(CONF_TTS_CACHE_MEMORY_MB, DEFAULT_TTS_CACHE_MEMORY_MB)) * 1024 * 1024,
+        int(config.get(CONF_TTS_CACHE_DISK_MB, DEFAULT_TTS_CACHE_DISK_MB)) * 1024 * 1024,
+    )
+
+def _apply_debug_level(runtime) -> None:
+    """verbose及以上级别才输出DEBUG日志"""
+    if runtime.log.verbose:
+        logging.getLogger(__name__).setLevel(logging.DEBUG)
+        _LOGGER.debug("小智HA桥接调试模式已启用: %s", runtime.log.level)
+    else:
+        logging.getLogger(__name__).setLevel(logging.NOTSET) 
\ No newline at end of file
@@ -0,0 +1,152 @@
+"""Pipeline准入控制
+
+每个配置条目限制同时运行的pipeline数（STT/意图/TTS后端共用这些名额），
+超出的请求按优先级排队，同优先级先到先得。队列有上限：队列已满时优先级
+最低的请求被拒绝（新请求优先级更高时挤出队尾的请求），排队超时同样拒绝，
+被拒绝的终端立即收到pipeline-busy错误，而不是一直等待。
+"""
+import asyncio
+import bisect
+import itertools
+import logging
+import time
+
+from homeassistant.helpers import device_registry as dr
+
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+REJECT_QUEUE_FULL = "queue-full"
+REJECT_EVICTED = "evicted"
+REJECT_TIMEOUT = "timeout"
+
+
+class AdmissionRejected(Exception):
+    """pipeline请求未获准入"""
+
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+
+class AdmissionTicket:
+    """一次pipeline运行占用（或等待）的名额"""
+
+    __slots__ = ("device_id", "priority", "seq", "future", "enqueued_at")
+
+    def __init__(self, device_id, priority, seq):
+        self.device_id = device_id
+        self.priority = priority
+        self.seq = seq
+        self.future = None
+        self.enqueued_at = time.monotonic()
+
+
+def _queue_order(ticket):
+    # 优先级高的在前，同优先级按到达顺序
+    return (-ticket.priority, ticket.seq)
+
+
+def device_priority(hass, device, priorities):
+    """终端的排队优先级：先按device_id，再按其所在区域，未配置为0"""
+    if not priorities:
+        return 0
+    if device.device_id in priorities:
+        return priorities[device.device_id]
+    ha_device = dr.async_get(hass).async_get_device(identifiers={(DOMAIN, device.device_id)})
+    if ha_device is not None and ha_device.area_id in priorities:
+        return priorities[ha_device.area_id]
+    return 0
+
+
+class AdmissionController:
+    """条目级pipeline准入控制；名额数为0时不限制（仍统计运行数）"""
+
+    def __init__(self, entry_data):
+        self._entry_data = entry_data
+        self._active = set()
+        self._waiting = []  # 按_queue_order排序
+        self._seq = itertools.count()
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.evicted = 0
+        self.timeouts = 0
+
+    def _has_slot(self):
+        slots = self._entry_data["runtime"].pipeline_slots
+        return slots <= 0 or len(self._active) < slots
+
+    async def acquire(self, device, priority=0):
+        """取得一个名额（必要时排队），返回票据；未获准入时抛出AdmissionRejected"""
+        runtime = self._entry_data["runtime"]
+        ticket = AdmissionTicket(device.device_id, priority, next(self._seq))
+        if not self._waiting and self._has_slot():
+            self._grant(ticket)
+            return ticket
+
+        if len(self._waiting) >= runtime.admission_queue_size:
+            lowest = self._waiting[-1] if self._waiting else None
+            if lowest is None or lowest.priority >= priority:
+                self.rejected += 1
+                raise AdmissionRejected(REJECT_QUEUE_FULL, "语音服务繁忙，请稍后再试")
+            # 挤出队尾优先级更低的请求
+            self._waiting.pop()
+            self.evicted += 1
+            self.rejected += 1
+            lowest.future.set_exception(AdmissionRejected(REJECT_EVICTED, "语音服务繁忙，请稍后再试"))
+
+        ticket.future = asyncio.get_running_loop().create_future()
+        bisect.insort(self._waiting, ticket, key=_queue_order)
+        self.queued += 1
+        _LOGGER.debug("🚦 Pipeline排队: %s (优先级%d, 第%d位)",
+                      device.device_id, priority, self._waiting.index(ticket) + 1)
+        try:
+            await asyncio.wait_for(ticket.future, runtime.admission_timeout)
+        except asyncio.TimeoutError:
+            self._withdraw(ticket)
+            self.timeouts += 1
+            self.rejected += 1
+            raise AdmissionRejected(REJECT_TIMEOUT, "语音服务繁忙，排队超时") from None
+        except asyncio.CancelledError:
+            # 排队期间会话被中止
+            self._withdraw(ticket)
+            raise
+        return ticket
+
+    def release(self, ticket):
+        """pipeline结束（或中止）后归还名额，依次放行排队的请求"""
+        if ticket in self._active:
+            self._active.discard(ticket)
+            self.pump()
+
+    def pump(self):
+        """有空闲名额时放行队首请求（名额数变化后也应调用）"""
+        while self._waiting and self._has_slot():
+            ticket = self._waiting.pop(0)
+            if not ticket.future.done():
+                self._grant(ticket)
+                ticket.future.set_result(None)
+
+    def _grant(self, ticket):
+        self._active.add(ticket)
+        self.admitted += 1
+
+    def _withdraw(self, ticket):
+        if ticket in self._active:
+            self.release(ticket)
+        elif ticket in self._waiting:
+            self._waiting.remove(ticket)
+
+    def stats(self):
+        return {
+            "slots": self._entry_data["runtime"].pipeline_slots,
+            "active": len(self._active),
+            "waiting": len(self._waiting),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "evicted": self.evicted,
+            "timeouts": self.timeouts,
+        }
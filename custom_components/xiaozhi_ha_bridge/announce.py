@@ -0,0 +1,173 @@
+"""小智终端广播服务
+
+xiaozhi_ha_bridge.announce 将一段文本播报到选定的终端：按终端、区域或状态选择，
+文本只合成并编码一次，所有终端共享同一组Opus帧，在同一时刻开始各自按实时
+节奏下发，最后返回每个终端的送达情况。
+"""
+import asyncio
+import logging
+import time
+
+import voluptuous as vol
+
+from homeassistant.core import ServiceCall, SupportsResponse
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers import device_registry as dr
+
+from .const import DOMAIN, DEVICE_STATUSES
+from .admission import AdmissionRejected, device_priority
+from .tts_stream import async_synthesize
+from .codec import OPUS_AVAILABLE
+
+_LOGGER = logging.getLogger(__name__)
+
+SERVICE_ANNOUNCE = "announce"
+
+ATTR_MESSAGE = "message"
+ATTR_DEVICE_ID = "device_id"
+ATTR_AREA_ID = "area_id"
+ATTR_STATUS = "status"
+ATTR_TTS_ENGINE = "tts_engine"
+ATTR_LANGUAGE = "language"
+
+ANNOUNCE_SCHEMA = vol.Schema({
+    vol.Required(ATTR_MESSAGE): cv.string,
+    vol.Optional(ATTR_DEVICE_ID): vol.All(cv.ensure_list, [cv.string]),
+    vol.Optional(ATTR_AREA_ID): vol.All(cv.ensure_list, [cv.string]),
+    vol.Optional(ATTR_STATUS): vol.All(cv.ensure_list, [vol.In(DEVICE_STATUSES)]),
+    vol.Optional(ATTR_TTS_ENGINE): cv.string,
+    vol.Optional(ATTR_LANGUAGE): cv.string,
+})
+
+
+def async_setup_services(hass):
+    """注册广播服务（多个条目共用一个服务）"""
+    if hass.services.has_service(DOMAIN, SERVICE_ANNOUNCE):
+        return
+
+    async def handle_announce(call: ServiceCall):
+        return await async_announce(hass, call.data)
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_ANNOUNCE, handle_announce,
+        schema=ANNOUNCE_SCHEMA, supports_response=SupportsResponse.OPTIONAL,
+    )
+
+
+def async_unload_services(hass):
+    """最后一个条目卸载时移除服务"""
+    hass.services.async_remove(DOMAIN, SERVICE_ANNOUNCE)
+
+
+def select_devices(hass, device_ids=None, area_ids=None, statuses=None):
+    """从所有条目的在线终端中按条件选择，返回[(条目数据, 设备)]；未指定条件时选择全部"""
+    device_registry = dr.async_get(hass) if area_ids else None
+    selected = []
+    for entry_data in hass.data.get(DOMAIN, {}).values():
+        registry = entry_data["devices"]
+        if statuses:
+            candidates = [device for status in statuses for device in registry.with_status(status)]
+        else:
+            candidates = registry.values()
+        for device in candidates:
+            if device_ids and device.device_id not in device_ids:
+                continue
+            if area_ids:
+                ha_device = device_registry.async_get_device(identifiers={(DOMAIN, device.device_id)})
+                if ha_device is None or ha_device.area_id not in area_ids:
+                    continue
+            selected.append((entry_data, device))
+    return selected
+
+
+async def async_announce(hass, data):
+    """合成一次并并发下发到所有选中的终端，返回送达报告"""
+    message = data[ATTR_MESSAGE]
+    targets = select_devices(
+        hass,
+        device_ids=set(data.get(ATTR_DEVICE_ID, ())),
+        area_ids=set(data.get(ATTR_AREA_ID, ())),
+        statuses=data.get(ATTR_STATUS),
+    )
+    report = {"message": message, "devices": {}}
+    if not targets:
+        _LOGGER.warning("📢 广播没有匹配的在线终端: %s", message)
+        return report
+    if not OPUS_AVAILABLE:
+        for _, device in targets:
+            report["devices"][device.device_id] = {"status": "failed", "error": "opus unavailable"}
+        return report
+
+    # 各条目TTS配置可能不同，按(引擎, 语言)分组，每组只合成一次
+    synth_groups = {}
+    for entry_data, device in targets:
+        runtime = entry_data["runtime"]
+        engine = data.get(ATTR_TTS_ENGINE) or runtime.tts_engine
+        language = data.get(ATTR_LANGUAGE) or runtime.language
+        synth_groups.setdefault((engine, language), []).append((entry_data, device))
+
+    started = time.monotonic()
+    synthesized = {}
+    errors = {}
+    for (engine, language), members in synth_groups.items():
+        # 合成与pipeline共用条目的TTS后端名额
+        entry_data, device = members[0]
+        admission = entry_data["admission"]
+        try:
+            ticket = await admission.acquire(
+                device, device_priority(hass, device, entry_data["runtime"].admission_priorities)
+            )
+        except AdmissionRejected as e:
+            _LOGGER.warning("🚦 广播语音合成未获准入: %s (%s)", engine, e.reason)
+            synthesized[(engine, language)] = ()
+            errors[(engine, language)] = "pipeline-busy"
+            continue
+        try:
+            frames, cache_hit = await async_synthesize(
+                hass, message, engine, language, cache=entry_data.get("tts_cache")
+            )
+        except Exception as e:
+            _LOGGER.error("❌ 广播语音合成失败: %s (%s)", engine, e)
+            frames, cache_hit = (), False
+        finally:
+            admission.release(ticket)
+        synthesized[(engine, language)] = frames
+        report.setdefault("synthesis", []).append({
+            "engine": engine,
+            "language": language,
+            "frames": len(frames),
+            "cache_hit": cache_hit,
+        })
+    report["synthesis_ms"] = round((time.monotonic() - started) * 1000, 1)
+
+    # 合成全部完成后在同一轮事件循环中启动所有下发，各终端同时开始播放
+    deliveries = []
+    for key, members in synth_groups.items():
+        frames = synthesized[key]
+        for entry_data, device in members:
+            if not frames:
+                report["devices"][device.device_id] = {
+                    "status": "failed", "error": errors.get(key, "synthesis failed"),
+                }
+                continue
+            runtime = entry_data["runtime"]
+            task = device.tts.start_frames(frames, runtime.tts_lead_frames, message)
+            deliveries.append((device, task, len(frames)))
+    fanout_at = time.monotonic()
+
+    results = await asyncio.gather(*(task for _, task, _ in deliveries), return_exceptions=True)
+    finished_at = time.monotonic()
+    for (device, _, total), result in zip(deliveries, results):
+        if isinstance(result, asyncio.CancelledError):
+            entry = {"status": "interrupted"}
+        elif isinstance(result, BaseException) or result is None:
+            entry = {"status": "failed"}
+        else:
+            entry = {"status": "delivered" if result >= total else "partial", "frames": result}
+        report["devices"][device.device_id] = entry
+    report["duration_ms"] = round((finished_at - fanout_at) * 1000, 1)
+
+    delivered = sum(1 for entry in report["devices"].values() if entry["status"] == "delivered")
+    _LOGGER.info("📢 广播完成: %d/%d个终端 (合成%.0fms)",
+                 delivered, len(report["devices"]), report["synthesis_ms"])
+    return report
@@ -0,0 +1,126 @@
+"""小智设备音频入口队列"""
+import asyncio
+from collections import deque
+
+from .const import (
+    AUDIO_OVERFLOW_BLOCK,
+    AUDIO_OVERFLOW_DROP_OLDEST,
+    AUDIO_OVERFLOW_ABORT,
+)
+
+# 音频流结束标记（对应终端发送的单字节结束帧）
+END_OF_STREAM = object()
+
+
+class AudioQueueOverflow(Exception):
+    """音频队列已满且溢出策略为abort"""
+
+
+class AudioIngressQueue:
+    """每设备有界音频队列
+
+    由WebSocket接收循环写入，由独立的消费任务读出并送入pipeline，
+    避免慢速STT阻塞abort/ping等控制消息。
+    """
+
+    def __init__(self, maxsize, policy=AUDIO_OVERFLOW_DROP_OLDEST):
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+        self._items = deque()
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        # 统计计数
+        self.enqueued = 0
+        self.dropped = 0
+        self.overflows = 0
+        self.high_water = 0
+
+    @property
+    def depth(self):
+        """当前排队帧数"""
+        return len(self._items)
+
+    def _append(self, item):
+        self._items.append(item)
+        self.enqueued += 1
+        depth = len(self._items)
+        if depth > self.high_water:
+            self.high_water = depth
+        if depth >= self.maxsize:
+            self._not_full.clear()
+        self._not_empty.set()
+
+    async def put(self, item):
+        """写入一帧音频，队列满时按溢出策略处理"""
+        # 结束标记不受容量限制，保证end_stream一定能送达
+        if item is END_OF_STREAM or len(self._items) < self.maxsize:
+            self._append(item)
+            return
+
+        self.overflows += 1
+        if self.policy == AUDIO_OVERFLOW_BLOCK:
+            # 阻塞接收循环，通过TCP窗口向终端施加背压
+            while len(self._items) >= self.maxsize:
+                await self._not_full.wait()
+            self._append(item)
+        elif self.policy == AUDIO_OVERFLOW_ABORT:
+            raise AudioQueueOverflow(f"音频队列已满: {self.maxsize}")
+        else:
+            oldest = self._items.popleft()
+            if oldest is END_OF_STREAM:
+                # 不丢弃结束标记，改为丢弃新帧
+                self._items.appendleft(oldest)
+                self.dropped += 1
+                return
+            self.dropped += 1
+            self._append(item)
+
+    async def get(self):
+        """取出下一帧，队列为空时等待"""
+        while not self._items:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        item = self._items.popleft()
+        if len(self._items) < self.maxsize:
+            self._not_full.set()
+        return item
+
+    async def get_batch(self, max_items):
+        """取出已到达的若干帧（至少等待一帧），结束标记总是单独返回"""
+        first = await self.get()
+        if first is END_OF_STREAM:
+            return [first]
+        batch = [first]
+        items = self._items
+        while items and len(batch) < max_items and items[0] is not END_OF_STREAM:
+            batch.append(items.popleft())
+        if len(items) < self.maxsize:
+            self._not_full.set()
+        return batch
+
+    def configure(self, maxsize, policy):
+        """应用新的容量与溢出策略（新会话开始、队列已清空时调用）"""
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+        if len(self._items) < self.maxsize:
+            self._not_full.set()
+
+    def clear(self):
+        """清空队列（中止或新会话开始时调用），返回丢弃的帧数"""
+        count = len(self._items)
+        self._items.clear()
+        self._not_full.set()
+        return count
+
+    def stats(self):
+        """返回队列统计信息"""
+        return {
+            "depth": len(self._items),
+            "maxsize": self.maxsize,
+            "policy": self.policy,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "overflows": self.overflows,
+            "high_water": self.high_water,
+        }
@@ -0,0 +1,32 @@
+"""小智终端IoT布尔属性"""
+from homeassistant.components.binary_sensor import BinarySensorEntity
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+
+from .const import DOMAIN
+from .iot_entities import IotEntityMixin, PROPERTY_TYPE_BOOLEAN
+
+
+async def async_setup_entry(
+    hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback
+) -> None:
+    """登记IoT布尔属性实体的创建入口"""
+    iot_entities = hass.data[DOMAIN][entry.entry_id].get("iot_entities")
+    if iot_entities is not None:
+        iot_entities.register_platform("binary_sensor", async_add_entities, _iot_binary_sensor)
+
+
+def _iot_binary_sensor(manager, device_id, name, description, prop, spec):
+    if spec.get("type") != PROPERTY_TYPE_BOOLEAN:
+        return None
+    return IotBinarySensor(manager, device_id, name, description, prop, spec)
+
+
+class IotBinarySensor(IotEntityMixin, BinarySensorEntity):
+    """终端IoT布尔属性"""
+
+    @property
+    def is_on(self):
+        value = self.iot_value()
+        return None if value is None else bool(value)
@@ -0,0 +1,76 @@
+"""Opus编解码封装
+
+依赖opuslib（需要系统libopus）。不可用时 OPUS_AVAILABLE 为 False，
+调用方应回退到不需要编解码的处理方式。
+"""
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+try:
+    import opuslib
+except Exception as e:  # ImportError或找不到libopus
+    opuslib = None
+    _IMPORT_ERROR = e
+else:
+    _IMPORT_ERROR = None
+
+OPUS_AVAILABLE = opuslib is not None
+
+SAMPLE_RATE = 16000
+CHANNELS = 1
+SAMPLE_WIDTH = 2  # 16位PCM
+FRAME_DURATION_MS = 60
+FRAME_SAMPLES = SAMPLE_RATE * FRAME_DURATION_MS // 1000
+FRAME_BYTES = FRAME_SAMPLES * CHANNELS * SAMPLE_WIDTH
+
+
+class OpusUnavailable(Exception):
+    """opuslib或libopus不可用"""
+
+
+def _require_opus():
+    if opuslib is None:
+        raise OpusUnavailable(f"Opus编解码不可用: {_IMPORT_ERROR}")
+
+
+class OpusEncoder:
+    """16kHz单声道60ms帧Opus编码器（非线程安全，每个流一个实例）"""
+
+    def __init__(self, sample_rate=SAMPLE_RATE, channels=CHANNELS):
+        _require_opus()
+        self._encoder = opuslib.Encoder(sample_rate, channels, opuslib.APPLICATION_VOIP)
+        self.frame_samples = sample_rate * FRAME_DURATION_MS // 1000
+        self.frame_bytes = self.frame_samples * channels * SAMPLE_WIDTH
+
+    def encode(self, pcm):
+        """编码一帧PCM（长度必须为frame_bytes）"""
+        return self._encoder.encode(bytes(pcm), self.frame_samples)
+
+    def encode_frames(self, pcm_frames):
+        """批量编码，供执行器线程调用"""
+        return [self.encode(pcm) for pcm in pcm_frames]
+
+
+class OpusDecoder:
+    """16kHz单声道Opus解码器（有状态，非线程安全，每个流一个实例）"""
+
+    def __init__(self, sample_rate=SAMPLE_RATE, channels=CHANNELS):
+        _require_opus()
+        self._decoder = opuslib.Decoder(sample_rate, channels)
+        self.frame_bytes = sample_rate * FRAME_DURATION_MS // 1000 * channels * SAMPLE_WIDTH
+        # 单个Opus包最长120ms
+        self.max_frame_samples = sample_rate * 120 // 1000
+        self.errors = 0
+
+    def decode(self, packet):
+        """解码一个Opus包，损坏的包以一帧静音代替"""
+        try:
+            return self._decoder.decode(bytes(packet), self.max_frame_samples)
+        except opuslib.OpusError:
+            self.errors += 1
+            return bytes(self.frame_bytes)
+
+    def decode_frames(self, packets):
+        """批量解码并拼接为连续PCM，供执行器线程调用"""
+        return b"".join([self.decode(packet) for packet in packets])
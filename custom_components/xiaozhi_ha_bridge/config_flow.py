@@ -12,10 +12,61 @@ from .const import (
     CONF_DEBUG,
     CONF_REQUIRE_TOKEN,
     CONF_ALLOWED_TOKENS,
+    CONF_AUDIO_QUEUE_SIZE,
+    CONF_AUDIO_OVERFLOW_POLICY,
+    CONF_TTS_STREAMING,
+    CONF_AUDIO_TRANSCODE,
+    CONF_VAD,
+    CONF_VAD_ENERGY_THRESHOLD,
+    CONF_VAD_ZCR_THRESHOLD,
+    CONF_VAD_SILENCE_MS,
+    CONF_METRICS_SENSORS,
+    CONF_IOT_ENTITIES,
+    CONF_DUPLICATE_POLICY,
+    CONF_SESSION_RESUME_SECONDS,
+    CONF_HEARTBEAT_INTERVAL,
+    CONF_PIPELINE_IDLE_TIMEOUT,
+    CONF_PIPELINE_SLOTS,
+    CONF_ADMISSION_QUEUE_SIZE,
+    CONF_ADMISSION_TIMEOUT,
+    CONF_ADMISSION_PRIORITIES,
+    CONF_PREROLL_MS,
+    CONF_TTS_CACHE,
+    CONF_TTS_CACHE_MEMORY_MB,
+    CONF_TTS_CACHE_DISK_MB,
+    CONF_INTENT_FAST_PATH,
+    CONF_DEVICE_ID_PREFIXES,
     DEFAULT_LANGUAGE,
     DEFAULT_DEBUG,
-    DEFAULT_REQUIRE_TOKEN
+    DEFAULT_REQUIRE_TOKEN,
+    DEFAULT_AUDIO_QUEUE_SIZE,
+    DEFAULT_AUDIO_OVERFLOW_POLICY,
+    DEFAULT_TTS_STREAMING,
+    DEFAULT_AUDIO_TRANSCODE,
+    DEFAULT_VAD,
+    DEFAULT_VAD_ENERGY_THRESHOLD,
+    DEFAULT_VAD_ZCR_THRESHOLD,
+    DEFAULT_VAD_SILENCE_MS,
+    DEFAULT_METRICS_SENSORS,
+    DEFAULT_IOT_ENTITIES,
+    DEFAULT_DUPLICATE_POLICY,
+    DEFAULT_SESSION_RESUME_SECONDS,
+    DEFAULT_HEARTBEAT_INTERVAL,
+    DEFAULT_PIPELINE_IDLE_TIMEOUT,
+    DEFAULT_PIPELINE_SLOTS,
+    DEFAULT_ADMISSION_QUEUE_SIZE,
+    DEFAULT_ADMISSION_TIMEOUT,
+    DEFAULT_ADMISSION_PRIORITIES,
+    DEFAULT_PREROLL_MS,
+    DEFAULT_TTS_CACHE,
+    DEFAULT_TTS_CACHE_MEMORY_MB,
+    DEFAULT_TTS_CACHE_DISK_MB,
+    DEFAULT_INTENT_FAST_PATH,
+    AUDIO_OVERFLOW_POLICIES,
+    DUPLICATE_POLICIES,
+    DEBUG_LEVELS
 )
+from .log import normalize_debug_level
 
 class XiaozhiHABridgeConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """小智HA桥接组件配置流程"""
@@ -66,7 +117,7 @@ class XiaozhiHABridgeConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             vol.Optional(CONF_LANGUAGE, default=DEFAULT_LANGUAGE): vol.In([
                 "zh-CN", "en-US", "ja-JP", "ko-KR", "de-DE", "fr-FR", "es-ES", "it-IT"
             ]),
-            vol.Optional(CONF_DEBUG, default=DEFAULT_DEBUG): bool,
+            vol.Optional(CONF_DEBUG, default=DEFAULT_DEBUG): vol.In(DEBUG_LEVELS),
             vol.Optional(CONF_REQUIRE_TOKEN, default=DEFAULT_REQUIRE_TOKEN): bool,
             vol.Optional(CONF_ALLOWED_TOKENS, default=[]): cv.multi_select([]),
         })
@@ -123,7 +174,10 @@ class XiaozhiHABridgeConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             vol.Optional(CONF_LANGUAGE, default=defaults.get(CONF_LANGUAGE, DEFAULT_LANGUAGE)): vol.In([
                 "zh-CN", "en-US", "ja-JP", "ko-KR", "de-DE", "fr-FR", "es-ES", "it-IT"
             ]),
-            vol.Optional(CONF_DEBUG, default=defaults.get(CONF_DEBUG, DEFAULT_DEBUG)): bool,
+            vol.Optional(
+                CONF_DEBUG,
+                default=normalize_debug_level(defaults.get(CONF_DEBUG, DEFAULT_DEBUG))
+            ): vol.In(DEBUG_LEVELS),
             vol.Optional(CONF_REQUIRE_TOKEN, default=defaults.get(CONF_REQUIRE_TOKEN, DEFAULT_REQUIRE_TOKEN)): bool,
         })
 
@@ -178,12 +232,108 @@ class XiaozhiHABridgeOptionsFlow(config_entries.OptionsFlow):
         options_schema = vol.Schema({
             vol.Optional(
                 CONF_DEBUG,
-                default=current_options.get(CONF_DEBUG, DEFAULT_DEBUG)
-            ): bool,
+                default=normalize_debug_level(current_options.get(CONF_DEBUG, DEFAULT_DEBUG))
+            ): vol.In(DEBUG_LEVELS),
             vol.Optional(
                 CONF_REQUIRE_TOKEN,
                 default=current_options.get(CONF_REQUIRE_TOKEN, DEFAULT_REQUIRE_TOKEN)
             ): bool,
+            vol.Optional(
+                CONF_AUDIO_QUEUE_SIZE,
+                default=current_options.get(CONF_AUDIO_QUEUE_SIZE, DEFAULT_AUDIO_QUEUE_SIZE)
+            ): vol.All(vol.Coerce(int), vol.Range(min=5, max=500)),
+            vol.Optional(
+                CONF_AUDIO_OVERFLOW_POLICY,
+                default=current_options.get(CONF_AUDIO_OVERFLOW_POLICY, DEFAULT_AUDIO_OVERFLOW_POLICY)
+            ): vol.In(AUDIO_OVERFLOW_POLICIES),
+            vol.Optional(
+                CONF_DUPLICATE_POLICY,
+                default=current_options.get(CONF_DUPLICATE_POLICY, DEFAULT_DUPLICATE_POLICY)
+            ): vol.In(DUPLICATE_POLICIES),
+            vol.Optional(
+                CONF_DEVICE_ID_PREFIXES,
+                default=current_options.get(CONF_DEVICE_ID_PREFIXES, "")
+            ): str,
+            vol.Optional(
+                CONF_SESSION_RESUME_SECONDS,
+                default=current_options.get(CONF_SESSION_RESUME_SECONDS, DEFAULT_SESSION_RESUME_SECONDS)
+            ): vol.All(vol.Coerce(int), vol.Range(min=0, max=600)),
+            vol.Optional(
+                CONF_HEARTBEAT_INTERVAL,
+                default=current_options.get(CONF_HEARTBEAT_INTERVAL, DEFAULT_HEARTBEAT_INTERVAL)
+            ): vol.All(vol.Coerce(int), vol.Range(min=0, max=600)),
+            vol.Optional(
+                CONF_PIPELINE_IDLE_TIMEOUT,
+                default=current_options.get(CONF_PIPELINE_IDLE_TIMEOUT, DEFAULT_PIPELINE_IDLE_TIMEOUT)
+            ): vol.All(vol.Coerce(int), vol.Range(min=0, max=300)),
+            vol.Optional(
+                CONF_PREROLL_MS,
+                default=current_options.get(CONF_PREROLL_MS, DEFAULT_PREROLL_MS)
+            ): vol.All(vol.Coerce(int), vol.Range(min=0, max=3000)),
+            vol.Optional(
+                CONF_PIPELINE_SLOTS,
+                default=current_options.get(CONF_PIPELINE_SLOTS, DEFAULT_PIPELINE_SLOTS)
+            ): vol.All(vol.Coerce(int), vol.Range(min=0, max=64)),
+            vol.Optional(
+                CONF_ADMISSION_QUEUE_SIZE,
+                default=current_options.get(CONF_ADMISSION_QUEUE_SIZE, DEFAULT_ADMISSION_QUEUE_SIZE)
+            ): vol.All(vol.Coerce(int), vol.Range(min=0, max=100)),
+            vol.Optional(
+                CONF_ADMISSION_TIMEOUT,
+                default=current_options.get(CONF_ADMISSION_TIMEOUT, DEFAULT_ADMISSION_TIMEOUT)
+            ): vol.All(vol.Coerce(int), vol.Range(min=1, max=120)),
+            vol.Optional(
+                CONF_ADMISSION_PRIORITIES,
+                default=current_options.get(CONF_ADMISSION_PRIORITIES, DEFAULT_ADMISSION_PRIORITIES)
+            ): str,
+            vol.Optional(
+                CONF_AUDIO_TRANSCODE,
+                default=current_options.get(CONF_AUDIO_TRANSCODE, DEFAULT_AUDIO_TRANSCODE)
+            ): bool,
+            vol.Optional(
+                CONF_VAD,
+                default=current_options.get(CONF_VAD, DEFAULT_VAD)
+            ): bool,
+            vol.Optional(
+                CONF_VAD_ENERGY_THRESHOLD,
+                default=current_options.get(CONF_VAD_ENERGY_THRESHOLD, DEFAULT_VAD_ENERGY_THRESHOLD)
+            ): vol.All(vol.Coerce(float), vol.Range(min=-90, max=0)),
+            vol.Optional(
+                CONF_VAD_ZCR_THRESHOLD,
+                default=current_options.get(CONF_VAD_ZCR_THRESHOLD, DEFAULT_VAD_ZCR_THRESHOLD)
+            ): vol.All(vol.Coerce(float), vol.Range(min=0, max=1)),
+            vol.Optional(
+                CONF_VAD_SILENCE_MS,
+                default=current_options.get(CONF_VAD_SILENCE_MS, DEFAULT_VAD_SILENCE_MS)
+            ): vol.All(vol.Coerce(int), vol.Range(min=100, max=3000)),
+            vol.Optional(
+                CONF_METRICS_SENSORS,
+                default=current_options.get(CONF_METRICS_SENSORS, DEFAULT_METRICS_SENSORS)
+            ): bool,
+            vol.Optional(
+                CONF_IOT_ENTITIES,
+                default=current_options.get(CONF_IOT_ENTITIES, DEFAULT_IOT_ENTITIES)
+            ): bool,
+            vol.Optional(
+                CONF_TTS_STREAMING,
+                default=current_options.get(CONF_TTS_STREAMING, DEFAULT_TTS_STREAMING)
+            ): bool,
+            vol.Optional(
+                CONF_TTS_CACHE,
+                default=current_options.get(CONF_TTS_CACHE, DEFAULT_TTS_CACHE)
+            ): bool,
+            vol.Optional(
+                CONF_TTS_CACHE_MEMORY_MB,
+                default=current_options.get(CONF_TTS_CACHE_MEMORY_MB, DEFAULT_TTS_CACHE_MEMORY_MB)
+            ): vol.All(vol.Coerce(int), vol.Range(min=1, max=512)),
+            vol.Optional(
+                CONF_TTS_CACHE_DISK_MB,
+                default=current_options.get(CONF_TTS_CACHE_DISK_MB, DEFAULT_TTS_CACHE_DISK_MB)
+            ): vol.All(vol.Coerce(int), vol.Range(min=0, max=4096)),
+            vol.Optional(
+                CONF_INTENT_FAST_PATH,
+                default=current_options.get(CONF_INTENT_FAST_PATH, DEFAULT_INTENT_FAST_PATH)
+            ): bool,
         })
 
         return self.async_show_form(
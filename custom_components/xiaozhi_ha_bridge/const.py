@@ -1,5 +1,6 @@
 DOMAIN = "xiaozhi_ha_bridge"
 WS_PATH = "/api/xiaozhi_ws"
+PLATFORMS = ["sensor", "binary_sensor"]  # 启用指标传感器或IoT实体时加载
 
 # 配置键
 CONF_PIPELINE_ID = "pipeline_id"
@@ -8,15 +9,101 @@ CONF_LANGUAGE = "language"
 CONF_DEBUG = "debug"
 CONF_REQUIRE_TOKEN = "require_token"
 CONF_ALLOWED_TOKENS = "allowed_tokens"
+CONF_AUDIO_QUEUE_SIZE = "audio_queue_size"
+CONF_AUDIO_OVERFLOW_POLICY = "audio_overflow_policy"
+CONF_TTS_STREAMING = "tts_streaming"
+CONF_AUDIO_TRANSCODE = "audio_transcode"
+CONF_VAD = "vad"
+CONF_VAD_ENERGY_THRESHOLD = "vad_energy_threshold"
+CONF_VAD_ZCR_THRESHOLD = "vad_zcr_threshold"
+CONF_VAD_SILENCE_MS = "vad_silence_ms"
+CONF_METRICS_SENSORS = "metrics_sensors"
+CONF_IOT_ENTITIES = "iot_entities"
+CONF_DUPLICATE_POLICY = "duplicate_device_policy"
+CONF_SESSION_RESUME_SECONDS = "session_resume_seconds"
+CONF_HEARTBEAT_INTERVAL = "heartbeat_interval"
+CONF_PIPELINE_IDLE_TIMEOUT = "pipeline_idle_timeout"
+CONF_PIPELINE_SLOTS = "pipeline_slots"
+CONF_ADMISSION_QUEUE_SIZE = "admission_queue_size"
+CONF_ADMISSION_TIMEOUT = "admission_timeout"
+CONF_ADMISSION_PRIORITIES = "admission_priorities"
+CONF_PREROLL_MS = "preroll_ms"
+CONF_INTENT_FAST_PATH = "intent_fast_path"
+CONF_DEVICE_ID_PREFIXES = "device_id_prefixes"  # 按Device-Id前缀将连接路由到本条目
+CONF_TTS_CACHE = "tts_cache"
+CONF_TTS_CACHE_MEMORY_MB = "tts_cache_memory_mb"
+CONF_TTS_CACHE_DISK_MB = "tts_cache_disk_mb"
 
 # 默认值
 DEFAULT_LANGUAGE = "zh-CN"
 DEFAULT_TTS_ENGINE = None
-DEFAULT_DEBUG = True
+DEFAULT_DEBUG = "basic"
 DEFAULT_REQUIRE_TOKEN = False
+DEFAULT_AUDIO_QUEUE_SIZE = 50  # 60ms帧，约3秒音频
+DEFAULT_AUDIO_OVERFLOW_POLICY = "drop_oldest"
+DEFAULT_TTS_STREAMING = True
+DEFAULT_AUDIO_TRANSCODE = True  # 上行Opus解码为PCM后再送入STT
+DEFAULT_VAD = False
+DEFAULT_VAD_ENERGY_THRESHOLD = -40  # dBFS
+DEFAULT_VAD_ZCR_THRESHOLD = 0.35    # 每采样点过零率
+DEFAULT_VAD_SILENCE_MS = 500
+DEFAULT_METRICS_SENSORS = False
+DEFAULT_IOT_ENTITIES = True
+DEFAULT_DUPLICATE_POLICY = "replace"
+DEFAULT_SESSION_RESUME_SECONDS = 30  # 0表示断开即释放会话
+DEFAULT_HEARTBEAT_INTERVAL = 30      # 连接空闲多久后发送ping（秒），0表示关闭
+DEFAULT_PIPELINE_IDLE_TIMEOUT = 20   # 收音期间多久没有音频即中止pipeline（秒）
+DEFAULT_PIPELINE_SLOTS = 0           # 同时运行的pipeline数，0表示不限制
+DEFAULT_ADMISSION_QUEUE_SIZE = 8     # 等待名额的请求数上限
+DEFAULT_ADMISSION_TIMEOUT = 15       # 排队等待上限（秒）
+DEFAULT_ADMISSION_PRIORITIES = ""    # "device_id或area_id=优先级"，逗号或换行分隔
+DEFAULT_PREROLL_MS = 600             # 会话建立时补送的请求前音频（毫秒），0表示不缓存
+DEFAULT_INTENT_FAST_PATH = False     # 重复的命令跳过对话代理直接执行
+DEFAULT_TTS_LEAD_FRAMES = 3  # TTS下发时立即发送的帧数（提前缓冲）
+DEFAULT_TTS_CACHE = False  # 启用后语音会话的TTS阶段改由桥接执行，默认保持pipeline自身的TTS
+DEFAULT_TTS_CACHE_MEMORY_MB = 16
+DEFAULT_TTS_CACHE_DISK_MB = 64
+TTS_CACHE_MAX_TEXT_LENGTH = 64  # 超过该长度的回复（多为LLM生成）不缓存
+
+# 调试日志级别（CONF_DEBUG取值）
+DEBUG_LEVEL_OFF = "off"          # 仅警告和错误
+DEBUG_LEVEL_BASIC = "basic"      # 连接、会话等生命周期事件
+DEBUG_LEVEL_VERBOSE = "verbose"  # 每条控制消息和pipeline事件
+DEBUG_LEVEL_TRACE = "trace"      # 音频帧级别日志（限速采样）
+DEBUG_LEVELS = [
+    DEBUG_LEVEL_OFF,
+    DEBUG_LEVEL_BASIC,
+    DEBUG_LEVEL_VERBOSE,
+    DEBUG_LEVEL_TRACE,
+]
+
+# 音频队列溢出策略
+AUDIO_OVERFLOW_BLOCK = "block"
+AUDIO_OVERFLOW_DROP_OLDEST = "drop_oldest"
+AUDIO_OVERFLOW_ABORT = "abort"
+AUDIO_OVERFLOW_POLICIES = [
+    AUDIO_OVERFLOW_BLOCK,
+    AUDIO_OVERFLOW_DROP_OLDEST,
+    AUDIO_OVERFLOW_ABORT,
+]
+
+# 重复device_id的处理策略
+DUPLICATE_POLICY_REPLACE = "replace"  # 关闭旧连接，由新连接接管
+DUPLICATE_POLICY_REJECT = "reject"    # 拒绝新连接
+DUPLICATE_POLICIES = [
+    DUPLICATE_POLICY_REPLACE,
+    DUPLICATE_POLICY_REJECT,
+]
 
 # 设备状态
 DEVICE_STATUS_CONNECTED = "connected"
 DEVICE_STATUS_DISCONNECTED = "disconnected"
 DEVICE_STATUS_LISTENING = "listening"
-DEVICE_STATUS_SPEAKING = "speaking" 
\ No newline at end of file
+DEVICE_STATUS_SPEAKING = "speaking" 
+
+# 可作为广播筛选条件的在线状态
+DEVICE_STATUSES = [
+    DEVICE_STATUS_CONNECTED,
+    DEVICE_STATUS_LISTENING,
+    DEVICE_STATUS_SPEAKING,
+]
@@ -0,0 +1,248 @@
+"""小智终端消息分发
+
+消息类型到处理函数的登记表，取代接收循环中的if/elif链。每种消息按登记的
+方式执行：
+
+- inline：在接收循环中立即执行（hello、abort、ping），不会排在慢消息之后；
+- ordered：在每设备的串行通道中按到达顺序后台执行（pipeline启动、listen、iot），
+  接收循环不等待其完成；登记为会话启动的消息可被abort取消；
+- concurrent：直接后台执行，同时执行的数量受按类型的上限约束（iot_control）。
+
+处理函数外包一层中间件链：异常映射为error回复、按类型限制并发、耗时统计。
+"""
+import asyncio
+import functools
+import logging
+import time
+
+from .const import DOMAIN
+from .metrics import COUNTER_ERRORS
+
+_LOGGER = logging.getLogger(__name__)
+
+MODE_INLINE = "inline"
+MODE_ORDERED = "ordered"
+MODE_CONCURRENT = "concurrent"
+
+# 处理耗时超过该值（秒）时记录日志
+SLOW_HANDLER_SECONDS = 1.0
+
+
+class Route:
+    """一种消息类型的登记项及其处理统计"""
+
+    def __init__(self, msg_type, handler, mode, limit, starts_session):
+        self.msg_type = msg_type
+        self.handler = handler
+        self.mode = mode
+        self.limit = limit
+        self.starts_session = starts_session
+        self.count = 0
+        self.errors = 0
+        self.throttled = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, elapsed):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "count": self.count,
+            "errors": self.errors,
+            "throttled": self.throttled,
+            "mean_ms": round(self.total / self.count * 1000, 1) if self.count else None,
+            "max_ms": round(self.max * 1000, 1),
+        }
+
+
+class MessageContext:
+    """单条消息的处理上下文"""
+
+    __slots__ = ("hass", "ws", "device", "data", "runtime", "msg_type", "route")
+
+    def __init__(self, hass, ws, device, data, runtime):
+        self.hass = hass
+        self.ws = ws
+        self.device = device
+        self.data = data
+        self.runtime = runtime
+        self.msg_type = data.get("type")
+        self.route = None
+
+
+class MessageRouter:
+    """消息类型 → 处理函数的登记表
+
+    处理函数签名统一为 handler(hass, ws, device, data, runtime)；
+    中间件签名为 middleware(ctx, call_next)，按登记顺序由外向内包裹处理函数。
+    """
+
+    def __init__(self):
+        self._routes = {}
+        self._middleware = []
+        self._chain = self._call_handler
+
+    def register(self, msg_type, handler, mode=MODE_ORDERED, limit=None, starts_session=None):
+        """starts_session(data)为真的ordered消息会开始新的会话（abort时取消尚未执行的）"""
+        self._routes[msg_type] = Route(msg_type, handler, mode, limit, starts_session)
+
+    def use(self, middleware):
+        self._middleware.append(middleware)
+        chain = self._call_handler
+        for outer in reversed(self._middleware):
+            chain = functools.partial(outer, call_next=chain)
+        self._chain = chain
+
+    def get(self, msg_type):
+        return self._routes.get(msg_type)
+
+    @staticmethod
+    async def _call_handler(ctx):
+        return await ctx.route.handler(ctx.hass, ctx.ws, ctx.device, ctx.data, ctx.runtime)
+
+    async def dispatch(self, route, ctx):
+        """按登记方式执行；inline消息返回处理函数的结果，其余在后台执行并返回None"""
+        ctx.route = route
+        if route.mode == MODE_INLINE:
+            return await self._chain(ctx)
+        call = functools.partial(self._chain, ctx)
+        name = f"{DOMAIN} {route.msg_type} {ctx.device.device_id}"
+        if route.mode == MODE_ORDERED:
+            starts = route.starts_session is not None and route.starts_session(ctx.data)
+            ctx.device.lane.run_ordered(ctx.hass, call, name, starts_session=starts)
+        else:
+            ctx.device.lane.run(ctx.hass, call, name)
+        return None
+
+    def stats(self):
+        return {msg_type: route.stats() for msg_type, route in self._routes.items() if route.count}
+
+
+class DeviceLane:
+    """每设备的后台消息处理：一个串行通道加若干并发任务
+
+    串行通道不使用常驻任务：每条消息一个任务，等待前一条完成后再执行。
+    """
+
+    def __init__(self):
+        self._tail = None
+        self._starts = set()   # 尚未完成的会话启动
+        self._tasks = set()
+        self._semaphores = {}
+        self.cancelled = 0
+
+    @property
+    def starting(self):
+        """是否有尚未完成的会话启动（期间上行音频暂存在预录缓冲中）"""
+        return bool(self._starts)
+
+    def semaphore(self, msg_type, limit):
+        semaphore = self._semaphores.get(msg_type)
+        if semaphore is None:
+            semaphore = self._semaphores[msg_type] = asyncio.Semaphore(limit)
+        return semaphore
+
+    def run(self, hass, call, name):
+        task = hass.async_create_background_task(call(), name)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def run_ordered(self, hass, call, name, starts_session=False):
+        task = self.run(hass, functools.partial(_run_after, self._tail, call), name)
+        self._tail = task
+        if starts_session:
+            self._starts.add(task)
+            task.add_done_callback(self._starts.discard)
+        return task
+
+    def cancel_starts(self):
+        """取消串行通道中尚未完成的会话启动（abort时），返回取消的数量
+
+        同一通道中的其他消息（如IoT状态）照常执行。
+        """
+        pending = [task for task in self._starts if not task.done()]
+        for task in pending:
+            task.cancel()
+        self.cancelled += len(pending)
+        return len(pending)
+
+    def cancel(self):
+        """设备释放时取消全部后台处理"""
+        for task in self._tasks:
+            task.cancel()
+        self._tail = None
+
+    def stats(self):
+        return {
+            "tasks": len(self._tasks),
+            "starting": len(self._starts),
+            "cancelled": self.cancelled,
+        }
+
+
+async def _run_after(previous, call):
+    if previous is not None and not previous.done():
+        # 前一条无论成功、失败还是被取消都继续，且不受其异常影响
+        await asyncio.wait((previous,))
+    return await call()
+
+
+async def error_middleware(ctx, call_next):
+    """处理函数未捕获的异常记录后回复error，不中断连接"""
+    try:
+        return await call_next(ctx)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        ctx.route.errors += 1
+        ctx.device.metrics.count(COUNTER_ERRORS)
+        _LOGGER.error("❌ 消息处理失败: %s (设备: %s, %s)", ctx.msg_type, ctx.device.device_id, e, exc_info=True)
+        if not ctx.ws.closed:
+            try:
+                await ctx.ws.send_json({
+                    "type": "error",
+                    "data": {"code": error_code(e), "message": str(e), "request": ctx.msg_type},
+                })
+            except Exception:
+                pass
+        return None
+
+
+def error_code(error):
+    """异常到error回复code的映射"""
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    if isinstance(error, (KeyError, ValueError, TypeError)):
+        return "invalid-message"
+    return "internal-error"
+
+
+async def concurrency_middleware(ctx, call_next):
+    """按类型限制同一设备同时执行的数量，超出时排队等待"""
+    limit = ctx.route.limit
+    if not limit:
+        return await call_next(ctx)
+    semaphore = ctx.device.lane.semaphore(ctx.msg_type, limit)
+    if semaphore.locked():
+        ctx.route.throttled += 1
+    async with semaphore:
+        return await call_next(ctx)
+
+
+async def timing_middleware(ctx, call_next):
+    """记录各类型的处理耗时，慢处理输出日志"""
+    started = time.monotonic()
+    try:
+        return await call_next(ctx)
+    finally:
+        elapsed = time.monotonic() - started
+        ctx.route.observe(elapsed)
+        if elapsed > SLOW_HANDLER_SECONDS:
+            ctx.runtime.log.detail("🐢 消息处理较慢: %s %.0fms (设备: %s)",
+                                   ctx.msg_type, elapsed * 1000, ctx.device.device_id)
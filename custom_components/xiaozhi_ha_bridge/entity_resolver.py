@@ -0,0 +1,163 @@
+"""IoT控制目标解析
+
+终端可用实体名称、别名、区域或楼层指定控制目标。名称到entity_id的索引
+按需构建并缓存，实体/设备/区域注册表变化时失效；未命中的名称在索引
+过旧时重建一次，以跟随仅存在于状态属性中的friendly_name变化。
+"""
+import logging
+import re
+import time
+
+from homeassistant.core import callback
+from homeassistant.helpers import area_registry as ar
+from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers import entity_registry as er
+
+try:
+    from homeassistant.helpers import floor_registry as fr
+except ImportError:  # HA 2024.4之前没有楼层
+    fr = None
+
+_LOGGER = logging.getLogger(__name__)
+
+# 名称未命中时，索引超过该时间（秒）才重建
+REBUILD_ON_MISS_AGE = 60
+
+# entity_id格式（"Dr. Light"、"v1.2 灯"之类含点号的名称不是entity_id）
+_ENTITY_ID = re.compile(r"^[a-z_]+\.[a-z0-9_]+$")
+
+# 使索引失效的注册表事件
+INVALIDATING_EVENTS = [
+    er.EVENT_ENTITY_REGISTRY_UPDATED,
+    dr.EVENT_DEVICE_REGISTRY_UPDATED,
+    ar.EVENT_AREA_REGISTRY_UPDATED,
+]
+if fr is not None:
+    INVALIDATING_EVENTS.append(fr.EVENT_FLOOR_REGISTRY_UPDATED)
+
+
+def normalize_name(name):
+    """名称比较时忽略大小写和空白"""
+    return "".join(str(name).split()).casefold()
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
+
+
+class EntityResolver:
+    """名称/区域/楼层 → entity_id 的缓存索引"""
+
+    def __init__(self, hass):
+        self._hass = hass
+        self._names = None   # 规范化名称 -> entity_id元组
+        self._areas = None
+        self._floors = None
+        self._built_at = 0.0
+        self.builds = 0
+        self.invalidations = 0
+
+    @callback
+    def invalidate(self, event=None):
+        """注册表变化时丢弃索引，下次解析时重建"""
+        if self._names is not None:
+            self._names = None
+            self.invalidations += 1
+
+    def _build(self):
+        hass = self._hass
+        entity_registry = er.async_get(hass)
+        device_registry = dr.async_get(hass)
+        names = {}
+        by_area = {}
+
+        def add(index, name, entity_ids):
+            if name:
+                index.setdefault(normalize_name(name), set()).update(entity_ids)
+
+        for entry in entity_registry.entities.values():
+            if entry.disabled_by is not None:
+                continue
+            entity_id = (entry.entity_id,)
+            for name in (entry.entity_id, entry.name, entry.original_name, *(entry.aliases or ())):
+                add(names, name, entity_id)
+            area_id = entry.area_id
+            if area_id is None and entry.device_id is not None:
+                device = device_registry.async_get(entry.device_id)
+                area_id = device.area_id if device is not None else None
+            if area_id is not None:
+                by_area.setdefault(area_id, set()).add(entry.entity_id)
+
+        # 未登记到实体注册表的实体只能按状态中的friendly_name匹配
+        for state in hass.states.async_all():
+            add(names, state.entity_id, (state.entity_id,))
+            add(names, state.attributes.get("friendly_name"), (state.entity_id,))
+
+        areas = {}
+        by_floor = {}
+        for area in ar.async_get(hass).async_list_areas():
+            entity_ids = by_area.get(area.id, ())
+            for name in (area.id, area.name, *(getattr(area, "aliases", None) or ())):
+                add(areas, name, entity_ids)
+            floor_id = getattr(area, "floor_id", None)
+            if floor_id is not None:
+                by_floor.setdefault(floor_id, set()).update(entity_ids)
+
+        floors = {}
+        if fr is not None:
+            for floor in fr.async_get(hass).async_list_floors():
+                entity_ids = by_floor.get(floor.floor_id, ())
+                for name in (floor.floor_id, floor.name, *(floor.aliases or ())):
+                    add(floors, name, entity_ids)
+
+        self._names = {key: tuple(sorted(value)) for key, value in names.items()}
+        self._areas = {key: tuple(sorted(value)) for key, value in areas.items()}
+        self._floors = {key: tuple(sorted(value)) for key, value in floors.items()}
+        self._built_at = time.monotonic()
+        self.builds += 1
+        _LOGGER.debug("🗂️ 实体名称索引已构建: %d个名称, %d个区域, %d个楼层",
+                      len(self._names), len(self._areas), len(self._floors))
+
+    def _lookup(self, attr, name):
+        if self._names is None:
+            self._build()
+        key = normalize_name(name)
+        entity_ids = getattr(self, attr).get(key)
+        if entity_ids is None and time.monotonic() - self._built_at > REBUILD_ON_MISS_AGE:
+            self._build()
+            entity_ids = getattr(self, attr).get(key)
+        return entity_ids
+
+    def resolve(self, action):
+        """解析一条控制动作的目标，返回(entity_id列表, 未能解析的名称列表)"""
+        entity_ids = []
+        unresolved = []
+        for entity_id in _as_list(action.get("entity_id")):
+            # 不是已存在的entity_id时按名称解析
+            if _ENTITY_ID.match(str(entity_id)) and self._hass.states.get(entity_id) is not None:
+                found = (entity_id,)
+            else:
+                found = self._lookup("_names", entity_id)
+            if found:
+                entity_ids.extend(found)
+            else:
+                unresolved.append(entity_id)
+        for key, attr in (("name", "_names"), ("area", "_areas"), ("floor", "_floors")):
+            for name in _as_list(action.get(key)):
+                found = self._lookup(attr, name)
+                if found:
+                    entity_ids.extend(found)
+                else:
+                    unresolved.append(name)
+        return list(dict.fromkeys(entity_ids)), unresolved
+
+    def stats(self):
+        return {
+            "names": len(self._names) if self._names is not None else None,
+            "builds": self.builds,
+            "invalidations": self.invalidations,
+        }
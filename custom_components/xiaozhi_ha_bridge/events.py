@@ -0,0 +1,220 @@
+"""小智设备pipeline事件分发
+
+HA的event_callback是同步回调，这里只负责入队；由每设备唯一的写任务
+按顺序发送到终端，保证run-end等事件不丢失、不乱序。
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+
+_LOGGER = logging.getLogger(__name__)
+
+# 单帧最多合并的事件数
+DEFAULT_MAX_BATCH = 16
+
+# 可合并为一个事件的增量事件
+_DELTA_EVENT = "intent-progress"
+
+# 端点检测事件：同一批中紧邻的"说话结束→再次开始说话"只是一次停顿，可以去掉
+_VAD_START = "stt-vad-start"
+_VAD_END = "stt-vad-end"
+
+
+def event_message(event):
+    """将HA PipelineEvent转换为发往终端的消息"""
+    event_type = getattr(event.type, "value", event.type)
+    return {
+        "type": event_type,
+        "data": getattr(event, "data", None) or {},
+    }
+
+
+def _delta_content(message):
+    """仅含文本增量的intent-progress事件返回其文本，否则返回None"""
+    if message["type"] != _DELTA_EVENT:
+        return None
+    delta = message["data"].get("chat_log_delta")
+    if not isinstance(delta, dict) or set(delta) - {"content"}:
+        return None
+    content = delta.get("content")
+    return content if isinstance(content, str) else None
+
+
+def coalesce(messages):
+    """合并同一批中可合并的事件，其余事件保持原样和顺序
+
+    - 相邻的纯文本intent-progress增量合并为一个；
+    - 紧邻的stt-vad-end、stt-vad-start成对去掉，连续的说话片段合并为
+      一对start/end（如start,end,start,end → start,end）。
+    """
+    merged = []
+    pending = None
+    for message in messages:
+        content = _delta_content(message)
+        if content is None:
+            if pending is not None:
+                merged.append(pending)
+                pending = None
+            if message["type"] == _VAD_START and merged and merged[-1]["type"] == _VAD_END:
+                merged.pop()
+                continue
+            merged.append(message)
+        elif pending is None:
+            pending = message
+        else:
+            pending = {
+                "type": _DELTA_EVENT,
+                "data": {
+                    **pending["data"],
+                    "chat_log_delta": {
+                        "content": pending["data"]["chat_log_delta"]["content"] + content
+                    },
+                },
+            }
+    if pending is not None:
+        merged.append(pending)
+    return merged
+
+
+class PipelineEventDispatcher:
+    """每设备pipeline事件分发器：有序队列 + 单写任务
+
+    on_sent(message) 在消息发出后按顺序调用，用于设备状态切换。
+    终端在hello中声明 features.event_batch 后，一次积压的多个事件
+    会合并为一个 {"type": "batch", "events": [...]} 帧发送。
+
+    事件按所属会话（begin_run返回的编号）标记：新会话开始后，被替换会话
+    尚未发出的事件以及其pipeline之后产生的事件都被丢弃，不会结束新会话。
+    """
+
+    def __init__(self, device, on_sent=None, max_batch=DEFAULT_MAX_BATCH):
+        self._device = device
+        self._on_sent = on_sent
+        self._max_batch = max(1, max_batch)
+        self._queue = deque()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self.batch_enabled = False
+        self.run = 0  # 当前会话编号
+        # 统计计数
+        self.stale = 0
+        self.events = 0
+        self.frames = 0
+        self.coalesced = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def start(self, hass):
+        """启动写任务"""
+        if self._task is None:
+            self._task = hass.async_create_background_task(
+                self._run(), f"xiaozhi event dispatcher {self._device.device_id}"
+            )
+
+    async def stop(self):
+        """停止写任务并丢弃未发送的事件"""
+        task, self._task = self._task, None
+        self._queue.clear()
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def begin_run(self):
+        """开始新的会话，丢弃之前会话尚未发出的事件，返回新会话的编号"""
+        self.run += 1
+        self.stale += len(self._queue)
+        self._queue.clear()
+        return self.run
+
+    def publish(self, event, run=None):
+        """HA pipeline事件回调（同步，只入队）；run为产生事件的会话，已被替换时丢弃"""
+        if run is not None and run != self.run:
+            self.stale += 1
+            return
+        self._queue.append((time.monotonic(), event_message(event), self.run))
+        self._wakeup.set()
+
+    def send(self, event_type, data=None):
+        """排入一条桥接自身产生的事件（属于当前会话），与pipeline事件共用顺序"""
+        self._queue.append((time.monotonic(), {"type": event_type, "data": data or {}}, self.run))
+        self._wakeup.set()
+
+    @property
+    def depth(self):
+        """待发送事件数"""
+        return len(self._queue)
+
+    async def _run(self):
+        queue = self._queue
+        while True:
+            if not queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            # 取出当前积压的一批事件
+            batch = []
+            while queue and len(batch) < self._max_batch:
+                batch.append(queue.popleft())
+            enqueued = [item[0] for item in batch]
+
+            # 设备断开等待恢复期间暂存事件，恢复后按原顺序补发
+            online = getattr(self._device, "online", None)
+            if online is not None and not online.is_set():
+                await online.wait()
+
+            # 等待期间会话可能已被替换，只发送当前会话的事件
+            run = self.run
+            live = [item[1] for item in batch if item[2] == run]
+            self.stale += len(batch) - len(live)
+            messages = coalesce(live)
+            self.coalesced += len(live) - len(messages)
+
+            try:
+                await self._write(messages)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                _LOGGER.warning("⚠️ Pipeline事件发送失败: %s (%s)", self._device.device_id, e)
+
+            now = time.monotonic()
+            for queued_at in enqueued:
+                latency = now - queued_at
+                self.latency_total += latency
+                if latency > self.latency_max:
+                    self.latency_max = latency
+            self.events += len(enqueued)
+
+            # 发送后按顺序切换设备状态（发送期间会话被替换时不再生效）
+            if self._on_sent is not None and run == self.run:
+                for message in messages:
+                    try:
+                        self._on_sent(self._device, message)
+                    except Exception as e:
+                        _LOGGER.error("❌ Pipeline事件处理失败: %s", e)
+
+    async def _write(self, messages):
+        ws = self._device.ws
+        if self.batch_enabled and len(messages) > 1:
+            await ws.send_json({"type": "batch", "events": messages})
+            self.frames += 1
+            return
+        for message in messages:
+            await ws.send_json(message)
+            self.frames += 1
+
+    def stats(self):
+        """返回分发统计信息"""
+        return {
+            "depth": len(self._queue),
+            "events": self.events,
+            "frames": self.frames,
+            "coalesced": self.coalesced,
+            "stale": self.stale,
+            "latency_avg_ms": round(self.latency_total / self.events * 1000, 2) if self.events else 0.0,
+            "latency_max_ms": round(self.latency_max * 1000, 2),
+        }
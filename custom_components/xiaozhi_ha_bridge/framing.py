@@ -0,0 +1,27 @@
+"""小智二进制音频帧解析
+
+帧格式：1字节handler_id + Opus负载；单字节帧为音频流结束标记。
+"""
+
+# 预先生成的单字节结束标记，发送时不再逐次分配
+END_MARKERS = tuple(bytes((handler_id,)) for handler_id in range(256))
+
+
+def end_marker(handler_id):
+    """返回handler_id对应的结束标记"""
+    return END_MARKERS[handler_id & 0xFF]
+
+
+def is_end_marker(data):
+    """判断二进制帧是否为音频流结束标记"""
+    return len(data) == 1
+
+
+def split_frame(data):
+    """拆分音频帧为(handler_id, payload)
+
+    负载直接切片复制：Opus上行帧只有几十到两百字节，memoryview本身及其缓冲区
+    对象约占两百余字节，单帧耗时也更长（见benchmarks/bench_audio_framing.py），
+    不值得为避免复制而使用。
+    """
+    return data[0], data[1:]
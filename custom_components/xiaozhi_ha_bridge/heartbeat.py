@@ -0,0 +1,214 @@
+"""小智连接心跳与空闲回收
+
+每个条目只有一个时间轮和一个驱动任务，所有设备的检查时间都挂在时间轮上：
+到期时向空闲的连接发送WebSocket ping并测量往返时延，ping无响应的半开连接
+和长时间收不到音频的pipeline被主动关闭/中止。收到消息只更新时间戳，
+不重新调度，每条连接没有单独的任务或定时器。
+"""
+import asyncio
+import logging
+import struct
+import time
+
+from aiohttp import WSCloseCode
+
+from .const import DOMAIN
+from .metrics import STAGE_RTT, COUNTER_REAPED
+from .websocket_api import abort_pipeline
+
+_LOGGER = logging.getLogger(__name__)
+
+# 时间轮刻度（秒）与槽数；超过一圈的延迟按圈数计
+TICK_SECONDS = 1.0
+WHEEL_SLOTS = 64
+
+# 发出ping后等待pong的时间（秒），超时视为连接已死
+PONG_TIMEOUT = 10
+
+# 心跳关闭时的检查间隔（秒）：只检查卡住的pipeline
+IDLE_CHECK_SECONDS = 5
+
+
+class TimerWheel:
+    """哈希时间轮：O(1)调度与取消，每个刻度只处理到期的槽"""
+
+    def __init__(self, slots=WHEEL_SLOTS, tick=TICK_SECONDS):
+        self._slots = [dict() for _ in range(slots)]
+        self._tick = tick
+        self._cursor = 0
+        self._where = {}  # 条目 -> 槽索引
+
+    def __len__(self):
+        return len(self._where)
+
+    def schedule(self, item, delay):
+        """delay秒后到期（至少一个刻度）；已调度的条目会被移动"""
+        self.cancel(item)
+        ticks = max(1, int(-(-delay // self._tick)))
+        rounds, offset = divmod(ticks, len(self._slots))
+        if offset == 0:
+            rounds, offset = rounds - 1, len(self._slots)
+        index = (self._cursor + offset) % len(self._slots)
+        self._slots[index][item] = rounds
+        self._where[item] = index
+
+    def cancel(self, item):
+        index = self._where.pop(item, None)
+        if index is not None:
+            self._slots[index].pop(item, None)
+
+    def advance(self):
+        """前进一个刻度，返回到期的条目"""
+        self._cursor = (self._cursor + 1) % len(self._slots)
+        slot = self._slots[self._cursor]
+        expired = []
+        for item, rounds in list(slot.items()):
+            if rounds > 0:
+                slot[item] = rounds - 1
+            else:
+                del slot[item]
+                del self._where[item]
+                expired.append(item)
+        return expired
+
+
+class HeartbeatMonitor:
+    """条目级心跳：ping空闲连接、回收半开连接和卡住的pipeline"""
+
+    def __init__(self, hass, entry_data):
+        self._hass = hass
+        self._entry_data = entry_data
+        self._wheel = TimerWheel()
+        self._task = None
+        self.pings = 0
+        self.reaped = 0
+        self.pipelines_aborted = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = self._hass.async_create_background_task(
+                self._run(), f"{DOMAIN} heartbeat"
+            )
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def track(self, device):
+        """开始跟踪设备（连接建立或会话恢复时）"""
+        device.ping_sent_at = None
+        interval = self._entry_data["runtime"].heartbeat_interval
+        self._wheel.schedule(device, interval if interval > 0 else IDLE_CHECK_SECONDS)
+
+    def reschedule(self):
+        """心跳间隔变更后按新间隔重新调度在线设备（等待pong的设备不变）"""
+        interval = self._entry_data["runtime"].heartbeat_interval
+        for device in self._entry_data["devices"].values():
+            if device.ping_sent_at is None:
+                self._wheel.schedule(device, interval if interval > 0 else IDLE_CHECK_SECONDS)
+
+    def untrack(self, device):
+        self._wheel.cancel(device)
+
+    def pong(self, device, payload):
+        """收到pong：按ping携带的发送时间计算往返时延"""
+        device.ping_sent_at = None
+        if len(payload) == 8:
+            device.rtt = time.monotonic() - struct.unpack("!d", payload)[0]
+            device.metrics.observe(STAGE_RTT, device.rtt)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            next_tick += TICK_SECONDS
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            for device in self._wheel.advance():
+                try:
+                    self._check(device)
+                except Exception as e:
+                    _LOGGER.error("❌ 心跳检查失败: %s (%s)", device.device_id, e)
+
+    def _check(self, device):
+        if device.ws.closed:
+            return
+        runtime = self._entry_data["runtime"]
+        interval = runtime.heartbeat_interval
+        timeout = runtime.pipeline_idle_timeout
+        now = time.monotonic()
+
+        # 卡住的pipeline：音频流未结束但长时间没有新的音频（与心跳是否启用无关）
+        pipeline_active = device.current_pipeline is not None and not device.stream_ended
+        if timeout > 0 and pipeline_active and now - device.last_audio > timeout:
+            pipeline_active = False
+            self.pipelines_aborted += 1
+            _LOGGER.warning("⏱️ %ds未收到音频，中止pipeline: %s", timeout, device.device_id)
+            self._hass.async_create_background_task(
+                _async_abort_idle_pipeline(device), f"{DOMAIN} abort idle {device.device_id}"
+            )
+
+        if interval <= 0:
+            # 心跳关闭时设备仍留在时间轮上，继续空闲pipeline检查，间隔改回正数后恢复心跳
+            device.ping_sent_at = None
+            delay = IDLE_CHECK_SECONDS
+        elif device.ping_sent_at is not None and device.last_activity > device.ping_sent_at:
+            # ping后收到过其他消息：连接仍然存活，不必等待pong
+            device.ping_sent_at = None
+            delay = interval - (now - device.last_activity)
+        elif device.ping_sent_at is not None and now - device.ping_sent_at >= PONG_TIMEOUT:
+            # ping后没有任何响应：半开连接，主动关闭并交由连接清理流程处理
+            self.reaped += 1
+            device.metrics.count(COUNTER_REAPED)
+            _LOGGER.warning("💀 心跳超时，关闭连接: %s (空闲%.0fs)", device.device_id, now - device.last_activity)
+            self._hass.async_create_background_task(
+                device.ws.close(code=WSCloseCode.GOING_AWAY, message=b"heartbeat timeout"),
+                f"{DOMAIN} reap {device.device_id}",
+            )
+            return
+        elif device.ping_sent_at is not None:
+            delay = PONG_TIMEOUT - (now - device.ping_sent_at)
+        elif now - device.last_activity >= interval:
+            device.ping_sent_at = now
+            self.pings += 1
+            self._hass.async_create_background_task(
+                _async_ping(device, now), f"{DOMAIN} ping {device.device_id}"
+            )
+            delay = PONG_TIMEOUT
+        else:
+            # 期间有过消息：推迟到最后一次活动后的一个心跳间隔
+            delay = interval - (now - device.last_activity)
+
+        if pipeline_active and timeout > 0:
+            delay = min(delay, timeout - (now - device.last_audio))
+        self._wheel.schedule(device, delay)
+
+    def stats(self):
+        return {
+            "tracked": len(self._wheel),
+            "pings": self.pings,
+            "reaped": self.reaped,
+            "pipelines_aborted": self.pipelines_aborted,
+        }
+
+
+async def _async_ping(device, sent_at):
+    try:
+        await device.ws.ping(struct.pack("!d", sent_at))
+    except Exception as e:
+        _LOGGER.debug("心跳ping发送失败: %s (%s)", device.device_id, e)
+
+
+async def _async_abort_idle_pipeline(device):
+    await abort_pipeline(device)
+    try:
+        await device.ws.send_json({
+            "type": "error",
+            "data": {"code": "audio-timeout", "message": "长时间未收到音频，会话已中止"},
+        })
+    except Exception:
+        pass
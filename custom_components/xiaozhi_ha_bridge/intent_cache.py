@@ -0,0 +1,133 @@
+"""常用语音命令的本地快速通道
+
+对话代理（尤其是LLM）处理一句话往往需要数秒，而"打开客厅灯"这类命令每天
+重复出现、每次都解析为同一个意图。对话代理成功执行过的命令按规范化文本
+记录其意图类型、槽位与回复文本（LRU），再次出现时直接通过intent.async_handle
+执行，不经过对话代理。只记录执行类命令，查询类的回复随状态变化，不缓存。实体/设备/区域注册表变化时全部失效，避免槽位指向过期的名称。
+"""
+import logging
+import re
+from collections import OrderedDict
+
+from homeassistant.core import callback
+from homeassistant.helpers import intent
+
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+# 记录的命令条数上限
+INTENT_CACHE_SIZE = 256
+
+# 比较时忽略空白、标点和大小写（"打开客厅灯。"与"打开客厅灯"视为同一句）
+_IGNORED = re.compile(r"[\W_]+")
+
+
+def normalize_utterance(text):
+    return _IGNORED.sub("", str(text)).casefold()
+
+
+class CachedIntent:
+    """一条已解析的命令"""
+
+    __slots__ = ("intent_type", "slots", "speech")
+
+    def __init__(self, intent_type, slots, speech=None):
+        self.intent_type = intent_type
+        self.slots = slots
+        self.speech = speech  # 对话代理的回复文本，意图处理本身没有回复时使用
+
+
+class IntentFastPath:
+    """规范化文本 → 意图的LRU缓存"""
+
+    def __init__(self, hass, maxsize=INTENT_CACHE_SIZE):
+        self._hass = hass
+        self._maxsize = maxsize
+        self._entries = OrderedDict()  # (语言, 规范化文本) -> CachedIntent
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.failures = 0
+        self.invalidations = 0
+
+    @callback
+    def invalidate(self, event=None):
+        """注册表变化时清空（槽位中的名称可能已指向其他实体）"""
+        if self._entries:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def lookup(self, language, text):
+        key = (language, normalize_utterance(text))
+        cached = self._entries.get(key)
+        if cached is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        return cached
+
+    def learn(self, language, text, response):
+        """记录对话代理的处理结果；只有成功执行且带有意图信息的命令才会记录"""
+        handled = getattr(response, "intent", None)
+        if (handled is None
+                or response.response_type != intent.IntentResponseType.ACTION_DONE
+                or getattr(response, "failed_results", None)):
+            return False
+        key = (language, normalize_utterance(text))
+        if not key[1]:
+            return False
+        slots = {
+            name: {"value": slot["value"]}
+            for name, slot in (handled.slots or {}).items()
+            if isinstance(slot, dict) and "value" in slot
+        }
+        self._entries[key] = CachedIntent(handled.intent_type, slots, _plain_speech(response))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+        self.stores += 1
+        return True
+
+    async def async_execute(self, cached, language, text, context, device_id=None):
+        """直接执行缓存的意图，返回IntentResponse；执行失败时移除该条并返回None"""
+        try:
+            response = await intent.async_handle(
+                self._hass,
+                DOMAIN,
+                cached.intent_type,
+                cached.slots,
+                text_input=text,
+                context=context,
+                language=language,
+                device_id=device_id,
+            )
+        except Exception as e:
+            # 包括意图处理器不接受某些参数（如旧版本没有device_id）等任何异常
+            response = None
+            _LOGGER.debug("快速通道意图执行失败，交由对话代理: %s (%s)", text, e)
+        if response is None or response.response_type == intent.IntentResponseType.ERROR:
+            self._entries.pop((language, normalize_utterance(text)), None)
+            self.failures += 1
+            self.misses += 1
+            return None
+        if cached.speech and not _plain_speech(response):
+            response.async_set_speech(cached.speech)
+        self.hits += 1
+        return response
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "stores": self.stores,
+            "failures": self.failures,
+            "invalidations": self.invalidations,
+        }
+
+
+def _plain_speech(response):
+    return ((getattr(response, "speech", None) or {}).get("plain") or {}).get("speech")
@@ -0,0 +1,173 @@
+"""小智设备IoT能力描述与状态
+
+同型号终端上报的能力描述完全相同，按内容哈希在条目内共享一份；
+状态更新按属性比较，只记录发生变化的属性并维护变更序号，
+确认消息在短时间窗口内合并为一条发送。
+"""
+import asyncio
+import hashlib
+import json
+import logging
+
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+# 确认消息合并窗口（秒）
+ACK_DELAY = 0.5
+
+
+def descriptor_hash(descriptors):
+    """能力描述的内容哈希（与键顺序无关）"""
+    canonical = json.dumps(descriptors, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+class DescriptorPool:
+    """条目内共享的能力描述池（按引用计数释放）"""
+
+    def __init__(self):
+        self._entries = {}  # hash -> [descriptors, refcount]
+        self.interned = 0
+        self.shared = 0
+
+    def acquire(self, key, descriptors):
+        """按哈希登记一份能力描述，返回共享的描述"""
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = [tuple(descriptors), 0]
+            self.interned += 1
+        else:
+            self.shared += 1
+        entry[1] += 1
+        return entry[0]
+
+    def release(self, key):
+        """释放一次引用，无设备引用时删除"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del self._entries[key]
+
+    def stats(self):
+        return {
+            "unique": len(self._entries),
+            "references": sum(entry[1] for entry in self._entries.values()),
+            "interned": self.interned,
+            "shared": self.shared,
+        }
+
+
+class DeviceIot:
+    """单个设备的IoT描述与状态
+
+    states为 {组件名: {属性: 值}}；每次有属性变化的更新使seq加一，
+    并记录各属性最后变化时的seq，可按序号取出增量。
+    """
+
+    def __init__(self, pool):
+        self._pool = pool
+        self._descriptor_key = None
+        self.descriptors = ()
+        self.states = {}
+        self.seq = 0
+        self._changed_at = {}  # (组件名, 属性) -> seq
+        self.updates = 0
+        self.unchanged = 0
+        self._pending_acks = 0
+        self._ack_handle = None
+
+    @property
+    def descriptor_key(self):
+        return self._descriptor_key
+
+    def set_descriptors(self, descriptors):
+        """替换能力描述；内容未变化时返回False"""
+        key = descriptor_hash(descriptors)
+        if key == self._descriptor_key:
+            return False
+        if self._descriptor_key is not None:
+            self._pool.release(self._descriptor_key)
+        self.descriptors = self._pool.acquire(key, descriptors)
+        self._descriptor_key = key
+        return True
+
+    def apply_states(self, states):
+        """合并状态更新，返回 {组件名: {属性: 新值}}（仅包含变化的属性）"""
+        self.updates += 1
+        changes = {}
+        seq = self.seq + 1
+        for state_info in states:
+            name = state_info.get("name")
+            state = state_info.get("state")
+            if name is None or not isinstance(state, dict):
+                continue
+            current = self.states.setdefault(name, {})
+            for prop, value in state.items():
+                if prop in current and current[prop] == value:
+                    continue
+                current[prop] = value
+                self._changed_at[(name, prop)] = seq
+                changes.setdefault(name, {})[prop] = value
+        if changes:
+            self.seq = seq
+        else:
+            self.unchanged += 1
+        return changes
+
+    def changes_since(self, seq):
+        """取出序号seq之后变化的属性 {组件名: {属性: 当前值}}"""
+        changes = {}
+        for (name, prop), changed in self._changed_at.items():
+            if changed > seq:
+                changes.setdefault(name, {})[prop] = self.states[name][prop]
+        return changes
+
+    def schedule_ack(self, hass, device):
+        """合并确认：窗口内的多条IoT消息只回复一次"""
+        self._pending_acks += 1
+        if self._ack_handle is not None:
+            return
+
+        def flush():
+            self._ack_handle = None
+            hass.async_create_background_task(self._async_send_ack(device), f"{DOMAIN} iot ack {device.device_id}")
+
+        self._ack_handle = asyncio.get_running_loop().call_later(ACK_DELAY, flush)
+
+    async def _async_send_ack(self, device):
+        count, self._pending_acks = self._pending_acks, 0
+        # 断开等待恢复期间不回复，恢复的hello中已带有IoT信息
+        if not count or not device.online.is_set() or device.ws.closed:
+            return
+        try:
+            await device.ws.send_json({
+                "type": "iot",
+                "status": "ok",
+                "message": "IoT信息已接收",
+                "seq": self.seq,
+                "count": count,
+            })
+        except Exception as e:
+            _LOGGER.debug("IoT确认发送失败: %s (%s)", device.device_id, e)
+
+    def release(self):
+        """设备释放时归还描述引用并取消待发确认"""
+        if self._ack_handle is not None:
+            self._ack_handle.cancel()
+            self._ack_handle = None
+        if self._descriptor_key is not None:
+            self._pool.release(self._descriptor_key)
+            self._descriptor_key = None
+            self.descriptors = ()
+
+    def stats(self):
+        return {
+            "components": len(self.states),
+            "seq": self.seq,
+            "updates": self.updates,
+            "unchanged": self.unchanged,
+            "descriptor": self._descriptor_key[:8] if self._descriptor_key else None,
+        }
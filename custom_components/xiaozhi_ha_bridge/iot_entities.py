@@ -0,0 +1,162 @@
+"""小智终端IoT状态实体
+
+根据终端上报的能力描述为每个属性创建实体（数值/字符串为sensor，布尔为
+binary_sensor）。状态更新先标记对应实体，在去抖窗口结束时统一写入，
+同一实体在窗口内的多次变化只产生一次状态写入。
+"""
+import asyncio
+import logging
+
+from homeassistant.core import callback
+
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+# 状态写入去抖窗口（秒）
+DEBOUNCE_SECONDS = 1.0
+
+PROPERTY_TYPE_BOOLEAN = "boolean"
+
+
+def iter_properties(descriptors):
+    """遍历能力描述中的属性，产生(组件名, 组件描述, 属性名, 属性定义)"""
+    for descriptor in descriptors:
+        name = descriptor.get("name")
+        properties = descriptor.get("properties")
+        if not name or not isinstance(properties, dict):
+            continue
+        for prop, spec in properties.items():
+            yield name, descriptor.get("description"), prop, spec if isinstance(spec, dict) else {}
+
+
+class IotEntityManager:
+    """按设备管理IoT实体，并合并状态写入"""
+
+    def __init__(self, entry, devices):
+        self.entry_id = entry.entry_id
+        self._devices = devices
+        self._platforms = {}   # 平台 -> (async_add_entities, 实体工厂)
+        self._entities = {}    # (device_id, 组件名, 属性名) -> 实体
+        self._by_device = {}   # device_id -> 该设备的实体键
+        self._dirty = set()
+        self._flush_handle = None
+        self.updates = 0
+        self.writes = 0
+
+    def register_platform(self, platform, async_add_entities, factory):
+        """平台加载时登记；factory(manager, device_id, 组件名, 组件描述, 属性名, 属性定义)返回实体或None"""
+        self._platforms[platform] = (async_add_entities, factory)
+        for device in self._devices.values():
+            self._add_entities(device, (platform,))
+
+    def device(self, device_id):
+        """实体对应的在线设备"""
+        return self._devices.get(device_id)
+
+    @callback
+    def add_device(self, device):
+        """设备上报（新的）能力描述后创建尚不存在的实体"""
+        self._add_entities(device, tuple(self._platforms))
+        self.device_changed(device.device_id)
+
+    def _add_entities(self, device, platforms):
+        if device.anonymous:
+            # 匿名终端每次连接的device_id都不同，创建的设备与实体下次连接时就成了孤儿
+            return
+        device_id = device.device_id
+        keys = self._by_device.setdefault(device_id, set())
+        for platform in platforms:
+            async_add_entities, factory = self._platforms[platform]
+            new_entities = []
+            for name, description, prop, spec in iter_properties(device.iot.descriptors):
+                key = (device_id, name, prop)
+                if key in self._entities:
+                    continue
+                entity = factory(self, device_id, name, description, prop, spec)
+                if entity is None:
+                    continue
+                self._entities[key] = entity
+                keys.add(key)
+                new_entities.append(entity)
+            if new_entities:
+                async_add_entities(new_entities)
+                _LOGGER.debug("🏠 创建IoT实体: %s (%s, %d个)", device_id, platform, len(new_entities))
+
+    @callback
+    def state_changed(self, device_id, changes):
+        """标记发生变化的属性对应的实体，去抖后写入"""
+        for name, props in changes.items():
+            for prop in props:
+                entity = self._entities.get((device_id, name, prop))
+                if entity is not None:
+                    self._dirty.add(entity)
+                    self.updates += 1
+        self._schedule()
+
+    @callback
+    def device_changed(self, device_id):
+        """设备上下线时刷新其全部实体的可用状态"""
+        for key in self._by_device.get(device_id, ()):
+            self._dirty.add(self._entities[key])
+        self._schedule()
+
+    def _schedule(self):
+        if self._dirty and self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(DEBOUNCE_SECONDS, self._flush)
+
+    @callback
+    def _flush(self):
+        """一次性写入窗口内变化过的实体"""
+        self._flush_handle = None
+        dirty, self._dirty = self._dirty, set()
+        for entity in dirty:
+            if entity.hass is None:
+                continue
+            entity.async_write_ha_state()
+            self.writes += 1
+
+    def shutdown(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self._dirty.clear()
+
+    def stats(self):
+        return {
+            "entities": len(self._entities),
+            "updates": self.updates,
+            "writes": self.writes,
+        }
+
+
+class IotEntityMixin:
+    """IoT属性实体公共部分：值从设备当前状态读取，不主动轮询"""
+
+    _attr_has_entity_name = True
+    _attr_should_poll = False
+
+    def __init__(self, manager, device_id, name, description, prop, spec):
+        self._manager = manager
+        self._device_id = device_id
+        self._component = name
+        self._prop = prop
+        self._attr_name = f"{description or name} {spec.get('description') or prop}"
+        self._attr_unique_id = f"{manager.entry_id}_{device_id}_{name}_{prop}"
+        self._attr_device_info = {
+            "identifiers": {(DOMAIN, device_id)},
+            "name": device_id,
+            "manufacturer": "Xiaozhi",
+            "model": "Xiaozhi Terminal",
+        }
+
+    @property
+    def available(self):
+        device = self._manager.device(self._device_id)
+        return device is not None and self._prop in device.iot.states.get(self._component, {})
+
+    def iot_value(self):
+        device = self._manager.device(self._device_id)
+        if device is None:
+            return None
+        return device.iot.states.get(self._component, {}).get(self._prop)
@@ -0,0 +1,123 @@
+"""小智HA桥接日志工具
+
+CONF_DEBUG选择日志分级；热路径（音频帧等）日志先做一次属性判断，
+未启用时不会格式化参数，启用时再按设备限速和采样。
+"""
+import logging
+import time
+
+from .const import (
+    DEBUG_LEVEL_OFF,
+    DEBUG_LEVEL_BASIC,
+    DEBUG_LEVEL_VERBOSE,
+    DEBUG_LEVEL_TRACE,
+    DEBUG_LEVELS,
+)
+
+TIER_OFF = 0
+TIER_BASIC = 1
+TIER_VERBOSE = 2
+TIER_TRACE = 3
+
+_TIERS = {
+    DEBUG_LEVEL_OFF: TIER_OFF,
+    DEBUG_LEVEL_BASIC: TIER_BASIC,
+    DEBUG_LEVEL_VERBOSE: TIER_VERBOSE,
+    DEBUG_LEVEL_TRACE: TIER_TRACE,
+}
+
+# 热路径日志默认限速：每设备每秒2条，突发5条；其余按1/50采样计数
+DEFAULT_HOT_RATE = 2.0
+DEFAULT_HOT_BURST = 5
+DEFAULT_HOT_SAMPLE = 50
+
+
+def normalize_debug_level(value):
+    """将CONF_DEBUG的取值规范化为日志级别（兼容旧版布尔值）"""
+    if value is True:
+        return DEBUG_LEVEL_VERBOSE
+    if value is False or value is None:
+        return DEBUG_LEVEL_OFF
+    if value in DEBUG_LEVELS:
+        return value
+    return DEBUG_LEVEL_BASIC
+
+
+class _HotState:
+    """单个设备的热路径限速状态"""
+
+    __slots__ = ("tokens", "updated", "seen", "suppressed")
+
+    def __init__(self, burst, now):
+        self.tokens = float(burst)
+        self.updated = now
+        self.seen = 0
+        self.suppressed = 0
+
+
+class BridgeLogger:
+    """按CONF_DEBUG分级的日志包装
+
+    调用方在热路径上应先判断 ``log.trace`` / ``log.verbose`` 属性，
+    再调用对应方法，以免在关闭时构造日志参数。
+    """
+
+    def __init__(self, logger, level=DEBUG_LEVEL_BASIC,
+                 hot_rate=DEFAULT_HOT_RATE, hot_burst=DEFAULT_HOT_BURST,
+                 hot_sample=DEFAULT_HOT_SAMPLE):
+        self.logger = logger
+        self.level = normalize_debug_level(level)
+        tier = _TIERS[self.level]
+        self.basic = tier >= TIER_BASIC
+        self.verbose = tier >= TIER_VERBOSE
+        self.trace = tier >= TIER_TRACE
+        self._hot_rate = hot_rate
+        self._hot_burst = hot_burst
+        self._hot_sample = max(1, hot_sample)
+        self._hot = {}
+        self.suppressed = 0  # 因限速未输出的音频帧日志条数
+
+    def info(self, msg, *args):
+        """生命周期事件（basic及以上）"""
+        if self.basic:
+            self.logger.info(msg, *args)
+
+    def detail(self, msg, *args):
+        """控制消息和pipeline事件（verbose及以上）"""
+        if self.verbose and self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(msg, *args)
+
+    def hot(self, key, msg, *args):
+        """音频帧级别日志（trace），按key（设备ID）限速并采样"""
+        if not self.trace or not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        now = time.monotonic()
+        state = self._hot.get(key)
+        if state is None:
+            state = self._hot[key] = _HotState(self._hot_burst, now)
+        state.seen += 1
+        state.tokens = min(
+            self._hot_burst, state.tokens + (now - state.updated) * self._hot_rate
+        )
+        state.updated = now
+        if state.tokens >= 1.0:
+            state.tokens -= 1.0
+        elif state.seen % self._hot_sample:
+            state.suppressed += 1
+            self.suppressed += 1
+            return
+        suppressed, state.suppressed = state.suppressed, 0
+        if suppressed:
+            self.logger.debug(msg + " (已抑制%d条)", *args, suppressed)
+        else:
+            self.logger.debug(msg, *args)
+
+    def forget(self, key):
+        """设备断开后释放其限速状态"""
+        self._hot.pop(key, None)
+
+    def stats(self):
+        return {
+            "hot_keys": len(self._hot),
+            "suppressed": self.suppressed,
+        }
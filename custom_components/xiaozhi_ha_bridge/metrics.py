@@ -0,0 +1,234 @@
+"""小智桥接分阶段耗时与计数指标
+
+每个设备、每个配置条目各一组直方图和计数器，以Prometheus文本格式
+输出，也供可选的HA传感器读取。记录一次耗时只是几次加法，可在热路径调用。
+各组件自身的stats()在输出时读取，以gauge形式附在后面。
+"""
+import bisect
+import re
+import time
+
+# 各阶段耗时（秒）
+STAGE_HANDSHAKE = "handshake"              # 连接建立 → hello响应
+STAGE_RUN_START = "run_start"              # listen start/assist_pipeline/run → run-start
+STAGE_STT = "stt"                          # stt-start → stt-end
+STAGE_INTENT = "intent"                    # intent-start → intent-end
+STAGE_TTS_FIRST_AUDIO = "tts_first_audio"  # tts-start → 首个音频帧发出
+STAGE_TURN = "turn"                        # 请求开始 → 回复播放完毕
+STAGE_RTT = "rtt"                          # 服务端ping → pong
+STAGE_ABORT = "abort"                      # 收到abort → 播放停止并回复
+STAGE_ADMISSION = "admission"              # 等待pipeline名额
+STAGES = (
+    STAGE_HANDSHAKE,
+    STAGE_RUN_START,
+    STAGE_STT,
+    STAGE_INTENT,
+    STAGE_TTS_FIRST_AUDIO,
+    STAGE_TURN,
+    STAGE_RTT,
+    STAGE_ABORT,
+    STAGE_ADMISSION,
+)
+
+# 计数器
+COUNTER_FRAMES_IN = "frames_in"
+COUNTER_BYTES_IN = "bytes_in"
+COUNTER_FRAMES_OUT = "frames_out"
+COUNTER_BYTES_OUT = "bytes_out"
+COUNTER_ERRORS = "errors"
+COUNTER_ABORTS = "aborts"
+COUNTER_REAPED = "reaped"  # 心跳超时被关闭的连接
+COUNTER_REJECTED = "rejected"  # 未获准入的pipeline请求
+COUNTER_INTENT_HITS = "intent_hits"      # 快速通道直接执行的命令
+COUNTER_INTENT_MISSES = "intent_misses"  # 交给对话代理的命令（快速通道启用时）
+COUNTERS = (
+    COUNTER_FRAMES_IN,
+    COUNTER_BYTES_IN,
+    COUNTER_FRAMES_OUT,
+    COUNTER_BYTES_OUT,
+    COUNTER_ERRORS,
+    COUNTER_ABORTS,
+    COUNTER_REAPED,
+    COUNTER_REJECTED,
+    COUNTER_INTENT_HITS,
+    COUNTER_INTENT_MISSES,
+)
+
+# 直方图桶上界（秒）
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """固定桶直方图"""
+
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # 最后一个为+Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """按桶内线性插值估算分位数（秒）"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                if index == len(BUCKETS):
+                    return BUCKETS[-1]
+                upper = BUCKETS[index]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+            if index < len(BUCKETS):
+                lower = BUCKETS[index]
+        return BUCKETS[-1]
+
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+
+class MetricSet:
+    """一组阶段直方图与计数器"""
+
+    def __init__(self):
+        self.histograms = {stage: Histogram() for stage in STAGES}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+
+class DeviceMetrics(MetricSet):
+    """单个设备的指标，同时累加到所属条目"""
+
+    def __init__(self, entry_metrics):
+        super().__init__()
+        self._entry = entry_metrics
+        self._marks = {}
+
+    def start(self, stage, at=None):
+        """记录阶段开始时间（重复调用以最后一次为准）"""
+        self._marks[stage] = time.monotonic() if at is None else at
+
+    def stop(self, stage):
+        """结束阶段并记录耗时；阶段未开始时忽略"""
+        started = self._marks.pop(stage, None)
+        if started is not None:
+            self.observe(stage, time.monotonic() - started)
+
+    def discard(self, stage):
+        """放弃未完成的阶段（会话中止时）"""
+        self._marks.pop(stage, None)
+
+    def observe(self, stage, seconds):
+        self.histograms[stage].observe(seconds)
+        self._entry.histograms[stage].observe(seconds)
+
+    def count(self, counter, value=1):
+        self.counters[counter] += value
+        self._entry.counters[counter] += value
+
+
+class EntryMetrics(MetricSet):
+    """配置条目级指标（设备指标的汇总）及设备指标表"""
+
+    def __init__(self):
+        super().__init__()
+        self.devices = {}
+
+    def device(self, device_id, anonymous=False):
+        """取得设备指标（同一device_id重连后继续累计，直到设备最终释放）
+
+        匿名连接（未提供Device-Id）每次的标识都不同，只计入条目汇总，不单独输出。
+        """
+        if anonymous:
+            return DeviceMetrics(self)
+        metrics = self.devices.get(device_id)
+        if metrics is None:
+            metrics = self.devices[device_id] = DeviceMetrics(self)
+        return metrics
+
+    def forget(self, device_id):
+        """设备最终释放后移除其指标，设备标签数不随历史连接增长"""
+        self.devices.pop(device_id, None)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels):
+    return ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+
+
+_INVALID_NAME = re.compile(r"[^a-zA-Z0-9_]")
+
+
+def _flatten(stats, prefix=""):
+    """展开组件统计：嵌套字典以_连接键名，只保留数值（布尔为0/1），跳过None和字符串"""
+    for key, value in stats.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _flatten(value, name + "_")
+        elif isinstance(value, bool):
+            yield name, int(value)
+        elif isinstance(value, (int, float)):
+            yield name, value
+
+
+def _render_stats(samples):
+    """[(组件, 标签, stats())] → xiaozhi_<组件>_<键> gauge，同名样本连续输出"""
+    families = {}
+    for component, labels, stats in samples:
+        for key, value in _flatten(stats):
+            name = _INVALID_NAME.sub("_", f"xiaozhi_{component}_{key}")
+            families.setdefault(name, []).append((labels, value))
+    lines = []
+    for name, values in families.items():
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in values:
+            lines.append(f"{name}{{{_labels(labels)}}} {value}" if labels else f"{name} {value}")
+    return lines
+
+
+def render_prometheus(entries, stats=()):
+    """将{entry_id: EntryMetrics}渲染为Prometheus文本格式（同一指标族的样本连续输出）
+
+    stats为[(组件, 标签, 组件stats())]，附加输出为gauge。
+    """
+    scopes = (
+        ("xiaozhi_entry", "配置条目", [
+            ({"entry": entry_id}, entry_metrics)
+            for entry_id, entry_metrics in entries.items()
+        ]),
+        ("xiaozhi_device", "设备", [
+            ({"entry": entry_id, "device": device_id}, device_metrics)
+            for entry_id, entry_metrics in entries.items()
+            for device_id, device_metrics in entry_metrics.devices.items()
+        ]),
+    )
+    lines = []
+    for prefix, scope, metric_sets in scopes:
+        lines.append(f"# HELP {prefix}_stage_seconds 各阶段耗时（{scope}）")
+        lines.append(f"# TYPE {prefix}_stage_seconds histogram")
+        for labels, metric_set in metric_sets:
+            for stage, histogram in metric_set.histograms.items():
+                stage_labels = _labels({**labels, "stage": stage})
+                cumulative = 0
+                for bound, bucket_count in zip(BUCKETS + ("+Inf",), histogram.counts):
+                    cumulative += bucket_count
+                    lines.append(f'{prefix}_stage_seconds_bucket{{{stage_labels},le="{bound}"}} {cumulative}')
+                lines.append(f"{prefix}_stage_seconds_sum{{{stage_labels}}} {histogram.sum:.6f}")
+                lines.append(f"{prefix}_stage_seconds_count{{{stage_labels}}} {histogram.count}")
+        for counter in COUNTERS:
+            lines.append(f"# TYPE {prefix}_{counter}_total counter")
+            for labels, metric_set in metric_sets:
+                lines.append(f"{prefix}_{counter}_total{{{_labels(labels)}}} {metric_set.counters[counter]}")
+    lines.extend(_render_stats(stats))
+    lines.append("")
+    return "\n".join(lines)
@@ -0,0 +1,154 @@
+"""小智pipeline解析缓存与预热
+
+终端hello后即解析条目使用的pipeline及其STT/TTS引擎并缓存，
+同时在后台调用引擎的预热接口（如有），首个语音请求不再承担冷启动开销。
+缓存随选项变更整体失效，并有存活时间以跟随pipeline在HA中的修改。
+"""
+import logging
+import time
+from dataclasses import dataclass
+
+from homeassistant.components import assist_pipeline
+from homeassistant.components import stt
+from homeassistant.components import tts
+
+_LOGGER = logging.getLogger(__name__)
+
+# 解析结果的存活时间（秒）
+RESOLVED_TTL = 300
+
+
+@dataclass(frozen=True)
+class ResolvedPipeline:
+    """已解析的pipeline"""
+
+    pipeline_id: str
+    name: str
+    stt_engine: str | None
+    stt_language: str | None
+    tts_engine: str | None
+    tts_language: str | None
+    tts_voice: str | None
+    conversation_engine: str | None
+    resolved_at: float
+
+
+class _LatencyStats:
+    """run-start耗时统计"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 1) if self.count else None,
+            "max_ms": round(self.max * 1000, 1) if self.count else None,
+        }
+
+
+class PipelineCache:
+    """每条目的pipeline解析缓存"""
+
+    def __init__(self, hass):
+        self._hass = hass
+        self._resolved = {}   # 请求的pipeline_id（None为默认）-> ResolvedPipeline
+        self._warmed = set()  # 已发起预热的引擎
+        self.cold = _LatencyStats()
+        self.warm = _LatencyStats()
+        self.warmups = 0
+        self.warmup_errors = 0
+
+    def invalidate(self):
+        """选项变更后丢弃解析结果，下次hello时重新解析和预热"""
+        self._resolved.clear()
+        self._warmed.clear()
+
+    def get(self, pipeline_id):
+        """取出未过期的解析结果"""
+        resolved = self._resolved.get(pipeline_id)
+        if resolved is not None and time.monotonic() - resolved.resolved_at < RESOLVED_TTL:
+            return resolved
+        return None
+
+    def resolve(self, pipeline_id):
+        """解析pipeline并缓存（pipeline不存在时抛出HA的异常）"""
+        resolved = self.get(pipeline_id)
+        if resolved is not None:
+            return resolved
+        pipeline = assist_pipeline.async_get_pipeline(self._hass, pipeline_id)
+        resolved = ResolvedPipeline(
+            pipeline_id=pipeline.id,
+            name=pipeline.name,
+            stt_engine=pipeline.stt_engine,
+            stt_language=pipeline.stt_language,
+            tts_engine=pipeline.tts_engine,
+            tts_language=pipeline.tts_language,
+            tts_voice=pipeline.tts_voice,
+            conversation_engine=getattr(pipeline, "conversation_engine", None),
+            resolved_at=time.monotonic(),
+        )
+        self._resolved[pipeline_id] = resolved
+        return resolved
+
+    def prewarm(self, pipeline_id, tts_engine=None):
+        """解析pipeline并在后台预热其引擎（hello完成后调用，不阻塞握手）"""
+        try:
+            resolved = self.resolve(pipeline_id)
+        except Exception as e:
+            _LOGGER.warning("⚠️ Pipeline预解析失败: %s (%s)", pipeline_id or "默认", e)
+            return None
+        engines = [
+            ("stt", resolved.stt_engine),
+            ("tts", resolved.tts_engine),
+            ("tts", tts_engine),
+        ]
+        for kind, engine_id in engines:
+            if engine_id and (kind, engine_id) not in self._warmed:
+                self._warmed.add((kind, engine_id))
+                self._hass.async_create_background_task(
+                    self._async_warm_up(kind, engine_id), f"xiaozhi warm up {engine_id}"
+                )
+        return resolved
+
+    async def _async_warm_up(self, kind, engine_id):
+        """调用引擎的async_warm_up（引擎不支持时只完成实例加载）"""
+        started = time.monotonic()
+        try:
+            if kind == "stt":
+                engine = stt.async_get_speech_to_text_engine(self._hass, engine_id)
+            else:
+                engine = tts.get_engine_instance(self._hass, engine_id)
+            warm_up = getattr(engine, "async_warm_up", None)
+            if warm_up is None:
+                return
+            await warm_up()
+        except Exception as e:
+            self.warmup_errors += 1
+            self._warmed.discard((kind, engine_id))
+            _LOGGER.warning("⚠️ 引擎预热失败: %s (%s)", engine_id, e)
+            return
+        self.warmups += 1
+        _LOGGER.debug("🔥 引擎预热完成: %s (%.0fms)", engine_id, (time.monotonic() - started) * 1000)
+
+    def record_run_start(self, warm, seconds):
+        """记录一次从收到请求到发出run-start的耗时"""
+        (self.warm if warm else self.cold).add(seconds)
+
+    def stats(self):
+        """返回缓存与冷/热启动耗时统计"""
+        return {
+            "pipelines": len(self._resolved),
+            "warmups": self.warmups,
+            "warmup_errors": self.warmup_errors,
+            "run_start_cold": self.cold.as_dict(),
+            "run_start_warm": self.warm.as_dict(),
+        }
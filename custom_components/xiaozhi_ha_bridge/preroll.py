@@ -0,0 +1,87 @@
+"""唤醒词后的预录音频
+
+终端在唤醒后立即开始上传音频，而pipeline要在listen/run请求处理完后才建立，
+期间的帧没有可送入的pipeline。每个设备用一块预先分配的固定内存保存最近的
+Opus帧（环形覆盖），会话建立时把请求前一段时间内的帧先于实时音频送入pipeline。
+"""
+import math
+from array import array
+
+# RFC 6716规定的单个Opus包最大长度，每个槽位按此预留，任何帧都不会被截断
+OPUS_MAX_PACKET = 1275
+
+# 小智协议上行帧时长（毫秒）
+FRAME_DURATION_MS = 60
+
+
+def preroll_frames(preroll_ms):
+    """预录时长对应的帧数"""
+    return math.ceil(max(0, preroll_ms) / FRAME_DURATION_MS)
+
+
+class PrerollBuffer:
+    """固定容量的Opus帧环形缓冲"""
+
+    __slots__ = (
+        "capacity", "_data", "_lengths", "_times", "_next", "_count",
+        "pushed", "overwritten", "oversized", "replayed",
+    )
+
+    def __init__(self, capacity):
+        self.capacity = max(1, capacity)
+        self._data = bytearray(self.capacity * OPUS_MAX_PACKET)
+        self._lengths = array("H", [0]) * self.capacity
+        self._times = array("d", [0.0]) * self.capacity
+        self._next = 0
+        self._count = 0
+        self.pushed = 0
+        self.overwritten = 0
+        self.oversized = 0
+        self.replayed = 0
+
+    def __len__(self):
+        return self._count
+
+    def push(self, payload, now):
+        """写入一帧（复制到槽位，不持有调用方的缓冲区），满时覆盖最旧的帧"""
+        size = len(payload)
+        if size > OPUS_MAX_PACKET:
+            self.oversized += 1
+            return
+        index = self._next
+        offset = index * OPUS_MAX_PACKET
+        self._data[offset:offset + size] = payload
+        self._lengths[index] = size
+        self._times[index] = now
+        self._next = (index + 1) % self.capacity
+        if self._count < self.capacity:
+            self._count += 1
+        else:
+            self.overwritten += 1
+        self.pushed += 1
+
+    def drain(self, since):
+        """按写入顺序取出since（monotonic时间）之后的帧，并清空缓冲"""
+        frames = []
+        start = (self._next - self._count) % self.capacity
+        for i in range(self._count):
+            index = (start + i) % self.capacity
+            if self._times[index] >= since:
+                offset = index * OPUS_MAX_PACKET
+                frames.append(bytes(self._data[offset:offset + self._lengths[index]]))
+        self._count = 0
+        self.replayed += len(frames)
+        return frames
+
+    def clear(self):
+        self._count = 0
+
+    def stats(self):
+        return {
+            "capacity": self.capacity,
+            "buffered": self._count,
+            "pushed": self.pushed,
+            "overwritten": self.overwritten,
+            "oversized": self.oversized,
+            "replayed": self.replayed,
+        }
@@ -0,0 +1,147 @@
+"""小智设备注册表
+
+按device_id、client_id和session_id三个索引O(1)查找设备，并按状态分组，
+枚举某一状态的设备不需要扫描全部连接。重复的device_id按条目配置的策略处理。
+断开后等待恢复的设备单独保存，不出现在在线索引中。
+"""
+import logging
+
+from .const import DUPLICATE_POLICY_REJECT
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class DuplicateDevice(Exception):
+    """device_id已有活动连接且策略为拒绝"""
+
+
+class DeviceRegistry:
+    """每条目的设备注册表
+
+    设备对象通过 registry 属性回调状态变化；移除时只移除索引仍指向
+    同一对象的条目，被替换的旧连接清理时不会误删新连接。
+    """
+
+    def __init__(self):
+        self._by_device_id = {}
+        self._by_client_id = {}
+        self._by_session_id = {}
+        self._by_status = {}
+        self._parked = {}            # session_id -> 等待恢复的设备
+        self._parked_by_device = {}  # device_id -> 等待恢复的设备
+        self.replaced = 0
+        self.resumed = 0
+        self.rejected = 0
+
+    def add(self, device, policy):
+        """注册设备；返回被替换的旧设备（需由调用方关闭），策略为拒绝时抛出DuplicateDevice"""
+        old = self._by_device_id.get(device.device_id)
+        if old is not None:
+            if policy == DUPLICATE_POLICY_REJECT:
+                self.rejected += 1
+                raise DuplicateDevice(device.device_id)
+            self.remove(old)
+            self.replaced += 1
+        self._by_device_id[device.device_id] = device
+        self._by_client_id[device.client_id] = device
+        self._by_session_id[device.session_id] = device
+        self._by_status.setdefault(device.status, set()).add(device)
+        device.registry = self
+        return old
+
+    def remove(self, device):
+        """注销设备（只移除仍指向该对象的索引）"""
+        for index, key in (
+            (self._by_device_id, device.device_id),
+            (self._by_client_id, device.client_id),
+            (self._by_session_id, device.session_id),
+        ):
+            if index.get(key) is device:
+                del index[key]
+        members = self._by_status.get(device.status)
+        if members is not None:
+            members.discard(device)
+        if device.registry is self:
+            device.registry = None
+
+    def park(self, device):
+        """设备断开但保留会话：移出在线索引，等待恢复"""
+        self.remove(device)
+        stale = self._parked_by_device.get(device.device_id)
+        if stale is not None and stale is not device:
+            self._parked.pop(stale.session_id, None)
+        self._parked[device.session_id] = device
+        self._parked_by_device[device.device_id] = device
+        return stale
+
+    def unpark(self, device):
+        """从等待恢复列表中移除设备（恢复或过期时）"""
+        if self._parked.get(device.session_id) is device:
+            del self._parked[device.session_id]
+        if self._parked_by_device.get(device.device_id) is device:
+            del self._parked_by_device[device.device_id]
+
+    def take_parked(self, session_id, device_id):
+        """取出可恢复的会话（session_id与device_id都必须匹配）"""
+        device = self._parked.get(session_id)
+        if device is None or device.device_id != device_id:
+            return None
+        self.unpark(device)
+        self.resumed += 1
+        return device
+
+    def parked_for(self, device_id):
+        """该device_id仍在等待恢复的旧会话"""
+        return self._parked_by_device.get(device_id)
+
+    def parked(self):
+        """全部等待恢复的设备（快照）"""
+        return list(self._parked.values())
+
+    def status_changed(self, device, old_status, new_status):
+        """设备状态变化时由设备调用，维护状态索引"""
+        if old_status == new_status:
+            return
+        members = self._by_status.get(old_status)
+        if members is not None:
+            members.discard(device)
+        self._by_status.setdefault(new_status, set()).add(device)
+
+    def get(self, device_id):
+        return self._by_device_id.get(device_id)
+
+    def get_by_client_id(self, client_id):
+        return self._by_client_id.get(client_id)
+
+    def get_by_session_id(self, session_id):
+        return self._by_session_id.get(session_id)
+
+    def with_status(self, status):
+        """返回处于某一状态的设备（快照）"""
+        return list(self._by_status.get(status, ()))
+
+    def count_by_status(self):
+        return {status: len(members) for status, members in self._by_status.items() if members}
+
+    def __contains__(self, device_id):
+        return device_id in self._by_device_id
+
+    def __len__(self):
+        return len(self._by_device_id)
+
+    def __iter__(self):
+        return iter(self._by_device_id)
+
+    def values(self):
+        """全部设备（快照，便于在遍历时关闭连接）"""
+        return list(self._by_device_id.values())
+
+    def stats(self):
+        return {
+            "devices": len(self._by_device_id),
+            "by_status": self.count_by_status(),
+            "parked": len(self._parked),
+            "replaced": self.replaced,
+            "rejected": self.rejected,
+            "resumed": self.resumed,
+        }
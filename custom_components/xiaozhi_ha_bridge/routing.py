@@ -0,0 +1,99 @@
+"""WebSocket连接到配置条目的路由表
+
+所有条目共用同一个WebSocket路径，aiohttp路由只在首个条目设置时注册一次。
+连接按以下顺序选择条目，每一步都是字典查找：
+
+1. Entry-Id请求头指定的条目；
+2. Authorization令牌所属的条目（仅配置了允许令牌列表的条目参与）；
+3. Device-Id前缀（按条目配置的前缀，每种前缀长度查找一次）；
+4. 默认条目（最早设置且仍在运行的条目）。
+
+条目设置、卸载或选项变更时只重建路由表。
+"""
+import logging
+
+from .runtime import bearer_digest
+
+_LOGGER = logging.getLogger(__name__)
+
+# hass.data中路由表的键（与按条目存放的hass.data[DOMAIN]分开）
+DATA_ROUTES = "xiaozhi_ha_bridge_routes"
+
+# 指定条目的请求头
+HEADER_ENTRY_ID = "Entry-Id"
+
+ROUTE_HEADER = "header"
+ROUTE_TOKEN = "token"
+ROUTE_PREFIX = "prefix"
+ROUTE_DEFAULT = "default"
+
+
+class EntryRoutes:
+    """连接请求头 → entry_id"""
+
+    def __init__(self):
+        self._entries = {}   # entry_id -> (令牌摘要, Device-Id前缀)，按设置顺序
+        self._by_token = {}
+        self._by_prefix = {}
+        self._prefix_lengths = ()
+        self.routed = dict.fromkeys((ROUTE_HEADER, ROUTE_TOKEN, ROUTE_PREFIX, ROUTE_DEFAULT), 0)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, entry_id, runtime):
+        """登记（或更新）条目的路由规则"""
+        self._entries[entry_id] = (runtime.token_digests, runtime.device_id_prefixes)
+        self._rebuild()
+
+    def remove(self, entry_id):
+        if self._entries.pop(entry_id, None) is not None:
+            self._rebuild()
+
+    def _rebuild(self):
+        by_token = {}
+        by_prefix = {}
+        for entry_id, (digests, prefixes) in self._entries.items():
+            for digest in digests:
+                if by_token.setdefault(digest, entry_id) != entry_id:
+                    _LOGGER.warning("⚠️ 同一令牌配置在多个条目中，按最早设置的条目路由: %s", by_token[digest])
+            for prefix in prefixes:
+                if by_prefix.setdefault(prefix, entry_id) != entry_id:
+                    _LOGGER.warning("⚠️ Device-Id前缀%s配置在多个条目中，按最早设置的条目路由", prefix)
+        self._by_token = by_token
+        self._by_prefix = by_prefix
+        # 长前缀优先匹配
+        self._prefix_lengths = tuple(sorted({len(prefix) for prefix in by_prefix}, reverse=True))
+
+    def resolve(self, headers):
+        """选择连接所属的条目，没有任何条目时返回None"""
+        entry_id = headers.get(HEADER_ENTRY_ID)
+        if entry_id in self._entries:
+            self.routed[ROUTE_HEADER] += 1
+            return entry_id
+
+        if self._by_token:
+            digest = bearer_digest(headers.get("Authorization", ""))
+            entry_id = self._by_token.get(digest)
+            if entry_id is not None:
+                self.routed[ROUTE_TOKEN] += 1
+                return entry_id
+
+        device_id = headers.get("Device-Id")
+        if device_id:
+            for length in self._prefix_lengths:
+                entry_id = self._by_prefix.get(device_id[:length])
+                if entry_id is not None:
+                    self.routed[ROUTE_PREFIX] += 1
+                    return entry_id
+
+        self.routed[ROUTE_DEFAULT] += 1
+        return next(iter(self._entries), None)
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "tokens": len(self._by_token),
+            "prefixes": len(self._by_prefix),
+            "routed": dict(self.routed),
+        }
@@ -0,0 +1,267 @@
+"""小智HA桥接条目运行时上下文
+
+每个配置条目在设置时（以及选项变更时）构建一次不可变的运行时上下文，
+连接路径只需取出该对象，不再逐次解析配置。
+"""
+import hashlib
+import hmac
+import logging
+from dataclasses import dataclass, field
+
+from .const import (
+    PLATFORMS,
+    CONF_PIPELINE_ID,
+    CONF_TTS_ENGINE,
+    CONF_LANGUAGE,
+    CONF_DEBUG,
+    CONF_REQUIRE_TOKEN,
+    CONF_ALLOWED_TOKENS,
+    CONF_AUDIO_QUEUE_SIZE,
+    CONF_AUDIO_OVERFLOW_POLICY,
+    CONF_TTS_STREAMING,
+    CONF_TTS_CACHE,
+    CONF_AUDIO_TRANSCODE,
+    CONF_VAD,
+    CONF_VAD_ENERGY_THRESHOLD,
+    CONF_VAD_ZCR_THRESHOLD,
+    CONF_VAD_SILENCE_MS,
+    CONF_METRICS_SENSORS,
+    CONF_IOT_ENTITIES,
+    CONF_DUPLICATE_POLICY,
+    CONF_SESSION_RESUME_SECONDS,
+    CONF_HEARTBEAT_INTERVAL,
+    CONF_PIPELINE_IDLE_TIMEOUT,
+    CONF_PIPELINE_SLOTS,
+    CONF_ADMISSION_QUEUE_SIZE,
+    CONF_ADMISSION_TIMEOUT,
+    CONF_ADMISSION_PRIORITIES,
+    CONF_PREROLL_MS,
+    CONF_INTENT_FAST_PATH,
+    CONF_DEVICE_ID_PREFIXES,
+    DEFAULT_LANGUAGE,
+    DEFAULT_TTS_ENGINE,
+    DEFAULT_DEBUG,
+    DEFAULT_REQUIRE_TOKEN,
+    DEFAULT_AUDIO_QUEUE_SIZE,
+    DEFAULT_AUDIO_OVERFLOW_POLICY,
+    DEFAULT_TTS_STREAMING,
+    DEFAULT_TTS_LEAD_FRAMES,
+    DEFAULT_TTS_CACHE,
+    DEFAULT_AUDIO_TRANSCODE,
+    DEFAULT_VAD,
+    DEFAULT_VAD_ENERGY_THRESHOLD,
+    DEFAULT_VAD_ZCR_THRESHOLD,
+    DEFAULT_VAD_SILENCE_MS,
+    DEFAULT_METRICS_SENSORS,
+    DEFAULT_IOT_ENTITIES,
+    DEFAULT_DUPLICATE_POLICY,
+    DEFAULT_SESSION_RESUME_SECONDS,
+    DEFAULT_HEARTBEAT_INTERVAL,
+    DEFAULT_PIPELINE_IDLE_TIMEOUT,
+    DEFAULT_PIPELINE_SLOTS,
+    DEFAULT_ADMISSION_QUEUE_SIZE,
+    DEFAULT_ADMISSION_TIMEOUT,
+    DEFAULT_ADMISSION_PRIORITIES,
+    DEFAULT_PREROLL_MS,
+    DEFAULT_INTENT_FAST_PATH,
+)
+from .log import BridgeLogger, normalize_debug_level
+
+# 小智协议音频参数（60ms Opus帧）
+AUDIO_PARAMS = {
+    "format": "opus",
+    "sample_rate": 16000,
+    "channels": 1,
+    "frame_duration": 60,
+}
+
+
+def _token_digest(token):
+    """令牌只以SHA-256摘要形式保存和比较"""
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+
+def bearer_digest(auth_header):
+    """Authorization头中令牌的摘要，没有令牌时返回None"""
+    token = auth_header.replace("Bearer ", "").strip()
+    return _token_digest(token) if token else None
+
+
+def _parse_tokens(value):
+    """允许的令牌可能是列表或逗号/换行分隔的字符串"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.replace("\n", ",").split(",")
+    return [token.strip() for token in value if token and token.strip()]
+
+
+def _parse_priorities(value):
+    """排队优先级："device_id或area_id=优先级"，逗号或换行分隔，无效项忽略"""
+    priorities = {}
+    for item in (value or "").replace("\n", ",").split(","):
+        key, sep, priority = item.partition("=")
+        if not sep or not key.strip():
+            continue
+        try:
+            priorities[key.strip()] = int(priority.strip())
+        except ValueError:
+            continue
+    return priorities
+
+
+@dataclass(frozen=True)
+class EntryRuntime:
+    """配置条目的不可变运行时上下文"""
+
+    entry_id: str
+    language: str
+    pipeline_id: str | None
+    tts_engine: str | None
+    require_token: bool
+    token_digests: frozenset
+    audio_queue_size: int
+    audio_overflow_policy: str
+    audio_transcode: bool
+    vad: bool
+    vad_energy_threshold: float
+    vad_zcr_threshold: float
+    vad_silence_ms: int
+    metrics_sensors: bool
+    iot_entities: bool
+    duplicate_policy: str
+    session_resume_seconds: int
+    heartbeat_interval: int
+    pipeline_idle_timeout: int
+    pipeline_slots: int
+    admission_queue_size: int
+    admission_timeout: int
+    admission_priorities: dict
+    preroll_ms: int
+    intent_fast_path: bool
+    device_id_prefixes: tuple
+    tts_streaming: bool
+    tts_lead_frames: int
+    tts_cache: bool
+    log: BridgeLogger
+    # 预生成的响应模板
+    hello_template: dict = field(repr=False)
+    run_start_template: dict = field(repr=False)
+
+    @classmethod
+    def from_config(cls, entry_id, config, logger):
+        """根据合并后的data+options构建运行时上下文"""
+        language = config.get(CONF_LANGUAGE) or DEFAULT_LANGUAGE
+        pipeline_id = config.get(CONF_PIPELINE_ID) or None
+        return cls(
+            entry_id=entry_id,
+            language=language,
+            pipeline_id=pipeline_id,
+            tts_engine=config.get(CONF_TTS_ENGINE) or DEFAULT_TTS_ENGINE,
+            require_token=bool(config.get(CONF_REQUIRE_TOKEN, DEFAULT_REQUIRE_TOKEN)),
+            token_digests=frozenset(
+                _token_digest(token)
+                for token in _parse_tokens(config.get(CONF_ALLOWED_TOKENS))
+            ),
+            audio_queue_size=int(config.get(CONF_AUDIO_QUEUE_SIZE, DEFAULT_AUDIO_QUEUE_SIZE)),
+            audio_overflow_policy=config.get(CONF_AUDIO_OVERFLOW_POLICY, DEFAULT_AUDIO_OVERFLOW_POLICY),
+            audio_transcode=bool(config.get(CONF_AUDIO_TRANSCODE, DEFAULT_AUDIO_TRANSCODE)),
+            vad=bool(config.get(CONF_VAD, DEFAULT_VAD)),
+            vad_energy_threshold=float(config.get(CONF_VAD_ENERGY_THRESHOLD, DEFAULT_VAD_ENERGY_THRESHOLD)),
+            vad_zcr_threshold=float(config.get(CONF_VAD_ZCR_THRESHOLD, DEFAULT_VAD_ZCR_THRESHOLD)),
+            vad_silence_ms=int(config.get(CONF_VAD_SILENCE_MS, DEFAULT_VAD_SILENCE_MS)),
+            metrics_sensors=bool(config.get(CONF_METRICS_SENSORS, DEFAULT_METRICS_SENSORS)),
+            iot_entities=bool(config.get(CONF_IOT_ENTITIES, DEFAULT_IOT_ENTITIES)),
+            duplicate_policy=config.get(CONF_DUPLICATE_POLICY, DEFAULT_DUPLICATE_POLICY),
+            session_resume_seconds=int(config.get(CONF_SESSION_RESUME_SECONDS, DEFAULT_SESSION_RESUME_SECONDS)),
+            heartbeat_interval=int(config.get(CONF_HEARTBEAT_INTERVAL, DEFAULT_HEARTBEAT_INTERVAL)),
+            pipeline_idle_timeout=int(config.get(CONF_PIPELINE_IDLE_TIMEOUT, DEFAULT_PIPELINE_IDLE_TIMEOUT)),
+            pipeline_slots=int(config.get(CONF_PIPELINE_SLOTS, DEFAULT_PIPELINE_SLOTS)),
+            admission_queue_size=int(config.get(CONF_ADMISSION_QUEUE_SIZE, DEFAULT_ADMISSION_QUEUE_SIZE)),
+            admission_timeout=int(config.get(CONF_ADMISSION_TIMEOUT, DEFAULT_ADMISSION_TIMEOUT)),
+            admission_priorities=_parse_priorities(
+                config.get(CONF_ADMISSION_PRIORITIES, DEFAULT_ADMISSION_PRIORITIES)
+            ),
+            preroll_ms=int(config.get(CONF_PREROLL_MS, DEFAULT_PREROLL_MS)),
+            intent_fast_path=bool(config.get(CONF_INTENT_FAST_PATH, DEFAULT_INTENT_FAST_PATH)),
+            device_id_prefixes=tuple(_parse_tokens(config.get(CONF_DEVICE_ID_PREFIXES))),
+            tts_streaming=bool(config.get(CONF_TTS_STREAMING, DEFAULT_TTS_STREAMING)),
+            tts_lead_frames=DEFAULT_TTS_LEAD_FRAMES,
+            tts_cache=bool(config.get(CONF_TTS_CACHE, DEFAULT_TTS_CACHE)),
+            log=BridgeLogger(logger, normalize_debug_level(config.get(CONF_DEBUG, DEFAULT_DEBUG))),
+            hello_template={
+                "type": "hello",
+                "audio_params": dict(AUDIO_PARAMS),
+                "features": {"event_batch": True},
+                "transport": "websocket",
+            },
+            run_start_template={
+                "pipeline": pipeline_id,
+                "language": language,
+            },
+        )
+
+    @property
+    def platforms(self):
+        """需要加载的实体平台"""
+        if self.iot_entities:
+            return PLATFORMS
+        return ["sensor"] if self.metrics_sensors else []
+
+    def check_token(self, auth_header):
+        """校验Authorization头中的令牌（未配置白名单时接受任意非空令牌）"""
+        if not self.require_token:
+            return True
+        return self.check_digest(bearer_digest(auth_header))
+
+    def check_digest(self, digest):
+        """按令牌摘要校验；令牌策略变更后据此复核已建立的连接"""
+        if not self.require_token:
+            return True
+        if digest is None:
+            return False
+        if not self.token_digests:
+            return True
+        return self._digest_listed(digest)
+
+    def token_listed(self, auth_header):
+        """令牌是否在本条目的允许列表中
+
+        只读端点（指标）使用：未要求令牌或未配置允许列表的条目不授予任何访问权限。
+        """
+        if not self.require_token or not self.token_digests:
+            return False
+        digest = bearer_digest(auth_header)
+        return digest is not None and self._digest_listed(digest)
+
+    def _digest_listed(self, digest):
+        # 逐个常量时间比较摘要，比较耗时与令牌内容无关
+        matched = False
+        for known in self.token_digests:
+            matched |= hmac.compare_digest(digest, known)
+        return matched
+
+    def hello_response(self, protocol_version, session_id):
+        """基于模板生成hello响应"""
+        response = dict(self.hello_template)
+        response["version"] = int(protocol_version)
+        response["session_id"] = session_id
+        return response
+
+    def run_start_data(self, pipeline_id, handler_id, timeout):
+        """基于模板生成run-start事件数据"""
+        data = dict(self.run_start_template)
+        if pipeline_id:
+            data["pipeline"] = pipeline_id
+        data["runner_data"] = {
+            "stt_binary_handler_id": handler_id,
+            "timeout": timeout,
+        }
+        return data
+
+
+def build_runtime(entry_id, config):
+    """构建条目运行时上下文（日志写入websocket_api模块的logger）"""
+    return EntryRuntime.from_config(
+        entry_id, config, logging.getLogger(f"{__package__}.websocket_api")
+    )
@@ -0,0 +1,136 @@
+"""小智HA桥接传感器：指标传感器（选项启用时）与终端IoT数值/字符串属性"""
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntity,
+    SensorStateClass,
+)
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import UnitOfTime
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+
+from .const import DOMAIN
+from .iot_entities import IotEntityMixin, PROPERTY_TYPE_BOOLEAN
+from .metrics import STAGES, COUNTERS
+
+STAGE_NAMES = {
+    "handshake": "握手耗时",
+    "run_start": "会话启动耗时",
+    "stt": "语音识别耗时",
+    "intent": "意图处理耗时",
+    "tts_first_audio": "TTS首包耗时",
+    "turn": "整轮对话耗时",
+    "rtt": "心跳往返时延",
+    "abort": "中止响应耗时",
+    "admission": "排队等待耗时",
+}
+
+COUNTER_NAMES = {
+    "frames_in": "上行音频帧",
+    "bytes_in": "上行音频字节",
+    "frames_out": "下行音频帧",
+    "bytes_out": "下行音频字节",
+    "errors": "错误次数",
+    "aborts": "中止次数",
+    "reaped": "回收连接",
+    "rejected": "拒绝会话",
+    "intent_hits": "快速通道命中",
+    "intent_misses": "快速通道未命中",
+}
+
+
+async def async_setup_entry(
+    hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback
+) -> None:
+    """为配置条目创建指标传感器，并登记IoT属性传感器的创建入口"""
+    entry_data = hass.data[DOMAIN][entry.entry_id]
+    if entry_data["runtime"].metrics_sensors:
+        metrics = entry_data["metrics"]
+        entities = [StageLatencySensor(entry, metrics, stage) for stage in STAGES]
+        entities += [CounterSensor(entry, metrics, counter) for counter in COUNTERS]
+        async_add_entities(entities)
+    
+    iot_entities = entry_data.get("iot_entities")
+    if iot_entities is not None:
+        iot_entities.register_platform("sensor", async_add_entities, _iot_sensor)
+
+
+def _iot_sensor(manager, device_id, name, description, prop, spec):
+    """布尔以外的IoT属性创建为传感器"""
+    if spec.get("type") == PROPERTY_TYPE_BOOLEAN:
+        return None
+    return IotSensor(manager, device_id, name, description, prop, spec)
+
+
+class _MetricsSensor(SensorEntity):
+    """指标传感器基类（轮询读取内存中的指标）"""
+
+    _attr_has_entity_name = True
+
+    def __init__(self, entry, metrics, key, name):
+        self._metrics = metrics
+        self._key = key
+        self._attr_name = name
+        self._attr_unique_id = f"{entry.entry_id}_metrics_{key}"
+        self._attr_device_info = {
+            "identifiers": {(DOMAIN, entry.entry_id)},
+            "name": entry.title or "小智HA桥接",
+            "manufacturer": "Xiaozhi",
+            "model": "HA Bridge",
+        }
+
+
+class StageLatencySensor(_MetricsSensor):
+    """阶段平均耗时，属性中附带分位数和样本数"""
+
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+    _attr_suggested_display_precision = 0
+
+    def __init__(self, entry, metrics, stage):
+        super().__init__(entry, metrics, f"{stage}_latency", STAGE_NAMES[stage])
+        self._stage = stage
+
+    @property
+    def native_value(self):
+        mean = self._metrics.histograms[self._stage].mean()
+        return round(mean * 1000, 1) if mean is not None else None
+
+    @property
+    def extra_state_attributes(self):
+        histogram = self._metrics.histograms[self._stage]
+        p50 = histogram.quantile(0.5)
+        p95 = histogram.quantile(0.95)
+        return {
+            "count": histogram.count,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+class CounterSensor(_MetricsSensor):
+    """累计计数"""
+
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+
+    def __init__(self, entry, metrics, counter):
+        super().__init__(entry, metrics, counter, COUNTER_NAMES[counter])
+        self._counter = counter
+
+    @property
+    def native_value(self):
+        return self._metrics.counters[self._counter]
+
+
+class IotSensor(IotEntityMixin, SensorEntity):
+    """终端IoT数值/字符串属性"""
+
+    def __init__(self, manager, device_id, name, description, prop, spec):
+        super().__init__(manager, device_id, name, description, prop, spec)
+        if spec.get("type") == "number":
+            self._attr_state_class = SensorStateClass.MEASUREMENT
+
+    @property
+    def native_value(self):
+        return self.iot_value()
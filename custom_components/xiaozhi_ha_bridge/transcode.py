@@ -0,0 +1,87 @@
+"""小智上行音频转码：Opus → 16kHz PCM
+
+多数HA STT只接受PCM/WAV。终端上行的60ms Opus帧在送入pipeline前
+批量解码，解码在有界的专用线程池中进行（opuslib通过ctypes调用libopus，
+调用期间释放GIL），事件循环不做任何解码计算。
+"""
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .codec import OpusDecoder
+
+_LOGGER = logging.getLogger(__name__)
+
+# 一次提交到线程池的最多帧数（只合并已到达的帧，不为凑批等待）
+DECODE_BATCH_FRAMES = 8
+
+# 解码线程数上限
+DECODE_WORKERS = max(1, min(4, os.cpu_count() or 1))
+
+_executor = None
+
+
+def get_decode_executor():
+    """获取共享的解码线程池（按需创建）"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=DECODE_WORKERS, thread_name_prefix="xiaozhi_opus_decode"
+        )
+    return _executor
+
+
+def shutdown_decode_executor():
+    """关闭解码线程池（最后一个配置条目卸载时调用）"""
+    global _executor
+    executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+class OpusPcmTranscoder:
+    """每设备的Opus→PCM解码阶段
+
+    每个设备同一时刻最多只有一个批次在线程池中，线程池的总负载
+    因此受设备数和音频队列长度双重约束。
+    """
+
+    def __init__(self):
+        self._decoder = None
+        # 统计
+        self.frames = 0
+        self.batches = 0
+        self.errors = 0
+        self.decode_time = 0.0
+
+    def reset(self):
+        """新会话开始时重置解码器状态"""
+        if self._decoder is not None:
+            self.errors += self._decoder.errors
+        self._decoder = None
+
+    async def decode(self, packets):
+        """在线程池中解码一批Opus包，返回拼接后的PCM"""
+        if self._decoder is None:
+            self._decoder = OpusDecoder()
+        started = time.perf_counter()
+        pcm = await asyncio.get_running_loop().run_in_executor(
+            get_decode_executor(), self._decoder.decode_frames, packets
+        )
+        self.decode_time += time.perf_counter() - started
+        self.frames += len(packets)
+        self.batches += 1
+        return pcm
+
+    def stats(self):
+        """返回解码统计信息"""
+        errors = self.errors + (self._decoder.errors if self._decoder is not None else 0)
+        return {
+            "frames": self.frames,
+            "batches": self.batches,
+            "errors": errors,
+            "avg_batch": round(self.frames / self.batches, 2) if self.batches else 0.0,
+            "avg_frame_ms": round(self.decode_time / self.frames * 1000, 3) if self.frames else 0.0,
+        }
@@ -0,0 +1,233 @@
+"""小智TTS预渲染缓存
+
+缓存已编码好的60ms Opus帧，键为(引擎, 音色, 语言, 规范化文本)。
+内存层按字节预算做LRU淘汰；磁盘层每条一个文件，读取时内存映射，
+重启后仍然有效。
+"""
+import hashlib
+import logging
+import mmap
+import os
+import re
+import struct
+import tempfile
+import unicodedata
+from collections import OrderedDict
+
+_LOGGER = logging.getLogger(__name__)
+
+# 磁盘文件格式：魔数 + 帧数 + (帧长 + 帧数据)*
+_MAGIC = b"XZT1"
+_HEADER = struct.Struct("<4sI")
+_FRAME_LEN = struct.Struct("<H")
+_SUFFIX = ".opus"
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """规范化TTS文本：全半角统一、去首尾空白、合并连续空白"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def cache_key(engine, voice, language, text):
+    """生成缓存键"""
+    return (engine or "", voice or "", language or "", normalize_text(text))
+
+
+def _file_name(key):
+    digest = hashlib.sha1("\x1f".join(key).encode("utf-8")).hexdigest()
+    return digest + _SUFFIX
+
+
+def _frames_size(frames):
+    return sum(len(frame) for frame in frames)
+
+
+class TtsCache:
+    """两级TTS帧缓存（内存LRU + 磁盘文件）"""
+
+    def __init__(self, hass, directory, memory_budget, disk_budget, max_text_length=64):
+        self._hass = hass
+        self._directory = directory
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+        self.max_text_length = max_text_length
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk = OrderedDict()  # 文件名 -> 字节数，按最近使用排序
+        self._disk_bytes = 0
+        # 统计计数
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions_memory = 0
+        self.evictions_disk = 0
+
+    def cacheable(self, text):
+        """过长的文本（通常是LLM回复）不缓存"""
+        return bool(text) and len(text) <= self.max_text_length
+
+    async def async_load(self):
+        """启动时扫描磁盘目录，重建磁盘层索引"""
+        if self.disk_budget <= 0:
+            return
+        entries = await self._hass.async_add_executor_job(self._scan_disk)
+        for name, size in entries:
+            self._disk[name] = size
+            self._disk_bytes += size
+        await self._async_trim_disk()
+
+    def _scan_disk(self):
+        os.makedirs(self._directory, exist_ok=True)
+        entries = []
+        for name in os.listdir(self._directory):
+            if not name.endswith(_SUFFIX):
+                continue
+            stat = os.stat(os.path.join(self._directory, name))
+            entries.append((stat.st_mtime, name, stat.st_size))
+        entries.sort()
+        return [(name, size) for _mtime, name, size in entries]
+
+    async def async_get(self, key):
+        """查找缓存，返回帧元组或None"""
+        frames = self._memory.get(key)
+        if frames is not None:
+            self._memory.move_to_end(key)
+            self.hits_memory += 1
+            return frames
+
+        name = _file_name(key)
+        if name in self._disk:
+            frames = await self._hass.async_add_executor_job(self._read_file, name)
+            if frames is not None:
+                self._disk.move_to_end(name)
+                self.hits_disk += 1
+                self._put_memory(key, frames)
+                return frames
+            self._disk_bytes -= self._disk.pop(name, 0)
+
+        self.misses += 1
+        return None
+
+    async def async_put(self, key, frames):
+        """写入缓存（内存层立即生效，磁盘层在执行器中写入）"""
+        frames = tuple(bytes(frame) for frame in frames)
+        if not frames:
+            return
+        self.stores += 1
+        self._put_memory(key, frames)
+        if self.disk_budget <= 0:
+            return
+        name = _file_name(key)
+        try:
+            size = await self._hass.async_add_executor_job(self._write_file, name, frames)
+        except OSError as e:
+            _LOGGER.warning("⚠️ TTS缓存写入失败: %s", e)
+            return
+        self._disk_bytes += size - self._disk.pop(name, 0)
+        self._disk[name] = size
+        await self._async_trim_disk()
+
+    def _put_memory(self, key, frames):
+        size = _frames_size(frames)
+        if size > self.memory_budget:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= _frames_size(old)
+        self._memory[key] = frames
+        self._memory_bytes += size
+        self._trim_memory()
+
+    def _trim_memory(self):
+        while self._memory_bytes > self.memory_budget and self._memory:
+            _key, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= _frames_size(evicted)
+            self.evictions_memory += 1
+
+    async def async_set_budgets(self, memory_budget, disk_budget):
+        """应用新的字节预算（选项变更时调用），超出部分立即按最近最少使用淘汰"""
+        disk_enabled = disk_budget > 0 and self.disk_budget <= 0
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+        self._trim_memory()
+        if disk_enabled:
+            # 新启用磁盘层：重建索引（目录中可能留有之前的缓存文件）
+            await self.async_load()
+        else:
+            await self._async_trim_disk()
+
+    async def _async_trim_disk(self):
+        victims = []
+        while self._disk_bytes > self.disk_budget and self._disk:
+            name, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            self.evictions_disk += 1
+            victims.append(name)
+        if victims:
+            await self._hass.async_add_executor_job(self._remove_files, victims)
+
+    def _read_file(self, name):
+        """通过内存映射读取帧文件"""
+        path = os.path.join(self._directory, name)
+        try:
+            with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                magic, count = _HEADER.unpack_from(mapped, 0)
+                if magic != _MAGIC:
+                    return None
+                offset = _HEADER.size
+                frames = []
+                for _ in range(count):
+                    (length,) = _FRAME_LEN.unpack_from(mapped, offset)
+                    offset += _FRAME_LEN.size
+                    frames.append(mapped[offset:offset + length])
+                    offset += length
+            os.utime(path)
+            return tuple(frames)
+        except (OSError, ValueError, struct.error) as e:
+            _LOGGER.debug("TTS缓存文件不可用: %s (%s)", name, e)
+            return None
+
+    def _write_file(self, name, frames):
+        """写入临时文件后原子替换；临时文件名唯一，同一条目的并发写入互不干扰"""
+        os.makedirs(self._directory, exist_ok=True)
+        path = os.path.join(self._directory, name)
+        fd, tmp_path = tempfile.mkstemp(dir=self._directory, prefix=name, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(_HEADER.pack(_MAGIC, len(frames)))
+                for frame in frames:
+                    file.write(_FRAME_LEN.pack(len(frame)))
+                    file.write(frame)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        return os.path.getsize(path)
+
+    def _remove_files(self, names):
+        for name in names:
+            try:
+                os.remove(os.path.join(self._directory, name))
+            except OSError:
+                pass
+
+    def stats(self):
+        """返回缓存统计信息"""
+        return {
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk_entries": len(self._disk),
+            "disk_bytes": self._disk_bytes,
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions_memory": self.evictions_memory,
+            "evictions_disk": self.evictions_disk,
+        }
@@ -0,0 +1,389 @@
+"""小智TTS音频流式下发
+
+从TTS结果中边拉取边编码为60ms Opus帧，按实时节奏通过WebSocket发送给终端，
+终端不再需要另行下载音频URL。
+"""
+import asyncio
+import logging
+import struct
+import time
+
+from homeassistant.components import tts
+
+from .codec import (
+    OPUS_AVAILABLE,
+    FRAME_BYTES,
+    FRAME_DURATION_MS,
+    SAMPLE_RATE,
+    CHANNELS,
+    SAMPLE_WIDTH,
+    OpusEncoder,
+)
+from .const import DEVICE_STATUS_CONNECTED, DEVICE_STATUS_LISTENING, DEVICE_STATUS_SPEAKING
+from .metrics import STAGE_TTS_FIRST_AUDIO, STAGE_TURN, COUNTER_FRAMES_OUT, COUNTER_BYTES_OUT
+from .tts_cache import cache_key
+
+_LOGGER = logging.getLogger(__name__)
+
+# 每次提交到执行器编码的最大帧数
+ENCODE_BATCH_FRAMES = 8
+
+# 让TTS引擎直接输出16kHz单声道16位WAV，便于封装为Opus帧
+TTS_PCM_OPTIONS = {
+    "preferred_format": "wav",
+    "preferred_sample_rate": SAMPLE_RATE,
+    "preferred_sample_channels": CHANNELS,
+    "preferred_sample_bytes": SAMPLE_WIDTH,
+}
+
+
+class UnsupportedAudioFormat(Exception):
+    """TTS音频格式无法直接封装为小智Opus帧"""
+
+
+class WavStreamReader:
+    """增量解析WAV流，输出PCM数据；非RIFF数据按原始PCM处理"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self.header_done = False
+        self.sample_rate = SAMPLE_RATE
+        self.channels = CHANNELS
+        self.sample_width = SAMPLE_WIDTH
+
+    def feed(self, chunk):
+        """输入一段数据，返回其中的PCM部分"""
+        if self.header_done:
+            return chunk
+        self._buffer += chunk
+        buffer = self._buffer
+        if len(buffer) < 12:
+            return b""
+        if buffer[:4] != b"RIFF" or buffer[8:12] != b"WAVE":
+            # 原始PCM（tts_audio_output="raw"时约定为16kHz单声道16位）
+            self.header_done = True
+            pcm = bytes(buffer)
+            buffer.clear()
+            return pcm
+
+        offset = 12
+        while offset + 8 <= len(buffer):
+            chunk_id = bytes(buffer[offset:offset + 4])
+            (size,) = struct.unpack_from("<I", buffer, offset + 4)
+            if chunk_id == b"data":
+                self.header_done = True
+                self._check_format()
+                pcm = bytes(buffer[offset + 8:])
+                buffer.clear()
+                return pcm
+            if offset + 8 + size > len(buffer):
+                break
+            if chunk_id == b"fmt ":
+                _fmt, channels, rate, _byte_rate, _align, bits = struct.unpack_from(
+                    "<HHIIHH", buffer, offset + 8
+                )
+                self.channels = channels
+                self.sample_rate = rate
+                self.sample_width = bits // 8
+            offset += 8 + size + (size & 1)
+        return b""
+
+    def _check_format(self):
+        if (self.sample_rate, self.channels, self.sample_width) != (SAMPLE_RATE, CHANNELS, SAMPLE_WIDTH):
+            raise UnsupportedAudioFormat(
+                f"{self.sample_rate}Hz/{self.channels}ch/{self.sample_width * 8}bit"
+            )
+
+
+class Packetizer:
+    """将PCM切分为固定长度的帧，末帧补零"""
+
+    def __init__(self, frame_bytes=FRAME_BYTES):
+        self.frame_bytes = frame_bytes
+        self._pending = bytearray()
+
+    def feed(self, pcm):
+        """输入PCM，返回已凑满的帧"""
+        self._pending += pcm
+        size = self.frame_bytes
+        count = len(self._pending) // size
+        if not count:
+            return []
+        frames = [bytes(self._pending[i * size:(i + 1) * size]) for i in range(count)]
+        del self._pending[:count * size]
+        return frames
+
+    def flush(self):
+        """返回补零后的最后一帧（如有）"""
+        if not self._pending:
+            return []
+        frame = bytes(self._pending) + bytes(self.frame_bytes - len(self._pending))
+        self._pending.clear()
+        return [frame]
+
+
+async def async_tts_audio_chunks(hass, tts_output):
+    """按TTS结果逐段获取音频数据（支持流式结果时边生成边返回）"""
+    token = tts_output.get("token")
+    get_stream = getattr(tts, "async_get_stream", None)
+    if token and get_stream is not None:
+        stream = get_stream(hass, token)
+        if stream is not None:
+            async for chunk in stream.async_stream_result():
+                yield chunk
+            return
+
+    media_id = tts_output.get("media_id")
+    if not media_id:
+        raise UnsupportedAudioFormat("TTS结果中没有token或media_id")
+    _extension, data = await tts.async_get_media_source_audio(hass, media_id)
+    yield data
+
+
+async def async_tts_text_chunks(hass, text, engine=None, language=None, options=None):
+    """由桥接自身调用TTS引擎合成文本，逐段返回音频数据"""
+    tts_options = {**TTS_PCM_OPTIONS, **(options or {})}
+    create_stream = getattr(tts, "async_create_stream", None)
+    if create_stream is not None:
+        stream = create_stream(hass, engine or tts.async_default_engine(hass), language, tts_options)
+        stream.async_set_message(text)
+        async for chunk in stream.async_stream_result():
+            yield chunk
+        return
+
+    media_id = tts.generate_media_source_id(
+        hass, text, engine=engine, language=language, options=tts_options
+    )
+    _extension, data = await tts.async_get_media_source_audio(hass, media_id)
+    yield data
+
+
+async def async_encode_opus(hass, chunks):
+    """将WAV/PCM数据块编码为Opus帧，编码在执行器线程中分批进行"""
+    reader = WavStreamReader()
+    packetizer = Packetizer()
+    encoder = OpusEncoder()
+    async for chunk in chunks:
+        frames = packetizer.feed(reader.feed(chunk))
+        # 每段数据到达即编码，首包不必等待凑满批次
+        for i in range(0, len(frames), ENCODE_BATCH_FRAMES):
+            batch = frames[i:i + ENCODE_BATCH_FRAMES]
+            for frame in await hass.async_add_executor_job(encoder.encode_frames, batch):
+                yield frame
+    tail = packetizer.flush()
+    if tail:
+        for frame in await hass.async_add_executor_job(encoder.encode_frames, tail):
+            yield frame
+
+
+async def async_synthesize(hass, text, engine=None, language=None, voice=None, cache=None):
+    """完整合成文本并编码为Opus帧，返回(帧元组, 是否命中缓存)
+
+    用于一次合成、多终端共享的场景；帧为不可变bytes，可直接被多个下发任务复用。
+    """
+    key = None
+    if cache is not None and cache.cacheable(text):
+        key = cache_key(engine, voice, language, text)
+        frames = await cache.async_get(key)
+        if frames is not None:
+            return tuple(frames), True
+
+    options = {"voice": voice} if voice else None
+    chunks = async_tts_text_chunks(hass, text, engine, language, options)
+    frames = tuple([frame async for frame in async_encode_opus(hass, chunks)])
+    if key is not None and frames:
+        await cache.async_put(key, list(frames))
+    return frames, False
+
+
+async def async_send_paced(device, frames, lead_frames):
+    """按实时节奏发送Opus帧：前lead_frames帧立即发送，之后每60ms一帧
+
+    每帧都从device.ws取当前连接，便于断线重连后继续播放；
+    断开期间的帧按时丢弃，恢复后从当前进度继续。
+    """
+    loop = asyncio.get_running_loop()
+    interval = FRAME_DURATION_MS / 1000
+    start = None
+    sent = 0
+    async for frame in _aiter(frames):
+        if start is None:
+            start = loop.time()
+        target = start + (sent - lead_frames + 1) * interval
+        delay = target - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if not device.online.is_set():
+            sent += 1
+            continue
+        await device.ws.send_bytes(frame)
+        device.metrics.count(COUNTER_FRAMES_OUT)
+        device.metrics.count(COUNTER_BYTES_OUT, len(frame))
+        sent += 1
+    return sent
+
+
+async def _aiter(frames):
+    """同时支持同步和异步可迭代对象"""
+    if hasattr(frames, "__aiter__"):
+        async for frame in frames:
+            yield frame
+    else:
+        for frame in frames:
+            yield frame
+
+
+def _status_after_playback(device):
+    """播放结束后的设备状态：仍在收音（如收音期间插播的广播）时恢复为listening"""
+    if device.current_pipeline is not None and not device.stream_ended:
+        return DEVICE_STATUS_LISTENING
+    return DEVICE_STATUS_CONNECTED
+
+
+class TtsStreamer:
+    """每设备TTS下发任务管理"""
+
+    def __init__(self, hass, device):
+        self._hass = hass
+        self._device = device
+        self._task = None
+        # 统计
+        self.streams = 0
+        self.frames_sent = 0
+        self.fallbacks = 0
+        self.cache_hits = 0
+        self.last_first_audio = None  # 最近一次从开始到首帧发出的耗时（秒）
+
+    @property
+    def active(self):
+        """是否正在下发"""
+        return self._task is not None and not self._task.done()
+
+    def start_tts_output(self, tts_output, lead_frames, text=None):
+        """根据pipeline的tts-end结果开始下发，返回是否已接管播放"""
+        if not OPUS_AVAILABLE or not tts_output:
+            self.fallbacks += 1
+            return False
+        frames = async_encode_opus(self._hass, async_tts_audio_chunks(self._hass, tts_output))
+        self.start_frames(frames, lead_frames, text)
+        return True
+
+    def start_text(self, text, lead_frames, engine=None, language=None, voice=None, cache=None,
+                   release=None):
+        """由桥接合成并下发文本；命中缓存时不调用TTS引擎
+
+        release在合成结束（命中缓存时立即）或下发结束时调用，用于归还合成占用的名额；
+        返回False时不会调用。
+        """
+        if not OPUS_AVAILABLE or not text:
+            self.fallbacks += 1
+            return False
+        frames = self._text_frames(text, engine, language, voice, cache, release)
+        task = self.start_frames(frames, lead_frames, text)
+        if release is not None:
+            # 任务在开始执行前被取消时生成器不会运行，由任务结束回调兜底（release可重复调用）
+            task.add_done_callback(lambda _task: release())
+        return True
+
+    async def _text_frames(self, text, engine, language, voice, cache, release=None):
+        key = None
+        if cache is not None and cache.cacheable(text):
+            key = cache_key(engine, voice, language, text)
+            frames = await cache.async_get(key)
+            if frames is not None:
+                self.cache_hits += 1
+                if release is not None:
+                    release()
+                for frame in frames:
+                    yield frame
+                return
+
+        options = {"voice": voice} if voice else None
+        collected = [] if key is not None else None
+        chunks = async_tts_text_chunks(self._hass, text, engine, language, options)
+        async for frame in async_encode_opus(self._hass, chunks):
+            if collected is not None:
+                collected.append(frame)
+            yield frame
+        if release is not None:
+            release()
+        # 完整合成后才写入缓存，被中止的播放不会留下残缺条目
+        if collected:
+            await cache.async_put(key, collected)
+
+    def start_frames(self, frames, lead_frames, text=None):
+        """下发已编码（或正在编码）的Opus帧序列，返回下发任务
+
+        任务结果为发出的帧数，下发失败时为None；被新的下发打断时任务被取消。
+        """
+        self.cancel()
+        self._task = self._hass.async_create_background_task(
+            self._run(frames, lead_frames, text),
+            f"xiaozhi tts stream {self._device.device_id}",
+        )
+        return self._task
+
+    def cancel(self):
+        """中止当前下发"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+    async def _run(self, frames, lead_frames, text):
+        device = self._device
+        started = time.monotonic()
+        first_frame_sent = False
+
+        async def _timed_frames():
+            nonlocal first_frame_sent
+            async for frame in _aiter(frames):
+                yield frame
+                if not first_frame_sent:
+                    first_frame_sent = True
+                    self.last_first_audio = time.monotonic() - started
+                    device.metrics.stop(STAGE_TTS_FIRST_AUDIO)
+
+        self.streams += 1
+        device.set_status(DEVICE_STATUS_SPEAKING)
+        cancelled = False
+        sent = None
+        try:
+            # 断开等待恢复期间由恢复的hello补发开始消息
+            if device.online.is_set():
+                await device.ws.send_json({"type": "tts", "state": "start", "session_id": device.session_id})
+                if text:
+                    await device.ws.send_json({"type": "tts", "state": "sentence_start", "text": text})
+            sent = await async_send_paced(device, _timed_frames(), lead_frames)
+            self.frames_sent += sent
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        except UnsupportedAudioFormat as e:
+            self.fallbacks += 1
+            _LOGGER.warning("⚠️ TTS音频格式不支持流式下发: %s (%s)", device.device_id, e)
+        except Exception as e:
+            _LOGGER.error("❌ TTS下发失败: %s (%s)", device.device_id, e)
+        finally:
+            if device.online.is_set() and not device.ws.closed:
+                try:
+                    await device.ws.send_json({"type": "tts", "state": "stop", "session_id": device.session_id})
+                except Exception:
+                    pass
+            if device.status == DEVICE_STATUS_SPEAKING:
+                device.set_status(_status_after_playback(device))
+            # 被新会话打断时不结束计时，避免记到新一轮对话上
+            if not cancelled:
+                device.metrics.stop(STAGE_TURN)
+        return sent
+
+    def stats(self):
+        """返回下发统计信息"""
+        return {
+            "active": self.active,
+            "streams": self.streams,
+            "frames_sent": self.frames_sent,
+            "fallbacks": self.fallbacks,
+            "cache_hits": self.cache_hits,
+            "last_first_audio_ms": round(self.last_first_audio * 1000, 1)
+            if self.last_first_audio is not None else None,
+        }
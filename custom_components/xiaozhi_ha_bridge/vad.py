@@ -0,0 +1,99 @@
+"""小智服务端语音活动检测（端点检测）
+
+在解码后的PCM上按20ms窗口计算能量和过零率（NumPy向量化），
+检测到说话结束后由桥接直接结束STT音频流，不再等待终端的静音超时。
+依赖NumPy（Home Assistant自带）；不可用时 NUMPY_AVAILABLE 为 False。
+"""
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - HA环境中总是可用
+    np = None
+
+NUMPY_AVAILABLE = np is not None
+
+VAD_SPEECH_START = "speech_start"
+VAD_SPEECH_END = "speech_end"
+
+WINDOW_MS = 20
+MIN_SPEECH_MS = 120  # 连续语音达到该时长才判定为开始说话，过滤按键声等瞬态
+
+
+class EndOfSpeechDetector:
+    """基于能量与过零率的端点检测器（每个会话一个实例）
+
+    - 开始说话：连续MIN_SPEECH_MS的窗口能量高于阈值且过零率低于阈值
+      （宽带噪声过零率高，浊音过零率低）
+    - 说话中：只看能量，清辅音（过零率高）不会被误判为静音
+    - 结束说话：说话后连续silence_ms的窗口能量低于阈值
+    """
+
+    def __init__(self, energy_threshold_db, zcr_threshold, silence_ms,
+                 sample_rate=16000, window_ms=WINDOW_MS, min_speech_ms=MIN_SPEECH_MS):
+        self.window = sample_rate * window_ms // 1000
+        self.window_ms = window_ms
+        self.zcr_threshold = zcr_threshold
+        # 以均方值比较，省去逐窗口的对数运算
+        self._power_threshold = (10 ** (energy_threshold_db / 10)) * 32768.0 ** 2
+        self._silence_windows = max(1, -(-silence_ms // window_ms))
+        self._min_speech_windows = max(1, -(-min_speech_ms // window_ms))
+        self._remainder = np.empty(0, dtype=np.int16)
+        self._windows = 0
+        self._speech_run = 0
+        self._silence_run = 0
+        self.in_speech = False
+        self.ended = False
+        self.speech_start_ms = None
+        self.speech_end_ms = None
+
+    def features(self, samples):
+        """计算每个完整窗口的均方能量和过零率"""
+        count = samples.size // self.window
+        windows = samples[:count * self.window].reshape(count, self.window).astype(np.float32)
+        power = np.mean(windows * windows, axis=1)
+        crossings = np.count_nonzero(np.diff(np.signbit(windows), axis=1), axis=1)
+        return power, crossings / (self.window - 1)
+
+    def process(self, pcm):
+        """输入一段16位PCM，返回本段内发生的事件元组"""
+        if self.ended:
+            return ()
+        samples = np.frombuffer(pcm, dtype="<i2")
+        if self._remainder.size:
+            samples = np.concatenate((self._remainder, samples))
+        count = samples.size // self.window
+        self._remainder = samples[count * self.window:].copy()
+        if not count:
+            return ()
+
+        power, zcr = self.features(samples)
+        loud = power >= self._power_threshold
+        voiced = loud & (zcr <= self.zcr_threshold)
+
+        events = []
+        base = self._windows
+        self._windows += count
+        for index, (is_loud, is_voiced) in enumerate(zip(loud.tolist(), voiced.tolist())):
+            if not self.in_speech:
+                if is_voiced:
+                    self._speech_run += 1
+                    if self._speech_run >= self._min_speech_windows:
+                        self.in_speech = True
+                        self._silence_run = 0
+                        self.speech_start_ms = (base + index + 1 - self._speech_run) * self.window_ms
+                        events.append(VAD_SPEECH_START)
+                else:
+                    self._speech_run = 0
+            elif is_loud:
+                self._silence_run = 0
+            else:
+                self._silence_run += 1
+                if self._silence_run >= self._silence_windows:
+                    self.ended = True
+                    self.speech_end_ms = (base + index + 1 - self._silence_run) * self.window_ms
+                    events.append(VAD_SPEECH_END)
+                    break
+        return tuple(events)
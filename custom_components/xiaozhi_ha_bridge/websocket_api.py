@@ -1,382 +1,738 @@
 import asyncio
+import functools
 import logging
 import json
+import random
+import time
 import uuid
 from datetime import datetime
-from aiohttp import web, WSMsgType
+from aiohttp import web, WSMsgType, WSCloseCode
 from homeassistant.components import assist_pipeline
-from homeassistant.components import tts
 from homeassistant.components import conversation
-from homeassistant.helpers import intent
 from homeassistant.core import Context
 from .const import (
     DOMAIN, 
     WS_PATH, 
-    CONF_PIPELINE_ID, 
-    CONF_TTS_ENGINE, 
-    CONF_LANGUAGE, 
-    CONF_DEBUG,
-    CONF_REQUIRE_TOKEN,
-    CONF_ALLOWED_TOKENS,
+    DEFAULT_AUDIO_QUEUE_SIZE,
+    DEFAULT_AUDIO_OVERFLOW_POLICY,
     DEVICE_STATUS_CONNECTED,
     DEVICE_STATUS_DISCONNECTED,
     DEVICE_STATUS_LISTENING,
-    DEVICE_STATUS_SPEAKING
+    DEVICE_STATUS_SPEAKING,
+    DUPLICATE_POLICY_REJECT
 )
-from homeassistant.components.http import HomeAssistantView
-from homeassistant.components.http.auth import async_sign_path
+from .registry import DuplicateDevice
 from homeassistant.components.http.const import KEY_AUTHENTICATED
+from .audio_queue import AudioIngressQueue, AudioQueueOverflow, END_OF_STREAM
+from .framing import end_marker, is_end_marker, split_frame
+from .events import PipelineEventDispatcher
+from .tts_stream import TtsStreamer
+from .codec import OPUS_AVAILABLE
+from .transcode import OpusPcmTranscoder, DECODE_BATCH_FRAMES
+from .metrics import (
+    STAGE_HANDSHAKE,
+    STAGE_RUN_START,
+    STAGE_STT,
+    STAGE_INTENT,
+    STAGE_TTS_FIRST_AUDIO,
+    STAGE_TURN,
+    STAGE_ABORT,
+    STAGE_ADMISSION,
+    COUNTER_FRAMES_IN,
+    COUNTER_BYTES_IN,
+    COUNTER_ERRORS,
+    COUNTER_ABORTS,
+    COUNTER_REJECTED,
+    COUNTER_INTENT_HITS,
+    COUNTER_INTENT_MISSES,
+    render_prometheus,
+)
+from .iot import DeviceIot
+from .admission import AdmissionRejected, device_priority
+from .preroll import PrerollBuffer, preroll_frames
+from .routing import EntryRoutes, DATA_ROUTES
+from .runtime import bearer_digest
+from .dispatch import (
+    MessageRouter,
+    MessageContext,
+    DeviceLane,
+    MODE_INLINE,
+    MODE_ORDERED,
+    MODE_CONCURRENT,
+    error_middleware,
+    concurrency_middleware,
+    timing_middleware,
+)
+from .vad import EndOfSpeechDetector, NUMPY_AVAILABLE, VAD_SPEECH_START, VAD_SPEECH_END
 
 _LOGGER = logging.getLogger(__name__)
 
+# 单次IoT服务调用的超时（秒）
+IOT_CONTROL_TIMEOUT = 5
+
+# 同一设备同时执行的IoT控制请求数
+IOT_CONTROL_CONCURRENCY = 2
+
+# 令牌策略变更后，失去授权的连接在该时间窗口（秒）内随机分散关闭，避免终端同时重连
+REVOKE_SPREAD_SECONDS = 10
+
+# 在/metrics中输出stats()的组件：(指标名中的组件名, 条目数据中的键)
+ENTRY_STATS = (
+    ("pipelines", "pipelines"),
+    ("tts_cache", "tts_cache"),  # 未启用时为None，不输出
+    ("registry", "devices"),
+    ("iot_descriptors", "iot_descriptors"),
+    ("iot_entities", "iot_entities"),
+    ("entity_resolver", "entity_resolver"),
+    ("heartbeat", "heartbeat"),
+    ("admission", "admission"),
+    ("intent_fast_path", "intent_fast_path"),
+)
+
+# 同上，每个设备的组件：(组件名, 设备属性)
+DEVICE_STATS = (
+    ("audio_queue", "audio_queue"),
+    ("events", "events"),
+    ("tts", "tts"),
+    ("transcoder", "transcoder"),
+    ("iot", "iot"),
+    ("lane", "lane"),
+    ("preroll", "preroll"),  # 首次收到会话外的音频时创建
+)
+
 class XiaozhiDevice:
     """小智设备管理类"""
-    def __init__(self, device_id, client_id, ws, entry_id):
+    def __init__(self, device_id, client_id, ws, entry_id,
+                 audio_queue_size=DEFAULT_AUDIO_QUEUE_SIZE,
+                 audio_overflow_policy=DEFAULT_AUDIO_OVERFLOW_POLICY,
+                 protocol_version="1"):
         self.device_id = device_id
         self.client_id = client_id
+        self.protocol_version = protocol_version
         self.ws = ws
         self.entry_id = entry_id
         self.session_id = str(uuid.uuid4())
         self.status = DEVICE_STATUS_CONNECTED
         self.connected_time = datetime.now()
-        self.last_activity = datetime.now()
+        self.last_activity = time.monotonic()  # 最后一次收到消息（心跳据此判断空闲）
+        self.last_audio = self.last_activity    # 当前会话最后一次收到音频
+        self.ping_sent_at = None   # 未响应的服务端ping发送时间
+        self.rtt = None            # 最近一次心跳往返时延（秒）
         self.pipeline_handler_id = None
         self.current_pipeline = None
-        self.iot_descriptors = []  # 存储设备IoT能力描述
-        self.iot_states = {}       # 存储设备当前状态
+        self.admission = None      # 当前pipeline占用的名额（AdmissionTicket）
+        self.token_digest = None   # 连接令牌的摘要，令牌策略变更时复核
+        self.iot = None            # IoT能力描述与状态（DeviceIot）
+        self.audio_queue = AudioIngressQueue(audio_queue_size, audio_overflow_policy)
+        self.audio_task = None     # 音频消费任务
+        self.preroll = None        # 没有pipeline时的最近上行音频（PrerollBuffer）
+        self.end_pending = False   # 会话启动期间已收到音频流结束标记
+        self.features = {}         # 终端hello中声明的特性
+        self.lane = DeviceLane()   # 后台执行的消息处理
+        self.events = PipelineEventDispatcher(self, on_sent=apply_pipeline_event)
+        self.tts = None            # TTS下发（TtsStreamer）
+        self.tts_text = None       # 当前TTS文本
+        self.bridge_tts = False    # 当前会话的TTS阶段是否由桥接执行
+        self.reply_voice = None    # 桥接TTS使用的(引擎, 语言, 音色)
+        self.bridge_intent = False # 当前会话的意图阶段是否由桥接执行（命令快速通道）
+        self.intent_task = None    # 桥接执行的意图处理任务
+        self.conversation_id = None
+        self.conversation_agent = None
+        self.transcoder = OpusPcmTranscoder()  # 上行Opus→PCM解码
+        self.transcode = False     # 当前会话是否解码后送入STT
+        self.vad = None            # 当前会话的端点检测器
+        self.stream_ended = False  # 当前会话的音频流是否已结束
+        self.entry_data = None     # 所属配置条目数据
+        self.metrics = None        # 设备指标（DeviceMetrics）
+        self.registry = None       # 所属设备注册表
+        self.online = asyncio.Event()  # 断开等待恢复期间清除，事件与TTS暂停下发
+        self.online.set()
+        self.resume_handle = None  # 等待恢复的超时释放句柄
+        self.resume_status = None  # 断开前的状态，恢复时还原
+        self.superseded = False    # 已被同一device_id的新连接顶替（会话已在顶替时保留或释放）
+        self.anonymous = False     # 未提供Device-Id（device_id每次连接都不同）
+        
+    @property
+    def runtime(self):
+        """所属条目当前的运行时上下文"""
+        return self.entry_data["runtime"]
         
     def update_activity(self):
-        self.last_activity = datetime.now()
+        self.last_activity = time.monotonic()
         
     def set_status(self, status):
-        self.status = status
+        if not self.online.is_set():
+            # 等待恢复期间只记录状态，恢复时还原
+            self.resume_status = status
+            return
+        old_status, self.status = self.status, status
+        if self.registry is not None:
+            self.registry.status_changed(self, old_status, status)
         self.update_activity()
 
 async def async_setup_ws(hass, entry_id=None):
-    """注册 WebSocket 路由"""
-    _LOGGER.info("🔍 [DEBUG] async_setup_ws开始: entry_id=%s", entry_id)
-    
+    """将条目加入路由表；所有条目共用一个WebSocket路径，路由只在首次时注册"""
+    routes = hass.data.get(DATA_ROUTES)
+    if routes is None:
+        routes = hass.data[DATA_ROUTES] = EntryRoutes()
+        _register_routes(hass, routes)
+    if entry_id is not None:
+        routes.add(entry_id, hass.data[DOMAIN][entry_id]["runtime"])
+    _LOGGER.info("🚀 xiaozhi_ha_bridge WebSocket 服务已启动: %s (entry: %s, 共%d个条目)",
+                 WS_PATH, entry_id or "default", len(routes))
+
+def async_update_ws(hass, entry_id):
+    """选项变更后更新条目的路由规则"""
+    routes = hass.data.get(DATA_ROUTES)
+    if routes is not None:
+        routes.add(entry_id, hass.data[DOMAIN][entry_id]["runtime"])
+
+def async_revoke_sessions(hass, entry_id):
+    """令牌策略变更后复核已建立的连接：失去授权的连接分散关闭，保留的会话直接释放
+
+    仍然有效的连接不受影响。返回将被关闭的连接数。
+    """
+    entry_data = hass.data[DOMAIN][entry_id]
+    runtime = entry_data["runtime"]
+    devices_store = entry_data["devices"]
+    loop = asyncio.get_running_loop()
+
+    for device in devices_store.parked():
+        if not runtime.check_digest(device.token_digest):
+            hass.async_create_background_task(
+                async_release_device(device, devices_store),
+                f"{DOMAIN} release {device.device_id}",
+            )
+
+    def close(device, ws):
+        # 期间已重连或断开的连接不再处理
+        if device.ws is ws and not ws.closed:
+            hass.async_create_background_task(
+                ws.close(code=WSCloseCode.POLICY_VIOLATION, message=b"token revoked"),
+                f"{DOMAIN} revoke {device.device_id}",
+            )
+
+    revoked = [device for device in devices_store.values()
+               if not runtime.check_digest(device.token_digest)]
+    for device in revoked:
+        loop.call_later(random.uniform(0, REVOKE_SPREAD_SECONDS), close, device, device.ws)
+    if revoked:
+        _LOGGER.warning("🔑 令牌策略已变更，%d个连接将在%ds内分散断开", len(revoked), REVOKE_SPREAD_SECONDS)
+    return len(revoked)
+
+def async_remove_ws(hass, entry_id):
+    """条目卸载时从路由表移除（aiohttp路由保持注册，没有条目时拒绝连接）"""
+    routes = hass.data.get(DATA_ROUTES)
+    if routes is not None:
+        routes.remove(entry_id)
+
+def _register_routes(hass, routes):
+    """注册HTTP路由（进程内只执行一次）"""
     app = hass.http.app
-    _LOGGER.info("🔍 [DEBUG] 获取到HTTP应用: %s", type(app))
-    
+
     # 创建测试HTTP处理函数
     async def test_handler(request):
-        _LOGGER.info("🔍 [DEBUG] test_handler被调用: %s", request.path)
         return web.Response(text="Xiaozhi HA Bridge WebSocket endpoint is working!")
-    
-    # 创建路由处理函数，绑定entry_id，并绕过认证
+
+    # Prometheus指标：接受HA访问令牌，或某个条目允许列表中的设备令牌
+    # （未启用令牌的条目不放行，否则默认配置下任何人都能读取设备指标）
+    async def metrics_handler(request):
+        domain_data = hass.data.get(DOMAIN, {})
+        auth_header = request.headers.get("Authorization", "")
+        if not request.get(KEY_AUTHENTICATED) and not any(
+            data["runtime"].token_listed(auth_header) for data in domain_data.values()
+        ):
+            return web.Response(status=401, text="Unauthorized")
+        text = render_prometheus({
+            entry_id: data["metrics"] for entry_id, data in domain_data.items()
+        }, collect_stats(hass))
+        return web.Response(text=text, content_type="text/plain", charset="utf-8")
+
+    # 按路由表选择条目，并绕过认证（由条目自身的令牌校验）
     async def ws_handler_wrapper(request):
-        _LOGGER.info("🔍 [DEBUG] ws_handler_wrapper被调用: %s", request.path)
         # 标记请求为已认证，绕过HA的认证中间件
         request[KEY_AUTHENTICATED] = True
-        return await ws_handler(hass, request, entry_id)
-    
+        return await ws_handler(hass, request, routes.resolve(request.headers))
+
     # 总是使用标准路径，避免设备端配置复杂化
     ws_path = WS_PATH
     test_path = ws_path + "/test"
-    _LOGGER.info("🔍 [DEBUG] WebSocket路径: %s", ws_path)
-    _LOGGER.info("🔍 [DEBUG] 测试路径: %s", test_path)
-        
-    # 记录现有路由（用于调试）
-    existing_routes = []
-    for route in app.router.routes():
-        if hasattr(route, 'resource'):
-            existing_routes.append(route.resource.canonical)
-    
-    _LOGGER.info("🔍 [DEBUG] 现有路由总数: %d", len(existing_routes))
-    _LOGGER.info("🔍 [DEBUG] API相关路由: %s", [r for r in existing_routes if '/api/' in r][:10])
-    
+    metrics_path = ws_path + "/metrics"
+
     try:
         # 注册测试HTTP端点（不需要认证）
         app.router.add_get(test_path, test_handler)
-        _LOGGER.info("🔍 [DEBUG] 测试HTTP端点注册成功: %s", test_path)
-        
+        app.router.add_get(metrics_path, metrics_handler)
+
         # 使用正确的WebSocket路由注册方式
-        # 注意：这里不检查重复，让HA的路由系统处理
         app.router.add_get(ws_path, ws_handler_wrapper)
-        _LOGGER.info("🔍 [DEBUG] WebSocket路由注册成功: %s", ws_path)
-        
-        # 验证路由是否真的注册了
-        routes_found = {"ws": False, "test": False}
-        for route in app.router.routes():
-            if hasattr(route, 'resource'):
-                if route.resource.canonical == ws_path:
-                    routes_found["ws"] = True
-                    _LOGGER.info("🔍 [DEBUG] WebSocket路由验证成功: %s", ws_path)
-                elif route.resource.canonical == test_path:
-                    routes_found["test"] = True
-                    _LOGGER.info("🔍 [DEBUG] 测试路由验证成功: %s", test_path)
-                
-        if not routes_found["ws"]:
-            _LOGGER.error("❌ [DEBUG] WebSocket路由注册后验证失败!")
-        if not routes_found["test"]:
-            _LOGGER.error("❌ [DEBUG] 测试路由注册后验证失败!")
-        else:
-            _LOGGER.info("✅ [DEBUG] 测试端点可用: http://your-ha-ip:8123%s", test_path)
-            
+
     except Exception as e:
-        _LOGGER.error("❌ [DEBUG] 路由注册失败: %s", e, exc_info=True)
-        return
-            
-    _LOGGER.info("🚀 xiaozhi_ha_bridge WebSocket 服务已启动: %s (entry: %s)", ws_path, entry_id or "default")
+        _LOGGER.error("❌ 路由注册失败: %s", e, exc_info=True)
+
+def collect_stats(hass):
+    """读取各组件的stats()，返回[(组件, 标签, 统计)]
+
+    设备级组件只输出有单独指标的设备（匿名连接的标识每次不同，不输出）。
+    """
+    samples = [
+        ("dispatch", {"type": msg_type}, stats)
+        for msg_type, stats in MESSAGE_ROUTER.stats().items()
+    ]
+    routes = hass.data.get(DATA_ROUTES)
+    if routes is not None:
+        samples.append(("routing", {}, routes.stats()))
+    for entry_id, entry_data in hass.data.get(DOMAIN, {}).items():
+        labels = {"entry": entry_id}
+        samples.append(("log", labels, entry_data["runtime"].log.stats()))
+        for name, key in ENTRY_STATS:
+            component = entry_data.get(key)
+            if component is not None:
+                samples.append((name, labels, component.stats()))
+        tracked = entry_data["metrics"].devices
+        for device in entry_data["devices"].values():
+            if device.device_id not in tracked:
+                continue
+            device_labels = {"entry": entry_id, "device": device.device_id}
+            for name, attr in DEVICE_STATS:
+                component = getattr(device, attr)
+                if component is not None:
+                    samples.append((name, device_labels, component.stats()))
+    return samples
 
 async def ws_handler(hass, request, entry_id=None):
     """WebSocket 连接处理"""
-    
-    _LOGGER.info("🔍 [DEBUG] WebSocket连接请求开始处理")
-    _LOGGER.info("🔍 [DEBUG] 请求路径: %s", request.path)
-    _LOGGER.info("🔍 [DEBUG] 请求方法: %s", request.method)
-    _LOGGER.info("🔍 [DEBUG] 请求协议: %s", request.scheme)  # 显示http或https
-    _LOGGER.info("🔍 [DEBUG] 远程地址: %s", request.remote)
-    _LOGGER.info("🔍 [DEBUG] 用户代理: %s", request.headers.get('User-Agent', 'Unknown'))
-    
-    # 记录所有headers
-    _LOGGER.info("🔍 [DEBUG] 所有请求Headers:")
-    for key, value in request.headers.items():
-        _LOGGER.info("🔍 [DEBUG]   %s: %s", key, value)
+
+    request_started = time.monotonic()
     
     # 检查WebSocket升级
     connection = request.headers.get('Connection', '').lower()
     upgrade = request.headers.get('Upgrade', '').lower()
-    _LOGGER.info("🔍 [DEBUG] Connection: %s, Upgrade: %s", connection, upgrade)
-    
+
     if 'upgrade' not in connection or upgrade != 'websocket':
-        _LOGGER.error("❌ [DEBUG] 不是有效的WebSocket升级请求")
+        _LOGGER.warning("❌ 不是有效的WebSocket升级请求: %s", request.remote)
         return web.Response(status=400, text="Bad Request: Not a WebSocket upgrade")
+
+    # 获取条目上下文 - 使用路由表选择的entry_id，否则使用第一个可用配置
+    domain_data = hass.data.get(DOMAIN, {})
+    entry_data = domain_data.get(entry_id) if entry_id else None
+    if entry_data is None:
+        entry_data = next(iter(domain_data.values()), None)
+    if entry_data is None:
+        _LOGGER.warning("❌ 没有可用的配置条目，拒绝连接: %s", request.remote)
+        return web.Response(status=503, text="Xiaozhi HA Bridge is not configured")
     
-    # 获取配置 - 优先使用指定的entry_id，否则使用第一个可用配置
-    config = {}
-    devices_store = {}
-    actual_entry_id = entry_id
-    
-    if DOMAIN in hass.data:
-        if entry_id and entry_id in hass.data[DOMAIN]:
-            # 使用指定的配置条目
-            entry_data = hass.data[DOMAIN][entry_id]
-            config = entry_data.get("config", {})
-            devices_store = entry_data.get("devices", {})
-            actual_entry_id = entry_id
-        else:
-            # 使用第一个可用的配置条目
-            first_entry_id = next(iter(hass.data[DOMAIN].keys()), None)
-            if first_entry_id:
-                entry_data = hass.data[DOMAIN][first_entry_id]
-                config = entry_data.get("config", {})
-                devices_store = entry_data.get("devices", {})
-                actual_entry_id = first_entry_id
-    
-    debug = config.get(CONF_DEBUG, True)
-    require_token = config.get(CONF_REQUIRE_TOKEN, False)
-    allowed_tokens = config.get(CONF_ALLOWED_TOKENS, [])
-    
-    _LOGGER.info("🔍 [DEBUG] 配置信息: debug=%s, require_token=%s", debug, require_token)
+    runtime = entry_data["runtime"]
+    devices_store = entry_data["devices"]
+    log = runtime.log
     
     # 从WebSocket headers中提取小智协议信息
     headers = request.headers
     auth_header = headers.get("Authorization", "")
     protocol_version = headers.get("Protocol-Version", "1")  # 小智协议默认版本1
-    device_id = headers.get("Device-Id", "unknown")
-    client_id = headers.get("Client-Id", str(uuid.uuid4()))
-    
-    _LOGGER.info("🔍 [DEBUG] 提取的协议信息:")
-    _LOGGER.info("🔍 [DEBUG]   Authorization: %s", auth_header[:20] + "..." if auth_header else "无")
-    _LOGGER.info("🔍 [DEBUG]   Protocol-Version: %s", protocol_version)
-    _LOGGER.info("🔍 [DEBUG]   Device-Id: %s", device_id)
-    _LOGGER.info("🔍 [DEBUG]   Client-Id: %s", client_id)
-    
-    if debug:
-        _LOGGER.info("🔗 小智终端连接: device_id=%s, client_id=%s, protocol_version=%s", 
-                    device_id, client_id, protocol_version)
-    
+    client_id = headers.get("Client-Id") or str(uuid.uuid4())
+    # 未提供Device-Id的终端以client_id区分，避免互相顶替
+    device_id = headers.get("Device-Id") or f"unknown-{client_id}"
+
+    if log.trace:
+        # 完整请求头仅在trace级别输出（隐去Authorization）
+        log.detail("🔍 连接请求: %s %s from %s, headers=%s",
+                   request.method, request.path, request.remote,
+                   {k: ("***" if k.lower() == "authorization" else v)
+                    for k, v in headers.items()})
+    log.info("🔗 小智终端连接: device_id=%s, client_id=%s, protocol_version=%s",
+             device_id, client_id, protocol_version)
+
     # Token鉴权
-    if require_token:
-        token = auth_header.replace("Bearer ", "").strip()
-        if not token or (allowed_tokens and token not in allowed_tokens):
-            _LOGGER.warning("🚫 [DEBUG] 设备鉴权失败: %s", device_id)
-            # 直接关闭连接，不允许握手
-            return web.Response(status=401, text="Unauthorized")
-    
-    _LOGGER.info("🔍 [DEBUG] 准备创建WebSocket连接")
-    
+    if not runtime.check_token(auth_header):
+        _LOGGER.warning("🚫 设备鉴权失败: %s", device_id)
+        # 直接关闭连接，不允许握手
+        return web.Response(status=401, text="Unauthorized")
+
+    if runtime.duplicate_policy == DUPLICATE_POLICY_REJECT and device_id in devices_store:
+        _LOGGER.warning("🚫 设备已在线，拒绝重复连接: %s", device_id)
+        return web.Response(status=409, text="Device already connected")
+
     # 创建WebSocket连接
     try:
-        ws = web.WebSocketResponse()
-        _LOGGER.info("🔍 [DEBUG] WebSocket对象创建成功")
-        
+        # ping/pong由心跳自行处理，以便测量往返时延
+        ws = web.WebSocketResponse(autoping=False)
         await ws.prepare(request)
-        _LOGGER.info("🔍 [DEBUG] WebSocket握手prepare完成")
-        
     except Exception as e:
-        _LOGGER.error("❌ [DEBUG] WebSocket创建失败: %s", e, exc_info=True)
+        _LOGGER.error("❌ WebSocket创建失败: %s", e, exc_info=True)
         return web.Response(status=500, text="WebSocket creation failed")
-    
+
     # 创建设备对象
-    device = XiaozhiDevice(device_id, client_id, ws, actual_entry_id)
-    devices_store[device_id] = device
-    
-    _LOGGER.info("🔍 [DEBUG] 设备对象创建完成")
-    
-    if debug:
-        _LOGGER.info("📱 小智设备已连接: %s (协议版本: %s, entry: %s)", 
-                    device_id, protocol_version, actual_entry_id)
+    device = XiaozhiDevice(
+        device_id, client_id, ws, runtime.entry_id,
+        audio_queue_size=runtime.audio_queue_size,
+        audio_overflow_policy=runtime.audio_overflow_policy,
+        protocol_version=protocol_version,
+    )
+    device.entry_data = entry_data
+    device.anonymous = not headers.get("Device-Id")
+    device.token_digest = bearer_digest(auth_header)
+    device.tts = TtsStreamer(hass, device)
+    device.metrics = entry_data["metrics"].device(device_id, anonymous=device.anonymous)
+    device.iot = DeviceIot(entry_data["iot_descriptors"])
+    device.metrics.start(STAGE_HANDSHAKE, at=request_started)
+    try:
+        replaced = devices_store.add(device, runtime.duplicate_policy)
+    except DuplicateDevice:
+        # 握手期间同一device_id已抢先完成注册
+        _LOGGER.warning("🚫 设备已在线，拒绝重复连接: %s", device_id)
+        await ws.close(code=WSCloseCode.POLICY_VIOLATION, message=b"device already connected")
+        return ws
+    if replaced is not None:
+        _LOGGER.warning("♻️ 设备重复连接，关闭旧连接: %s (旧会话: %s)", device_id, replaced.session_id)
+        supersede_device(hass, replaced, devices_store)
+
+    heartbeat = entry_data["heartbeat"]
+    heartbeat.track(device)
+
+    # 启动音频消费任务，将接收循环与pipeline解耦
+    device.audio_task = hass.async_create_background_task(
+        audio_consumer(device, entry_data),
+        f"{DOMAIN} audio consumer {device_id}",
+    )
+    # 启动事件写任务，保证pipeline事件按序送达
+    device.events.start(hass)
+
+    log.info("📱 小智设备已连接: %s (协议版本: %s, entry: %s)",
+             device_id, protocol_version, runtime.entry_id)
 
     try:
-        _LOGGER.info("🔍 [DEBUG] 开始WebSocket消息循环")
-        
         async for msg in ws:
-            _LOGGER.info("🔍 [DEBUG] 收到WebSocket消息: type=%s", msg.type)
-            
+            # 只记录时间戳，空闲检测由条目的心跳时间轮统一完成
+            device.last_activity = time.monotonic()
             if msg.type == WSMsgType.TEXT:
                 try:
                     data = json.loads(msg.data)
                     msg_type = data.get("type")
-                    
-                    _LOGGER.info("🔍 [DEBUG] 解析JSON消息成功: type=%s", msg_type)
-                    if debug:
-                        _LOGGER.debug("📨 收到消息: %s", data)
-
-                    if msg_type == "hello":
-                        # 处理hello握手消息
-                        _LOGGER.info("🔍 [DEBUG] 处理hello消息")
-                        await handle_hello(hass, ws, device, protocol_version, debug)
-                    
-                    elif msg_type == "iot":
-                        # 处理IoT设备能力和状态消息
-                        _LOGGER.info("🔍 [DEBUG] 处理iot消息")
-                        await handle_iot_message(hass, ws, device, data, debug)
-                            
-                    elif msg_type == "assist_pipeline/run":
-                        # Home Assistant Assist Pipeline 兼容协议
-                        _LOGGER.info("🔍 [DEBUG] 处理assist_pipeline消息")
-                        await handle_assist_pipeline(hass, ws, device, data, debug, config)
-                            
-                    elif msg_type == "listen":
-                        _LOGGER.info("🔍 [DEBUG] 处理listen消息")
-                        await handle_listen(hass, ws, device, data, debug, config)
-                            
-                    elif msg_type == "abort":
-                        _LOGGER.info("🔍 [DEBUG] 处理abort消息")
-                        await handle_abort(hass, ws, device, data, debug)
-                            
-                    # 扩展：IoT设备控制
-                    elif msg_type == "iot_control":
-                        _LOGGER.info("🔍 [DEBUG] 处理iot_control消息")
-                        await handle_iot_control(hass, ws, device, data, debug)
-                    
-                    # 处理ping/pong保持连接
-                    elif msg_type == "ping":
-                        _LOGGER.info("🔍 [DEBUG] 处理ping消息")
-                        await ws.send_json({"type": "pong"})
-                        if debug:
-                            _LOGGER.debug("🏓 Ping-Pong")
-                    else:
-                        _LOGGER.warning("🔍 [DEBUG] 未知消息类型: %s", msg_type)
-                        
+                    # 每条消息取最新的上下文，选项变更后下一条消息即生效
+                    runtime = entry_data["runtime"]
+                    log = runtime.log
+
+                    if log.verbose:
+                        log.detail("📨 收到消息: %s", data)
+
+                    route = MESSAGE_ROUTER.get(msg_type)
+                    if route is None:
+                        _LOGGER.warning("⚠️ 未知消息类型: %s (设备: %s)", msg_type, device_id)
+                        continue
+                    # abort/ping等立即执行，pipeline启动等慢消息在后台按序执行
+                    result = await MESSAGE_ROUTER.dispatch(
+                        route, MessageContext(hass, ws, device, data, runtime)
+                    )
+                    if result is not None:
+                        # hello恢复会话时接管为断开前的设备对象
+                        device = result
+
                 except json.JSONDecodeError as e:
-                    _LOGGER.error("❌ [DEBUG] JSON解析错误: %s", e)
+                    _LOGGER.warning("❌ JSON解析错误: %s (设备: %s)", e, device_id)
                     await ws.send_json({"type": "error", "message": "Invalid JSON"})
-                        
+
             elif msg.type == WSMsgType.BINARY:
-                _LOGGER.info("🔍 [DEBUG] 收到二进制消息: %d bytes", len(msg.data))
                 # 收到音频帧 - 处理Assist Pipeline二进制数据
-                if device and device.pipeline_handler_id is not None:
-                    await handle_binary_audio(hass, ws, device, msg.data, debug)
-                        
+                await handle_binary_audio(hass, ws, device, msg.data, entry_data["runtime"])
+
+            elif msg.type == WSMsgType.PING:
+                await ws.pong(msg.data)
+
+            elif msg.type == WSMsgType.PONG:
+                heartbeat.pong(device, msg.data)
+
             elif msg.type == WSMsgType.ERROR:
-                _LOGGER.error("❌ [DEBUG] WebSocket连接异常: %s", ws.exception())
+                _LOGGER.error("❌ WebSocket连接异常: %s (设备: %s)", ws.exception(), device_id)
                 break
-                
+
             elif msg.type == WSMsgType.CLOSE:
-                _LOGGER.info("🔍 [DEBUG] WebSocket连接正常关闭")
                 break
-                
+
     except Exception as e:
-        _LOGGER.error("❌ [DEBUG] WebSocket处理异常: %s", e, exc_info=True)
+        device.metrics.count(COUNTER_ERRORS)
+        _LOGGER.error("❌ WebSocket处理异常: %s", e, exc_info=True)
     finally:
-        _LOGGER.info("🔍 [DEBUG] WebSocket连接结束，开始清理")
-        
-        if device:
-            # 清理pipeline
-            if device.current_pipeline:
-                try:
-                    await device.current_pipeline.abort()
-                except:
-                    pass
-            
-            device.set_status(DEVICE_STATUS_DISCONNECTED)
-            # 从设备管理器中移除
-            if device.device_id in devices_store:
-                del devices_store[device.device_id]
-            if debug:
-                _LOGGER.info("📱 设备已断开: %s (连接时长: %s)", 
-                           device.device_id, 
-                           datetime.now() - device.connected_time)
-        else:
-            if debug:
-                _LOGGER.info("🔌 未知设备断开连接")
-    
-    _LOGGER.info("🔍 [DEBUG] WebSocket处理完成")
+        await async_disconnected(hass, device, ws, entry_data)
+
     return ws
 
-async def handle_hello(hass, ws, device, protocol_version, debug):
-    """处理hello握手消息"""
-    _LOGGER.info("🔍 [DEBUG] handle_hello开始: device_id=%s, protocol_version=%s", 
-                device.device_id, protocol_version)
+async def async_disconnected(hass, device, ws, entry_data):
+    """连接关闭后的清理：宽限期内保留会话等待重连，新连接的hello携带原session_id即可接管；
+    条目已卸载或令牌已失效时直接释放（中止pipeline、归还名额）"""
+    if device.ws is not ws or device.superseded:
+        # 会话已由新连接恢复，或被同一设备的新连接顶替时已保留/释放
+        return
+    runtime = entry_data["runtime"]
+    log = runtime.log
+    devices_store = entry_data["devices"]
+    grace = runtime.session_resume_seconds
+    loaded = hass.data.get(DOMAIN, {}).get(runtime.entry_id) is entry_data
+    if grace > 0 and loaded and runtime.check_digest(device.token_digest):
+        park_device(hass, device, devices_store, grace)
+        log.info("⏸️ 设备已断开，保留会话%ds: %s (session: %s)",
+                 grace, device.device_id, device.session_id)
+        return
+    await async_release_device(device, devices_store)
+    if device.device_id not in devices_store:
+        log.forget(device.device_id)
+    log.info("📱 设备已断开: %s (连接时长: %s, 音频队列: %s, 事件: %s, IoT: %s)",
+             device.device_id,
+             datetime.now() - device.connected_time,
+             device.audio_queue.stats(),
+             device.events.stats(),
+             device.iot.stats())
+
+def supersede_device(hass, device, devices_store):
+    """同一device_id的新连接顶替旧连接
+
+    旧连接可能是服务端尚未察觉的半开连接（终端Wi-Fi闪断后重连），其清理会晚于
+    新连接的hello，因此在顶替时立即保留会话：hello携带原session_id时由新连接接管，
+    否则作为过期会话释放。无法保留（未启用会话保持或令牌已失效）时直接释放。
+    旧连接的关闭握手会等到超时，在后台关闭，新连接直接进入接收循环。
+    """
+    device.superseded = True
+    runtime = device.runtime
+    grace = runtime.session_resume_seconds
+    if grace > 0 and runtime.check_digest(device.token_digest):
+        park_device(hass, device, devices_store, grace)
+    else:
+        hass.async_create_background_task(
+            async_release_device(device, devices_store),
+            f"{DOMAIN} release {device.device_id}",
+        )
+    hass.async_create_background_task(
+        device.ws.close(code=WSCloseCode.POLICY_VIOLATION, message=b"replaced by new connection"),
+        f"{DOMAIN} close replaced {device.device_id}",
+    )
+
+def park_device(hass, device, devices_store, grace):
+    """断开但保留会话：pipeline、TTS与音频任务继续运行，事件暂存到恢复为止"""
+    resume_status = device.status
+    device.set_status(DEVICE_STATUS_DISCONNECTED)
+    device.resume_status = resume_status
+    device.online.clear()
+    stale = devices_store.park(device)
+    device.entry_data["heartbeat"].untrack(device)
+    _refresh_iot_entities(device)
+    if stale is not None:
+        # 同一设备更早保留的会话不可能再被恢复
+        hass.async_create_background_task(
+            async_release_device(stale, devices_store),
+            f"{DOMAIN} release {stale.device_id}",
+        )
+
+    def expire():
+        device.resume_handle = None
+        hass.async_create_background_task(
+            async_release_device(device, devices_store),
+            f"{DOMAIN} release {device.device_id}",
+        )
+        device.runtime.log.info("📱 会话保留超时，设备已断开: %s", device.device_id)
+
+    device.resume_handle = asyncio.get_running_loop().call_later(grace, expire)
+
+async def async_release_device(device, devices_store):
+    """释放设备会话：停止音频与事件任务、中止pipeline并移出注册表"""
+    if device.resume_handle is not None:
+        device.resume_handle.cancel()
+        device.resume_handle = None
+    devices_store.unpark(device)
+    device.entry_data["heartbeat"].untrack(device)
+    device.lane.cancel()
+
+    # 停止音频消费任务
+    if device.audio_task:
+        device.audio_task.cancel()
+        device.audio_task = None
+    device.audio_queue.clear()
+    await device.events.stop()
+    device.tts.cancel()
+
+    # 清理pipeline
+    if device.current_pipeline:
+        try:
+            await device.current_pipeline.abort()
+        except:
+            pass
+        device.current_pipeline = None
+        device.pipeline_handler_id = None
+    release_admission(device)
+
+    device.iot.release()
+    device.set_status(DEVICE_STATUS_DISCONNECTED)
+    # 从设备注册表中移除（被新连接替换时不影响新连接）
+    devices_store.remove(device)
+    _refresh_iot_entities(device)
+    if device.device_id not in devices_store:
+        device.entry_data["metrics"].forget(device.device_id)
+
+async def async_resume_session(hass, device, parked, runtime):
+    """新连接接管断开前保留的会话，返回接管后的设备对象"""
+    devices_store = device.registry
+    # 临时设备只用于完成握手，停止它的任务
+    device.lane.cancel()
+    if device.audio_task:
+        device.audio_task.cancel()
+        device.audio_task = None
+    await device.events.stop()
+    device.iot.release()
+    devices_store.remove(device)
+    device.entry_data["heartbeat"].untrack(device)
+
+    if parked.resume_handle is not None:
+        parked.resume_handle.cancel()
+        parked.resume_handle = None
+    parked.ws = device.ws
+    parked.superseded = False
+    parked.client_id = device.client_id
+    parked.token_digest = device.token_digest
+    parked.protocol_version = device.protocol_version
+    parked.features = device.features
+    parked.events.batch_enabled = device.events.batch_enabled
+    devices_store.add(parked, runtime.duplicate_policy)
+    parked.online.set()
+    parked.last_activity = parked.last_audio = time.monotonic()
+    parked.entry_data["heartbeat"].track(parked)
+    parked.set_status(parked.resume_status or DEVICE_STATUS_CONNECTED)
+    parked.resume_status = None
+    _refresh_iot_entities(parked)
+    return parked
+
+def group_iot_actions(actions, resolver):
+    """按(domain, service, 参数)分组并合并entity_id，返回(分组, 未解析的目标)"""
+    groups = {}
+    unresolved = []
+    for action in actions:
+        command = action.get("command", "")
+        if not command:
+            continue
+        domain, service = command.split(".", 1) if "." in command else ("homeassistant", command)
+        entity_ids, missing = resolver.resolve(action)
+        unresolved.extend(missing)
+        if not entity_ids:
+            continue
+        # 参数相同的动作才能合并，参数以规范化JSON作为分组键
+        service_data = json.dumps(action.get("data") or {}, sort_keys=True)
+        merged = groups.setdefault((domain, service, service_data), [])
+        merged.extend(entity_id for entity_id in entity_ids if entity_id not in merged)
+    return groups, unresolved
+
+async def _async_call_iot_group(hass, domain, service, service_data, entity_ids):
+    """执行一次合并后的服务调用（带超时），返回结果摘要"""
+    result = {"command": f"{domain}.{service}", "entity_ids": entity_ids}
+    try:
+        await asyncio.wait_for(
+            hass.services.async_call(
+                domain, service, {**json.loads(service_data), "entity_id": entity_ids}, blocking=True
+            ),
+            IOT_CONTROL_TIMEOUT,
+        )
+        result["status"] = "success"
+    except asyncio.TimeoutError:
+        result["status"] = "timeout"
+        result["message"] = f"服务调用超时（{IOT_CONTROL_TIMEOUT}s）"
+    except Exception as e:
+        _LOGGER.warning("⚠️ IoT服务调用失败: %s.%s %s (%s)", domain, service, entity_ids, e)
+        result["status"] = "error"
+        result["message"] = str(e)
+    return result
+
+def _refresh_iot_entities(device):
+    """设备上下线后刷新其IoT实体的可用状态"""
+    iot_entities = device.entry_data.get("iot_entities")
+    if iot_entities is not None:
+        iot_entities.device_changed(device.device_id)
+
+async def handle_hello(hass, ws, device, data, runtime):
+    """处理hello握手消息，返回此后处理该连接的设备对象
+    
+    hello中携带断开前的session_id且会话仍在保留期内时，恢复原会话：
+    IoT描述、进行中的pipeline和TTS都继续沿用，不再重新握手建立。
+    """
+    protocol_version = device.protocol_version
+    features = data.get("features")
+    device.features = features if isinstance(features, dict) else {}
+    # 终端声明支持时，积压的pipeline事件合并为batch帧发送
+    device.events.batch_enabled = bool(device.features.get("event_batch"))
     
-    # 按照小智协议返回hello确认 - 修正格式匹配小智期望
-    response = {
-        "type": "hello",
-        "version": int(protocol_version),  # 修正：使用version而不是protocol_version，且转为整数
-        "session_id": device.session_id,
-        "audio_params": {  # 修正：使用audio_params而不是audio_settings
-            "format": "opus",
-            "sample_rate": 16000,
-            "channels": 1,
-            "frame_duration": 60  # 小智协议规定的60ms帧长
-        },
-        "features": {},  # 添加：小智期望的features字段
-        "transport": "websocket"  # 添加：小智期望的transport字段
-    }
+    devices_store = device.registry
+    resumed = False
+    session_id = data.get("session_id")
+    if devices_store is not None:
+        parked = devices_store.take_parked(session_id, device.device_id) if session_id else None
+        if parked is not None:
+            device = await async_resume_session(hass, device, parked, runtime)
+            resumed = True
+        else:
+            # 未恢复的旧会话不会再被使用，立即释放
+            stale = devices_store.parked_for(device.device_id)
+            if stale is not None:
+                await async_release_device(stale, devices_store)
     
-    _LOGGER.info("🔍 [DEBUG] 准备发送hello响应: %s", response)
+    # 按照小智协议返回hello确认（version为整数，附带audio_params/features/transport）
+    response = runtime.hello_response(protocol_version, device.session_id)
+    if resumed:
+        response["resumed"] = True
+        response["resume"] = {
+            "iot_descriptors": len(device.iot.descriptors),
+            "iot_seq": device.iot.seq,
+            "pipeline_active": device.current_pipeline is not None,
+            "tts_active": device.tts.active,
+        }
     
     try:
         await ws.send_json(response)
-        _LOGGER.info("🔍 [DEBUG] hello响应发送成功")
-        
-        if debug:
-            _LOGGER.info("✅ 小智协议握手成功: %s (协议版本: %s)", device.device_id, protocol_version)
+        if resumed and device.tts.active:
+            # 断开期间的TTS帧已按时丢弃，重新告知终端进入播放状态
+            await ws.send_json({"type": "tts", "state": "start", "session_id": device.session_id})
+            if device.tts_text:
+                await ws.send_json({"type": "tts", "state": "sentence_start", "text": device.tts_text})
+        device.metrics.stop(STAGE_HANDSHAKE)
+        if resumed:
+            runtime.log.info("▶️ 会话已恢复: %s (session: %s)", device.device_id, device.session_id)
+        else:
+            runtime.log.info("✅ 小智协议握手成功: %s (协议版本: %s)", device.device_id, protocol_version)
     except Exception as e:
-        _LOGGER.error("❌ [DEBUG] hello响应发送失败: %s", e, exc_info=True)
+        _LOGGER.error("❌ hello响应发送失败: %s", e, exc_info=True)
+        return device
+    
+    # 握手完成后预解析pipeline并预热引擎，首个语音请求不再冷启动
+    device.entry_data["pipelines"].prewarm(
+        runtime.pipeline_id,
+        tts_engine=runtime.tts_engine if runtime.tts_cache else None,
+    )
+    return device
 
-async def handle_iot_message(hass, ws, device, data, debug):
+async def handle_iot_message(hass, ws, device, data, runtime):
     """处理IoT设备能力和状态消息"""
+    log = runtime.log
     try:
-        update_type = data.get("update", False)
-        
+        iot = device.iot
+        iot_entities = device.entry_data.get("iot_entities")
         if "descriptors" in data:
-            # 设备能力描述
-            device.iot_descriptors = data["descriptors"]
-            if debug:
-                _LOGGER.info("🏠 收到设备能力描述: %d个组件", len(device.iot_descriptors))
-                for desc in device.iot_descriptors:
-                    _LOGGER.info("🏠   - %s: %s", desc.get("name"), desc.get("description"))
+            # 设备能力描述（同型号终端共享同一份）
+            if iot.set_descriptors(data["descriptors"]):
+                log.info("🏠 收到设备能力描述: %s (%d个组件, %s)",
+                         device.device_id, len(iot.descriptors), iot.descriptor_key[:8])
+                if iot_entities is not None:
+                    iot_entities.add_device(device)
+                if log.verbose:
+                    for desc in iot.descriptors:
+                        log.detail("🏠   - %s: %s", desc.get("name"), desc.get("description"))
         
         if "states" in data:
-            # 设备状态更新
-            for state_info in data["states"]:
-                name = state_info.get("name")
-                state = state_info.get("state", {})
-                device.iot_states[name] = state
-                if debug:
-                    _LOGGER.info("🏠 设备状态更新: %s = %s", name, state)
+            # 设备状态更新（只记录变化的属性）
+            changes = iot.apply_states(data["states"])
+            if changes:
+                if log.verbose:
+                    log.detail("🏠 设备状态变化: %s #%d %s", device.device_id, iot.seq, changes)
+                # HA实体的状态写入在去抖窗口内合并
+                if iot_entities is not None:
+                    iot_entities.state_changed(device.device_id, changes)
         
-        # 发送确认响应
-        await ws.send_json({
-            "type": "iot", 
-            "status": "ok",
-            "message": "IoT信息已接收"
-        })
+        # 确认响应在短时间内合并发送
+        iot.schedule_ack(hass, device)
         
     except Exception as e:
         _LOGGER.error("❌ IoT消息处理失败: %s", e)
@@ -386,25 +742,92 @@ async def handle_iot_message(hass, ws, device, data, debug):
             "message": str(e)
         })
 
-async def handle_assist_pipeline(hass, ws, device, data, debug, config):
+async def handle_assist_pipeline(hass, ws, device, data, runtime):
     """处理Home Assistant Assist Pipeline请求"""
+    log = runtime.log
+    started = time.monotonic()
     try:
-        pipeline_id = data.get("pipeline") or config.get(CONF_PIPELINE_ID)
+        # 使用hello时预解析的pipeline（未命中则当场解析并缓存）
+        pipelines = device.entry_data["pipelines"]
+        requested_pipeline = data.get("pipeline") or runtime.pipeline_id
+        warm = pipelines.get(requested_pipeline) is not None
+        resolved = pipelines.resolve(requested_pipeline)
+        pipeline_id = resolved.pipeline_id
         start_stage = data.get("start_stage", "stt")
         end_stage = data.get("end_stage", "tts")
         conversation_id = data.get("conversation_id")
         device_id = data.get("device_id", device.device_id)
         
+        # 启用TTS缓存时由桥接执行TTS阶段：pipeline只运行到意图识别，
+        # 回复命中缓存时不再调用TTS引擎
+        bridge_tts = (
+            end_stage == "tts"
+            and runtime.tts_streaming
+            and runtime.tts_cache
+            and OPUS_AVAILABLE
+            and device.entry_data.get("tts_cache") is not None
+        )
+        # 多数STT只接受PCM：可用时由桥接解码Opus，直接向STT声明PCM
+        transcode = runtime.audio_transcode and OPUS_AVAILABLE
+        if transcode:
+            audio_format = assist_pipeline.AudioFormats.WAV
+            audio_codec = assist_pipeline.AudioCodecs.PCM
+        else:
+            audio_format = assist_pipeline.AudioFormats.OPUS
+            audio_codec = assist_pipeline.AudioCodecs.OPUS
+        
+        # 启用命令快速通道时pipeline只运行STT，识别结果由桥接处理意图
+        # （命中缓存直接执行，否则交给对话代理），回复同样由桥接合成
+        bridge_intent = bridge_tts and runtime.intent_fast_path and start_stage == "stt"
+        
+        # 会话进行中再次开始：先中止旧会话并归还其名额
+        if (device.current_pipeline is not None or device.intent_task is not None
+                or device.admission is not None):
+            log.info("⏹️ 新会话开始，中止进行中的会话: %s", device.device_id)
+            device.tts.cancel()
+            # 预录缓冲中是本次会话的音频，保留
+            await abort_pipeline(device, keep_preroll=True)
+        # 旧会话的pipeline之后产生的事件（包括run-end）不再影响本次会话
+        run = device.events.begin_run()
+        
+        pipeline_kwargs = {}
+        event_callback = functools.partial(device.events.publish, run=run)
+        if bridge_intent:
+            pipeline_kwargs["end_stage"] = assist_pipeline.PipelineStage.STT
+            event_callback = functools.partial(publish_bridged_intent_event, hass, device, run)
+        elif bridge_tts:
+            pipeline_kwargs["end_stage"] = assist_pipeline.PipelineStage.INTENT
+        
+        # 取得条目的pipeline名额，名额不足时排队
+        queued_at = time.monotonic()
+        try:
+            device.admission = await device.entry_data["admission"].acquire(
+                device, device_priority(hass, device, runtime.admission_priorities)
+            )
+        except AdmissionRejected as e:
+            device.metrics.count(COUNTER_REJECTED)
+            log.info("🚦 Pipeline未获准入: %s (%s)", device.device_id, e.reason)
+            await ws.send_json({
+                "type": "error",
+                "data": {
+                    "code": "pipeline-busy",
+                    "reason": e.reason,
+                    "message": str(e)
+                }
+            })
+            return
+        device.metrics.observe(STAGE_ADMISSION, time.monotonic() - queued_at)
+        
         # 使用更新的Assist Pipeline API
         try:
             # 尝试使用新的API
             runner_data = await assist_pipeline.async_pipeline_from_audio_stream(
                 hass,
-                event_callback=lambda event: handle_pipeline_event(ws, device, event, debug),
+                event_callback=event_callback,
                 stt_metadata=assist_pipeline.SpeechMetadata(
-                    language=config.get(CONF_LANGUAGE, "zh-CN"),
-                    format=assist_pipeline.AudioFormats.OPUS,
-                    codec=assist_pipeline.AudioCodecs.OPUS,
+                    language=runtime.language,
+                    format=audio_format,
+                    codec=audio_codec,
                     bit_rate=assist_pipeline.AudioBitRates.BITRATE_16,
                     sample_rate=assist_pipeline.AudioSampleRates.SAMPLERATE_16000,
                     channel=assist_pipeline.AudioChannels.CHANNEL_MONO,
@@ -413,50 +836,81 @@ async def handle_assist_pipeline(hass, ws, device, data, debug, config):
                 conversation_id=conversation_id,
                 device_id=device_id,
                 tts_audio_output="raw",
+                **pipeline_kwargs,
             )
         except (AttributeError, TypeError) as e:
             # 如果新API不存在或参数不匹配，回退到简化版本
             _LOGGER.warning("使用简化的Assist Pipeline实现（旧版本兼容）: %s", e)
-            # 简化的实现 - 直接调用对话服务
-            context = Context()
-            response = await conversation.async_converse(
-                hass, 
-                text=data.get("text", ""), 
-                conversation_id=conversation_id,
-                context=context,  # 添加必需的context参数
-                language=config.get(CONF_LANGUAGE, "zh-CN")
-            )
+            # 简化的实现 - 直接处理文本命令（可用时先走命令快速通道）
+            device.conversation_id = conversation_id
+            device.conversation_agent = resolved.conversation_engine
+            intent_output = await async_process_text(hass, device, data.get("text", ""), runtime)
             
             # 发送对话响应
             await ws.send_json({
                 "type": "conversation-response",
                 "data": {
-                    "response": response.response.speech.get("plain", {}).get("speech", ""),
-                    "conversation_id": response.conversation_id
+                    "response": _response_speech({"intent_output": intent_output}) or "",
+                    "conversation_id": intent_output.get("conversation_id")
                 }
             })
+            release_admission(device)
             return
         
+        # 新会话开始前丢弃上一轮残留音频，并停止仍在播放的TTS
+        device.audio_queue.clear()
+        # 选项变更后的队列配置从下一次会话开始生效
+        device.audio_queue.configure(runtime.audio_queue_size, runtime.audio_overflow_policy)
+        device.tts.cancel()
+        cancel_bridged_intent(device)
+        device.bridge_tts = bridge_tts
+        device.reply_voice = reply_voice(resolved, runtime)
+        device.bridge_intent = bridge_intent
+        device.conversation_id = conversation_id
+        device.conversation_agent = resolved.conversation_engine
+        device.transcode = transcode
+        device.transcoder.reset()
+        device.stream_ended = False
+        # 服务端端点检测只能在解码后的PCM上进行
+        device.vad = None
+        if transcode and runtime.vad and NUMPY_AVAILABLE:
+            device.vad = EndOfSpeechDetector(
+                runtime.vad_energy_threshold,
+                runtime.vad_zcr_threshold,
+                runtime.vad_silence_ms,
+            )
         device.current_pipeline = runner_data
         device.pipeline_handler_id = getattr(runner_data, 'stt_binary_handler_id', 1)
+        device.last_audio = time.monotonic()
         
-        # 发送run-start事件
-        await ws.send_json({
-            "type": "run-start",
-            "data": {
-                "pipeline": pipeline_id,
-                "language": config.get(CONF_LANGUAGE, "zh-CN"),
-                "runner_data": {
-                    "stt_binary_handler_id": device.pipeline_handler_id,
-                    "timeout": data.get("timeout", 300)
-                }
-            }
-        })
+        # 请求前（唤醒词之后）已上传的音频先于实时音频送入pipeline
+        if device.preroll is not None and len(device.preroll):
+            frames = device.preroll.drain(started - runtime.preroll_ms / 1000)
+            for frame in frames[-device.audio_queue.maxsize:]:
+                await device.audio_queue.put(frame)
+            if frames:
+                device.metrics.count(COUNTER_FRAMES_IN, len(frames))
+                log.detail("⏪ 补送预录音频: %s (%d帧)", device.device_id, len(frames))
+        if device.end_pending:
+            device.end_pending = False
+            await device.audio_queue.put(END_OF_STREAM)
         
-        if debug:
-            _LOGGER.info("🚀 Assist Pipeline 启动: %s", pipeline_id)
+        # 发送run-start事件（经事件队列，与pipeline事件保持顺序）
+        device.events.send("run-start", runtime.run_start_data(
+            pipeline_id, device.pipeline_handler_id, data.get("timeout", 300)
+        ))
+        
+        elapsed = time.monotonic() - started
+        pipelines.record_run_start(warm, elapsed)
+        device.metrics.observe(STAGE_RUN_START, elapsed)
+        device.metrics.start(STAGE_TURN, at=started)
+        log.info("🚀 Assist Pipeline 启动: %s (设备: %s, %s启动 %.1fms)",
+                 pipeline_id, device.device_id, "热" if warm else "冷", elapsed * 1000)
             
     except Exception as e:
+        device.metrics.count(COUNTER_ERRORS)
+        if device.current_pipeline is None:
+            release_admission(device)
         _LOGGER.error("❌ Assist Pipeline 启动失败: %s", e)
         await ws.send_json({
             "type": "error",
@@ -466,61 +920,310 @@ async def handle_assist_pipeline(hass, ws, device, data, debug, config):
             }
         })
 
-async def handle_binary_audio(hass, ws, device, binary_data, debug):
-    """处理二进制音频数据"""
-    if not device.current_pipeline:
+async def handle_binary_audio(hass, ws, device, binary_data, runtime):
+    """处理二进制音频数据：解析帧并写入设备音频队列"""
+    if not device.current_pipeline or device.lane.starting:
+        # 会话启动完成前的音频写入预录缓冲（固定容量，满时覆盖最旧的帧），
+        # 启动完成后先于实时音频送入pipeline
+        buffer_preroll(device, binary_data, runtime)
         return
         
     try:
         # 检查是否是结束标记（单字节）
-        if len(binary_data) == 1:
-            # 音频流结束
-            await device.current_pipeline.end_stream()
-            if debug:
-                _LOGGER.info("🎵 音频流结束")
+        if is_end_marker(binary_data):
+            # 音频流结束，排在已入队的音频之后
+            await device.audio_queue.put(END_OF_STREAM)
         else:
             # 提取handler_id和音频数据
-            handler_id = binary_data[0]
-            audio_data = binary_data[1:]
+            handler_id, audio_data = split_frame(binary_data)
             
             if handler_id == device.pipeline_handler_id:
-                await device.current_pipeline.receive_audio(audio_data)
-                if debug:
-                    _LOGGER.debug("🎵 收到音频帧: %d bytes", len(audio_data))
-                    
+                device.last_audio = device.last_activity
+                device.metrics.count(COUNTER_FRAMES_IN)
+                device.metrics.count(COUNTER_BYTES_IN, len(audio_data))
+                await device.audio_queue.put(audio_data)
+                
+    except AudioQueueOverflow as e:
+        device.metrics.count(COUNTER_ERRORS)
+        _LOGGER.warning("⚠️ 音频队列溢出，中止会话: %s (%s)", device.device_id, e)
+        await abort_pipeline(device)
+        await ws.send_json({
+            "type": "error",
+            "data": {
+                "code": "audio-queue-overflow",
+                "message": str(e),
+                "audio_queue": device.audio_queue.stats()
+            }
+        })
     except Exception as e:
         _LOGGER.error("❌ 音频处理失败: %s", e)
 
-async def handle_pipeline_event(ws, device, event, debug):
-    """处理pipeline事件"""
-    try:
-        event_type = event.type
+def buffer_preroll(device, binary_data, runtime):
+    """没有pipeline时保存最近的音频帧，供下一次会话补送"""
+    if is_end_marker(binary_data):
+        # 启动期间结束的音频流在补送预录音频之后结束
+        device.end_pending = device.lane.starting
+        return
+    if runtime.preroll_ms <= 0:
+        return
+    capacity = preroll_frames(runtime.preroll_ms)
+    if device.preroll is None or device.preroll.capacity != capacity:
+        device.preroll = PrerollBuffer(capacity)
+    # 会话尚未建立，终端还不知道handler_id，不校验帧头
+    device.preroll.push(split_frame(binary_data)[1], device.last_activity)
+
+async def audio_consumer(device, entry_data):
+    """音频消费任务：按顺序将队列中的音频送入pipeline"""
+    queue = device.audio_queue
+    while True:
+        # 一次取出已到达的帧，解码时合并为一个批次
+        items = await queue.get_batch(DECODE_BATCH_FRAMES)
+        log = entry_data["runtime"].log
+        pipeline = device.current_pipeline
+        if pipeline is None or device.stream_ended:
+            # 会话已结束、被中止或已由VAD结束音频流，丢弃残留音频
+            continue
+        try:
+            if items[0] is END_OF_STREAM:
+                device.stream_ended = True
+                await pipeline.end_stream()
+                log.detail("🎵 音频流结束: %s", device.device_id)
+            elif device.transcode:
+                pcm = await device.transcoder.decode(items)
+                if device.current_pipeline is not pipeline:
+                    continue
+                await pipeline.receive_audio(pcm)
+                if device.vad is not None:
+                    await apply_vad(device, pipeline, pcm, log)
+                if log.trace:
+                    log.hot(device.device_id, "🎵 解码音频帧: %s %d帧 -> %d bytes (队列深度: %d)",
+                            device.device_id, len(items), len(pcm), queue.depth)
+            else:
+                for item in items:
+                    await pipeline.receive_audio(item)
+                if log.trace:
+                    log.hot(device.device_id, "🎵 收到音频帧: %s %d帧 (队列深度: %d)",
+                            device.device_id, len(items), queue.depth)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _LOGGER.error("❌ 音频处理失败: %s", e)
+
+async def apply_vad(device, pipeline, pcm, log):
+    """对解码后的PCM做端点检测，说话结束时直接结束STT音频流"""
+    vad = device.vad
+    for event in vad.process(pcm):
+        if event == VAD_SPEECH_START:
+            device.events.send("stt-vad-start", {"timestamp": vad.speech_start_ms})
+            log.detail("🗣️ 检测到开始说话: %s (%dms)", device.device_id, vad.speech_start_ms)
+        elif event == VAD_SPEECH_END:
+            device.events.send("stt-vad-end", {"timestamp": vad.speech_end_ms})
+            device.vad = None
+            device.stream_ended = True
+            await pipeline.end_stream()
+            log.detail("🤫 检测到说话结束，提前结束音频流: %s (%dms)",
+                       device.device_id, vad.speech_end_ms)
+
+async def abort_pipeline(device, keep_preroll=False):
+    """中止设备当前pipeline并清空音频队列"""
+    pipeline = device.current_pipeline
+    device.current_pipeline = None
+    device.pipeline_handler_id = None
+    dropped = device.audio_queue.clear()
+    cancel_bridged_intent(device)
+    if not keep_preroll:
+        device.end_pending = False
+        if device.preroll is not None:
+            device.preroll.clear()
+    if dropped:
+        _LOGGER.debug("🗑️ 中止时丢弃排队音频: %s (%d帧)", device.device_id, dropped)
+    release_admission(device)
+    if pipeline:
+        device.metrics.count(COUNTER_ABORTS)
+        for stage in (STAGE_STT, STAGE_INTENT, STAGE_TTS_FIRST_AUDIO, STAGE_TURN):
+            device.metrics.discard(stage)
+        await pipeline.abort()
+
+def release_admission(device):
+    """归还设备当前占用的pipeline名额"""
+    ticket, device.admission = device.admission, None
+    if ticket is not None:
+        device.entry_data["admission"].release(ticket)
+
+def apply_pipeline_event(device, message):
+    """事件发出后切换设备状态（由事件写任务按顺序调用）"""
+    event_type = message["type"]
+    if _LOGGER.isEnabledFor(logging.DEBUG):
+        _LOGGER.debug("📡 Pipeline事件: %s (设备: %s)", event_type, device.device_id)
+    
+    if event_type == "run-end":
+        device.current_pipeline = None
+        device.pipeline_handler_id = None
+        release_admission(device)
+        # TTS仍在下发时保持speaking，下发结束后再恢复；一轮对话在播放完毕时计时结束
+        if device.tts.active:
+            device.set_status(DEVICE_STATUS_SPEAKING)
+        else:
+            device.set_status(DEVICE_STATUS_CONNECTED)
+            device.metrics.stop(STAGE_TURN)
         
-        if debug:
-            _LOGGER.debug("📡 Pipeline事件: %s", event_type)
+    elif event_type == "stt-start":
+        device.set_status(DEVICE_STATUS_LISTENING)
+        device.metrics.start(STAGE_STT)
         
-        # 转发事件到客户端
-        await ws.send_json({
-            "type": event_type,
-            "data": event.data if hasattr(event, 'data') else {}
-        })
+    elif event_type == "stt-end":
+        device.metrics.stop(STAGE_STT)
+        # 识别已完成，之后等待意图/TTS期间不再需要音频，空闲检查不再适用
+        device.stream_ended = True
         
-        # 特殊处理某些事件
-        if event_type == "run-end":
-            device.current_pipeline = None
-            device.pipeline_handler_id = None
-            device.set_status(DEVICE_STATUS_CONNECTED)
-            
-        elif event_type == "stt-start":
-            device.set_status(DEVICE_STATUS_LISTENING)
-            
-        elif event_type == "tts-start":
-            device.set_status(DEVICE_STATUS_SPEAKING)
-            
+    elif event_type == "intent-start":
+        device.metrics.start(STAGE_INTENT)
+        
+    elif event_type == "error":
+        device.metrics.count(COUNTER_ERRORS)
+        
+    elif event_type == "tts-start":
+        # 桥接执行TTS时已在合成开始时计时
+        if not device.bridge_tts:
+            device.metrics.start(STAGE_TTS_FIRST_AUDIO)
+        device.set_status(DEVICE_STATUS_SPEAKING)
+        device.tts_text = message["data"].get("tts_input")
+        
+    elif event_type == "intent-end" and device.bridge_tts:
+        device.metrics.stop(STAGE_INTENT)
+        # 由桥接合成回复语音（优先使用TTS缓存）
+        speech = _response_speech(message["data"])
+        runtime = device.runtime
+        engine, language, voice = device.reply_voice or reply_voice(None, runtime)
+        device.metrics.start(STAGE_TTS_FIRST_AUDIO)
+        # 会话的名额转交给回复合成，合成结束后归还（而不是在run-end时）
+        ticket, device.admission = device.admission, None
+        release = None
+        if ticket is not None:
+            release = functools.partial(device.entry_data["admission"].release, ticket)
+        if speech and device.tts.start_text(
+            speech,
+            runtime.tts_lead_frames,
+            engine=engine,
+            language=language,
+            voice=voice,
+            cache=device.entry_data.get("tts_cache"),
+            release=release,
+        ):
+            device.events.send("tts-start", {
+                "engine": engine,
+                "language": language,
+                "voice": voice,
+                "tts_input": speech,
+            })
+        elif release is not None:
+            release()
+        
+    elif event_type == "intent-end":
+        device.metrics.stop(STAGE_INTENT)
+        
+    elif event_type == "tts-end":
+        # 将TTS音频编码为Opus帧直接下发，终端无需再下载URL
+        runtime = device.runtime
+        if runtime.tts_streaming:
+            tts_output = message["data"].get("tts_output")
+            device.tts.start_tts_output(tts_output, runtime.tts_lead_frames, device.tts_text)
+
+def reply_voice(resolved, runtime):
+    """桥接TTS的(引擎, 语言, 音色)：与pipeline自身的TTS设置一致，pipeline未配置时使用条目选项"""
+    if resolved is not None and resolved.tts_engine:
+        return (resolved.tts_engine, resolved.tts_language or runtime.language, resolved.tts_voice)
+    return (runtime.tts_engine, runtime.language, None)
+
+def publish_bridged_intent_event(hass, device, run, event):
+    """只运行STT的pipeline的事件回调：识别出文本后由桥接处理意图，
+    pipeline自身的run-end推迟到意图处理完成后再发出"""
+    if run != device.events.run:
+        # 会话已被替换
+        device.events.publish(event, run=run)
+        return
+    event_type = getattr(event.type, "value", event.type)
+    if event_type == "run-end" and device.intent_task is not None:
+        return
+    device.events.publish(event, run=run)
+    if event_type == "stt-end":
+        text = ((getattr(event, "data", None) or {}).get("stt_output") or {}).get("text")
+        if text:
+            device.intent_task = hass.async_create_background_task(
+                async_bridge_intent(hass, device, text), f"{DOMAIN} intent {device.device_id}"
+            )
+
+async def async_bridge_intent(hass, device, text):
+    """以pipeline事件的形式处理意图阶段，intent-end后的回复合成沿用桥接TTS"""
+    runtime = device.runtime
+    device.events.send("intent-start", {
+        "engine": device.conversation_agent or "conversation",
+        "language": runtime.language,
+        "intent_input": text,
+        "conversation_id": device.conversation_id,
+        "device_id": device.device_id,
+    })
+    try:
+        intent_output = await async_process_text(hass, device, text, runtime)
+        device.events.send("intent-end", {"intent_output": intent_output})
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
-        _LOGGER.error("❌ Pipeline事件处理失败: %s", e)
+        _LOGGER.error("❌ 意图处理失败: %s (%s)", device.device_id, e)
+        device.events.send("error", {"code": "intent-failed", "message": str(e)})
+    finally:
+        if device.intent_task is asyncio.current_task():
+            device.intent_task = None
+    device.events.send("run-end")
+
+def cancel_bridged_intent(device):
+    """中止或开始新会话时取消进行中的桥接意图处理"""
+    task, device.intent_task = device.intent_task, None
+    if task is not None:
+        task.cancel()
+
+async def async_process_text(hass, device, text, runtime):
+    """处理一句文本命令，返回intent_output
 
-async def handle_listen(hass, ws, device, data, debug, config):
+    启用命令快速通道时先查缓存，命中则直接执行意图；否则交给对话代理，
+    并记录其成功执行的意图供下次使用。
+    """
+    fast_path = device.entry_data["intent_fast_path"]
+    context = Context()
+    if runtime.intent_fast_path:
+        cached = fast_path.lookup(runtime.language, text)
+        if cached is not None:
+            started = time.monotonic()
+            response = await fast_path.async_execute(
+                cached, runtime.language, text, context, device_id=device.device_id
+            )
+            if response is not None:
+                device.metrics.count(COUNTER_INTENT_HITS)
+                runtime.log.detail("⚡ 命令快速通道: %s -> %s (%.0fms)",
+                                   text, cached.intent_type, (time.monotonic() - started) * 1000)
+                return {"response": response.as_dict(), "conversation_id": device.conversation_id}
+        device.metrics.count(COUNTER_INTENT_MISSES)
+    
+    result = await conversation.async_converse(
+        hass,
+        text=text,
+        conversation_id=device.conversation_id,
+        context=context,
+        language=runtime.language,
+        agent_id=device.conversation_agent,
+        device_id=device.device_id,
+    )
+    if runtime.intent_fast_path:
+        fast_path.learn(runtime.language, text, result.response)
+    device.conversation_id = result.conversation_id
+    return result.as_dict()
+
+def _response_speech(intent_end_data):
+    """从intent-end事件数据中取出回复文本"""
+    response = (intent_end_data.get("intent_output") or {}).get("response") or {}
+    return ((response.get("speech") or {}).get("plain") or {}).get("speech")
+
+async def handle_listen(hass, ws, device, data, runtime):
     """处理旧版listen消息（向后兼容）"""
     state = data.get("state")
     
@@ -533,13 +1236,12 @@ async def handle_listen(hass, ws, device, data, debug, config):
             "input": {
                 "sample_rate": 16000
             }
-        }, debug, config)
+        }, runtime)
         
     elif state == "detect":
         # 唤醒词检测到，发送确认
         text = data.get("text", "")
-        if debug:
-            _LOGGER.info("🎯 唤醒词检测: %s", text)
+        runtime.log.info("🎯 唤醒词检测: %s (设备: %s)", text, device.device_id)
         await ws.send_json({
             "type": "listen",
             "state": "detected",
@@ -549,43 +1251,71 @@ async def handle_listen(hass, ws, device, data, debug, config):
     elif state == "stop":
         # 发送音频结束标记
         if device.pipeline_handler_id:
-            await ws.send_bytes(bytes([device.pipeline_handler_id]))
+            await ws.send_bytes(end_marker(device.pipeline_handler_id))
 
-async def handle_abort(hass, ws, device, data, debug):
-    """处理中止消息"""
-    if device.current_pipeline:
-        await device.current_pipeline.abort()
-        device.current_pipeline = None
-        device.pipeline_handler_id = None
+async def handle_abort(hass, ws, device, data, runtime):
+    """处理中止消息：先停止播放，再取消尚未完成的启动并中止pipeline"""
+    started = time.monotonic()
+    device.tts.cancel()
+    # 排队中的pipeline启动/listen start不再执行，否则会在abort之后重新开始会话
+    cancelled = device.lane.cancel_starts()
+    await abort_pipeline(device)
     
     device.set_status(DEVICE_STATUS_CONNECTED)
     await ws.send_json({"type": "abort", "message": "会话已中止"})
-    if debug:
-        _LOGGER.info("⏹️ 会话中止: %s", device.device_id)
+    device.metrics.observe(STAGE_ABORT, time.monotonic() - started)
+    runtime.log.info("⏹️ 会话中止: %s%s", device.device_id,
+                     f" (取消{cancelled}个待启动的会话)" if cancelled else "")
+
+async def handle_ping(hass, ws, device, data, runtime):
+    """处理应用层ping"""
+    await ws.send_json({"type": "pong"})
 
-async def handle_iot_control(hass, ws, device, data, debug):
-    """处理IoT设备控制"""
+async def handle_iot_control(hass, ws, device, data, runtime):
+    """处理IoT设备控制
+    
+    支持单条（command + entity_id）和批量（actions列表）两种形式；目标可用
+    entity_id、名称、区域或楼层指定。相同服务与参数的动作合并为一次服务调用，
+    不同的调用并发执行，最后只回复一条汇总结果。
+    """
+    log = runtime.log
     try:
-        command = data.get("command", "")
-        entity_id = data.get("entity_id", "")
+        actions = data.get("actions")
+        if not isinstance(actions, list):
+            actions = [data]
         
-        if debug:
-            _LOGGER.info("🏠 IoT控制请求: %s -> %s", command, entity_id)
+        resolver = device.entry_data["entity_resolver"]
+        groups, unresolved = group_iot_actions(actions, resolver)
+        log.info("🏠 IoT控制请求: %s (%d个动作, 合并为%d次调用)",
+                 device.device_id, len(actions), len(groups))
         
-        # 调用HA服务
-        domain, service = command.split(".", 1) if "." in command else ("homeassistant", command)
-        service_data = {"entity_id": entity_id}
+        results = await asyncio.gather(*(
+            _async_call_iot_group(hass, domain, service, service_data, entity_ids)
+            for (domain, service, service_data), entity_ids in groups.items()
+        ))
+        failed = sum(1 for result in results if result["status"] != "success")
         
-        await hass.services.async_call(domain, service, service_data)
-        
-        await ws.send_json({
-            "type": "iot_control", 
-            "status": "success",
-            "message": f"已执行: {command}"
-        })
+        if failed == len(results):
+            status = "error"
+        elif failed or unresolved:
+            status = "partial"
+        else:
+            status = "success"
+        response = {
+            "type": "iot_control",
+            "status": status,
+            "results": results,
+        }
+        if unresolved:
+            response["unresolved"] = unresolved
+        if not results:
+            response["message"] = "未找到要控制的实体"
+        elif len(results) == 1:
+            result = results[0]
+            response["message"] = f"已执行: {result['command']}" if status == "success" else result.get("message")
+        await ws.send_json(response)
         
-        if debug:
-            _LOGGER.info("✅ IoT控制成功: %s", command)
+        log.detail("✅ IoT控制完成: %s (%s, 失败%d)", device.device_id, status, failed)
             
     except Exception as e:
         _LOGGER.error("❌ IoT控制失败: %s", e)
@@ -593,4 +1323,25 @@ async def handle_iot_control(hass, ws, device, data, debug):
             "type": "iot_control", 
             "status": "error",
             "message": str(e)
-        }) 
\ No newline at end of file
+        })
+
+def is_session_start(data):
+    """消息是否开始新的会话（abort时取消尚未执行的会话启动）"""
+    return data.get("type") == "assist_pipeline/run" or data.get("state") == "start"
+
+# 消息分发表：hello/abort/ping在接收循环中立即执行；pipeline启动、listen与
+# IoT状态在每设备串行通道中按序执行；IoT控制并发执行并限制数量
+MESSAGE_ROUTER = MessageRouter()
+MESSAGE_ROUTER.use(error_middleware)
+MESSAGE_ROUTER.use(concurrency_middleware)
+MESSAGE_ROUTER.use(timing_middleware)
+MESSAGE_ROUTER.register("hello", handle_hello, MODE_INLINE)
+MESSAGE_ROUTER.register("abort", handle_abort, MODE_INLINE)
+MESSAGE_ROUTER.register("ping", handle_ping, MODE_INLINE)
+MESSAGE_ROUTER.register("iot", handle_iot_message, MODE_ORDERED)
+# Home Assistant Assist Pipeline 兼容协议
+MESSAGE_ROUTER.register("assist_pipeline/run", handle_assist_pipeline, MODE_ORDERED,
+                        starts_session=is_session_start)
+MESSAGE_ROUTER.register("listen", handle_listen, MODE_ORDERED, starts_session=is_session_start)
+# 扩展：IoT设备控制
+MESSAGE_ROUTER.register("iot_control", handle_iot_control, MODE_CONCURRENT, limit=IOT_CONTROL_CONCURRENCY)
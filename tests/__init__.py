@@ -0,0 +1 @@
+"""小智HA桥接测试"""
@@ -0,0 +1,44 @@
+"""测试共用的设备替身
+
+未安装Home Assistant时使用benchmarks/_ha_stubs中的桩模块，只依赖aiohttp与
+voluptuous即可运行；安装了HA（如pytest-homeassistant-custom-component）时使用真实模块。
+"""
+import os
+import sys
+import uuid
+
+import pytest
+
+try:
+    import homeassistant  # noqa: F401
+except ImportError:
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+    import _ha_stubs
+
+    _ha_stubs.install()
+
+from custom_components.xiaozhi_ha_bridge.const import DEVICE_STATUS_CONNECTED
+
+
+class FakeDevice:
+    """只包含注册表、准入控制和心跳用到的属性"""
+
+    def __init__(self, device_id, client_id=None):
+        self.device_id = device_id
+        self.client_id = client_id or f"client-{device_id}"
+        self.session_id = str(uuid.uuid4())
+        self.status = DEVICE_STATUS_CONNECTED
+        self.registry = None
+
+    def set_status(self, status):
+        old_status, self.status = self.status, status
+        if self.registry is not None:
+            self.registry.status_changed(self, old_status, status)
+
+    def __repr__(self):
+        return f"FakeDevice({self.device_id})"
+
+
+@pytest.fixture
+def make_device():
+    return FakeDevice
@@ -0,0 +1,145 @@
+"""Pipeline准入控制测试"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from custom_components.xiaozhi_ha_bridge.admission import (
+    AdmissionController,
+    AdmissionRejected,
+    REJECT_EVICTED,
+    REJECT_QUEUE_FULL,
+    REJECT_TIMEOUT,
+)
+
+
+def _controller(slots=1, queue_size=8, timeout=5):
+    runtime = SimpleNamespace(
+        pipeline_slots=slots, admission_queue_size=queue_size, admission_timeout=timeout
+    )
+    entry_data = {"runtime": runtime}
+    return AdmissionController(entry_data), entry_data
+
+
+async def _settle():
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+def test_grants_slots_then_queues_in_arrival_order(make_device):
+    async def run():
+        controller, _ = _controller(slots=1)
+        first = await controller.acquire(make_device("a"))
+        second = asyncio.create_task(controller.acquire(make_device("b")))
+        third = asyncio.create_task(controller.acquire(make_device("c")))
+        await _settle()
+        assert controller.stats()["waiting"] == 2
+        assert not second.done()
+
+        controller.release(first)
+        await _settle()
+        assert second.done() and not third.done()
+        controller.release(second.result())
+        await _settle()
+        assert third.done()
+        assert controller.stats()["active"] == 1
+
+    asyncio.run(run())
+
+
+def test_higher_priority_is_admitted_first(make_device):
+    async def run():
+        controller, _ = _controller(slots=1)
+        first = await controller.acquire(make_device("a"))
+        low = asyncio.create_task(controller.acquire(make_device("low"), priority=0))
+        await _settle()
+        high = asyncio.create_task(controller.acquire(make_device("high"), priority=10))
+        await _settle()
+
+        controller.release(first)
+        await _settle()
+        assert high.done() and not low.done()
+        low.cancel()
+
+    asyncio.run(run())
+
+
+def test_full_queue_rejects_or_evicts_by_priority(make_device):
+    async def run():
+        controller, _ = _controller(slots=1, queue_size=1)
+        await controller.acquire(make_device("a"))
+        queued = asyncio.create_task(controller.acquire(make_device("b"), priority=1))
+        await _settle()
+
+        # 不高于队尾优先级的新请求直接拒绝
+        with pytest.raises(AdmissionRejected) as err:
+            await controller.acquire(make_device("c"), priority=1)
+        assert err.value.reason == REJECT_QUEUE_FULL
+
+        # 更高优先级的请求挤出队尾
+        evictor = asyncio.create_task(controller.acquire(make_device("d"), priority=5))
+        await _settle()
+        with pytest.raises(AdmissionRejected) as err:
+            await queued
+        assert err.value.reason == REJECT_EVICTED
+        assert controller.stats()["evicted"] == 1
+        assert controller.stats()["waiting"] == 1
+        evictor.cancel()
+
+    asyncio.run(run())
+
+
+def test_queue_timeout_withdraws_the_request(make_device):
+    async def run():
+        controller, _ = _controller(slots=1, timeout=0.05)
+        await controller.acquire(make_device("a"))
+        with pytest.raises(AdmissionRejected) as err:
+            await controller.acquire(make_device("b"))
+        assert err.value.reason == REJECT_TIMEOUT
+        assert controller.stats()["waiting"] == 0
+        assert controller.stats()["timeouts"] == 1
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_leaves_the_queue(make_device):
+    async def run():
+        controller, _ = _controller(slots=1)
+        await controller.acquire(make_device("a"))
+        waiter = asyncio.create_task(controller.acquire(make_device("b")))
+        await _settle()
+        waiter.cancel()
+        await _settle()
+        assert controller.stats()["waiting"] == 0
+
+    asyncio.run(run())
+
+
+def test_pump_admits_waiters_after_slots_increase(make_device):
+    async def run():
+        controller, entry_data = _controller(slots=1)
+        await controller.acquire(make_device("a"))
+        waiters = [asyncio.create_task(controller.acquire(make_device(f"w{i}"))) for i in range(2)]
+        await _settle()
+
+        entry_data["runtime"] = SimpleNamespace(
+            pipeline_slots=3, admission_queue_size=8, admission_timeout=5
+        )
+        controller.pump()
+        await _settle()
+        assert all(waiter.done() for waiter in waiters)
+        assert controller.stats()["active"] == 3
+
+    asyncio.run(run())
+
+
+def test_zero_slots_means_unlimited(make_device):
+    async def run():
+        controller, _ = _controller(slots=0)
+        tickets = [await controller.acquire(make_device(f"d{i}")) for i in range(20)]
+        assert controller.stats()["active"] == 20
+        for ticket in tickets:
+            controller.release(ticket)
+        assert controller.stats()["active"] == 0
+
+    asyncio.run(run())
@@ -0,0 +1,91 @@
+"""每设备音频队列测试"""
+import asyncio
+
+import pytest
+
+from custom_components.xiaozhi_ha_bridge.audio_queue import (
+    AudioIngressQueue,
+    AudioQueueOverflow,
+    END_OF_STREAM,
+)
+from custom_components.xiaozhi_ha_bridge.const import (
+    AUDIO_OVERFLOW_ABORT,
+    AUDIO_OVERFLOW_BLOCK,
+    AUDIO_OVERFLOW_DROP_OLDEST,
+)
+
+
+def test_drop_oldest_keeps_the_newest_frames():
+    async def run():
+        queue = AudioIngressQueue(2, AUDIO_OVERFLOW_DROP_OLDEST)
+        for frame in (b"1", b"2", b"3"):
+            await queue.put(frame)
+        assert queue.stats()["dropped"] == 1
+        assert await queue.get() == b"2"
+        assert await queue.get() == b"3"
+
+    asyncio.run(run())
+
+
+def test_end_of_stream_is_never_dropped():
+    async def run():
+        queue = AudioIngressQueue(1, AUDIO_OVERFLOW_DROP_OLDEST)
+        await queue.put(b"1")
+        # 结束标记不受容量限制
+        await queue.put(END_OF_STREAM)
+        assert queue.depth == 2
+        # 队首是结束标记时丢弃新帧而不是结束标记
+        await queue.get()
+        await queue.put(b"2")
+        assert await queue.get() is END_OF_STREAM
+
+    asyncio.run(run())
+
+
+def test_abort_policy_raises_on_overflow():
+    async def run():
+        queue = AudioIngressQueue(1, AUDIO_OVERFLOW_ABORT)
+        await queue.put(b"1")
+        with pytest.raises(AudioQueueOverflow):
+            await queue.put(b"2")
+        assert queue.stats()["overflows"] == 1
+
+    asyncio.run(run())
+
+
+def test_block_policy_waits_for_the_consumer():
+    async def run():
+        queue = AudioIngressQueue(1, AUDIO_OVERFLOW_BLOCK)
+        await queue.put(b"1")
+        producer = asyncio.create_task(queue.put(b"2"))
+        await asyncio.sleep(0)
+        assert not producer.done()
+        assert await queue.get() == b"1"
+        await asyncio.wait_for(producer, 1)
+        assert await queue.get() == b"2"
+
+    asyncio.run(run())
+
+
+def test_get_batch_stops_at_end_of_stream():
+    async def run():
+        queue = AudioIngressQueue(10)
+        for item in (b"1", b"2", END_OF_STREAM, b"3"):
+            await queue.put(item)
+        assert await queue.get_batch(8) == [b"1", b"2"]
+        assert await queue.get_batch(8) == [END_OF_STREAM]
+        assert await queue.get_batch(8) == [b"3"]
+
+    asyncio.run(run())
+
+
+def test_configure_applies_new_capacity():
+    async def run():
+        queue = AudioIngressQueue(1, AUDIO_OVERFLOW_ABORT)
+        queue.configure(3, AUDIO_OVERFLOW_DROP_OLDEST)
+        for frame in (b"1", b"2", b"3", b"4"):
+            await queue.put(frame)
+        assert queue.depth == 3
+        assert queue.stats()["dropped"] == 1
+
+    asyncio.run(run())
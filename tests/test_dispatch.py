@@ -0,0 +1,53 @@
+"""每设备消息通道测试"""
+import asyncio
+
+from custom_components.xiaozhi_ha_bridge.dispatch import DeviceLane
+
+
+class _Hass:
+    def async_create_background_task(self, target, name, eager_start=False):
+        return asyncio.get_running_loop().create_task(target, name=name)
+
+
+def test_ordered_messages_run_in_arrival_order():
+    async def run():
+        hass = _Hass()
+        lane = DeviceLane()
+        order = []
+
+        async def handle(name, delay):
+            await asyncio.sleep(delay)
+            order.append(name)
+
+        lane.run_ordered(hass, lambda: handle("slow", 0.02), "slow")
+        last = lane.run_ordered(hass, lambda: handle("fast", 0), "fast")
+        await last
+        assert order == ["slow", "fast"]
+
+    asyncio.run(run())
+
+
+def test_cancel_starts_keeps_other_queued_messages():
+    async def run():
+        hass = _Hass()
+        lane = DeviceLane()
+        release = asyncio.Event()
+        handled = []
+
+        async def handle(name):
+            await release.wait()
+            handled.append(name)
+
+        lane.run_ordered(hass, lambda: handle("iot-1"), "iot-1")
+        start = lane.run_ordered(hass, lambda: handle("run"), "run", starts_session=True)
+        last = lane.run_ordered(hass, lambda: handle("iot-2"), "iot-2")
+        await asyncio.sleep(0)
+
+        assert lane.cancel_starts() == 1
+        release.set()
+        await last
+        assert start.cancelled()
+        assert handled == ["iot-1", "iot-2"]
+        assert lane.cancel_starts() == 0
+
+    asyncio.run(run())
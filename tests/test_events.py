@@ -0,0 +1,61 @@
+"""pipeline事件合并与会话归属测试"""
+from types import SimpleNamespace
+
+from custom_components.xiaozhi_ha_bridge.events import PipelineEventDispatcher, coalesce
+
+
+def _message(event_type, **data):
+    return {"type": event_type, "data": data}
+
+
+def _delta(content):
+    return _message("intent-progress", chat_log_delta={"content": content})
+
+
+def test_text_deltas_are_merged():
+    merged = coalesce([_delta("打开"), _delta("客厅"), _message("intent-end"), _delta("灯")])
+    assert [m["type"] for m in merged] == ["intent-progress", "intent-end", "intent-progress"]
+    assert merged[0]["data"]["chat_log_delta"]["content"] == "打开客厅"
+
+
+def test_non_text_deltas_are_kept():
+    tool_call = _message("intent-progress", chat_log_delta={"tool_calls": []})
+    assert coalesce([_delta("a"), tool_call, _delta("b")]) == [_delta("a"), tool_call, _delta("b")]
+
+
+def test_vad_pauses_within_a_batch_are_collapsed():
+    messages = [
+        _message("stt-vad-start", timestamp=100),
+        _message("stt-vad-end", timestamp=400),
+        _message("stt-vad-start", timestamp=500),
+        _message("stt-vad-end", timestamp=900),
+    ]
+    merged = coalesce(messages)
+    assert [(m["type"], m["data"]["timestamp"]) for m in merged] == [
+        ("stt-vad-start", 100),
+        ("stt-vad-end", 900),
+    ]
+
+
+def test_vad_pairs_separated_by_other_events_are_kept():
+    messages = [_message("stt-vad-end"), _message("stt-end"), _message("stt-vad-start")]
+    assert coalesce(messages) == messages
+
+
+def _event(event_type):
+    return SimpleNamespace(type=event_type, data={})
+
+
+def test_new_run_drops_events_of_the_replaced_run():
+    dispatcher = PipelineEventDispatcher(SimpleNamespace(device_id="d1"))
+    first = dispatcher.begin_run()
+    dispatcher.publish(_event("stt-start"), run=first)
+    assert dispatcher.depth == 1
+
+    second = dispatcher.begin_run()
+    assert dispatcher.depth == 0
+    # 被替换的runner之后产生的run-end不再入队
+    dispatcher.publish(_event("run-end"), run=first)
+    dispatcher.publish(_event("stt-start"), run=second)
+    assert dispatcher.depth == 1
+    assert dispatcher.stats()["stale"] == 2
@@ -0,0 +1,181 @@
+"""心跳时间轮与空闲回收测试"""
+import time
+from types import SimpleNamespace
+
+from custom_components.xiaozhi_ha_bridge.heartbeat import (
+    HeartbeatMonitor,
+    IDLE_CHECK_SECONDS,
+    TimerWheel,
+)
+
+
+def _advance_until(wheel, item, limit):
+    """前进直到item到期，返回经过的刻度数"""
+    for ticks in range(1, limit + 1):
+        if item in wheel.advance():
+            return ticks
+    return None
+
+
+def test_wheel_expires_after_rounded_up_ticks():
+    wheel = TimerWheel(slots=8, tick=1.0)
+    wheel.schedule("a", 2.5)
+    assert _advance_until(wheel, "a", 10) == 3
+    assert len(wheel) == 0
+
+
+def test_wheel_counts_rounds_beyond_one_revolution():
+    wheel = TimerWheel(slots=8, tick=1.0)
+    wheel.schedule("a", 8)
+    wheel.schedule("b", 20)
+    assert _advance_until(wheel, "a", 30) == 8
+    assert _advance_until(wheel, "b", 30) == 12
+
+
+def test_wheel_zero_delay_waits_one_tick():
+    wheel = TimerWheel(slots=8, tick=1.0)
+    wheel.schedule("a", 0)
+    assert wheel.advance() == ["a"]
+
+
+def test_wheel_reschedule_and_cancel():
+    wheel = TimerWheel(slots=8, tick=1.0)
+    wheel.schedule("a", 1)
+    wheel.schedule("a", 5)
+    assert len(wheel) == 1
+    assert _advance_until(wheel, "a", 10) == 5
+
+    wheel.schedule("b", 1)
+    wheel.cancel("b")
+    wheel.cancel("b")
+    assert len(wheel) == 0
+    assert wheel.advance() == []
+
+
+class _Hass:
+    """只记录后台任务名称"""
+
+    def __init__(self):
+        self.tasks = []
+
+    def async_create_background_task(self, coro, name):
+        coro.close()
+        self.tasks.append(name)
+
+
+class _Devices:
+    def __init__(self, devices):
+        self._devices = devices
+
+    def values(self):
+        return list(self._devices)
+
+
+class _Device(SimpleNamespace):
+    """时间轮以设备对象为键，按身份哈希"""
+
+    __hash__ = object.__hash__
+
+
+def _device(**kwargs):
+    now = time.monotonic()
+    attrs = {
+        "device_id": "d1",
+        "ws": SimpleNamespace(closed=False),
+        "current_pipeline": None,
+        "stream_ended": False,
+        "last_audio": now,
+        "last_activity": now,
+        "ping_sent_at": None,
+    }
+    attrs.update(kwargs)
+    return _Device(**attrs)
+
+
+def _monitor(devices, heartbeat_interval, pipeline_idle_timeout=20):
+    hass = _Hass()
+    entry_data = {
+        "runtime": SimpleNamespace(
+            heartbeat_interval=heartbeat_interval, pipeline_idle_timeout=pipeline_idle_timeout
+        ),
+        "devices": _Devices(devices),
+    }
+    return HeartbeatMonitor(hass, entry_data), hass, entry_data
+
+
+def test_idle_pipeline_is_aborted_with_heartbeat_disabled():
+    device = _device(current_pipeline=object(), last_audio=time.monotonic() - 60)
+    monitor, hass, _ = _monitor([device], heartbeat_interval=0, pipeline_idle_timeout=20)
+    monitor.track(device)
+
+    monitor._check(device)
+    assert monitor.stats()["pipelines_aborted"] == 1
+    assert monitor.stats()["pings"] == 0
+    assert any("abort idle" in name for name in hass.tasks)
+    # 心跳关闭时设备仍留在时间轮上
+    assert monitor.stats()["tracked"] == 1
+
+
+def test_raising_the_interval_resumes_pings():
+    device = _device(last_activity=time.monotonic() - 60)
+    monitor, hass, entry_data = _monitor([device], heartbeat_interval=0)
+    monitor.track(device)
+    monitor._check(device)
+    assert monitor.stats()["pings"] == 0
+
+    entry_data["runtime"] = SimpleNamespace(heartbeat_interval=5, pipeline_idle_timeout=20)
+    monitor.reschedule()
+    assert monitor.stats()["tracked"] == 1
+    monitor._check(device)
+    assert monitor.stats()["pings"] == 1
+    assert device.ping_sent_at is not None
+
+
+def test_disabled_heartbeat_rechecks_at_idle_interval():
+    device = _device()
+    monitor, _, _ = _monitor([device], heartbeat_interval=0)
+    monitor.track(device)
+    for _ in range(IDLE_CHECK_SECONDS - 1):
+        assert device not in monitor._wheel.advance()
+    assert device in monitor._wheel.advance()
+
+
+def test_activity_after_ping_keeps_the_connection():
+    now = time.monotonic()
+    device = _device(ping_sent_at=now - 30, last_activity=now - 1)
+    monitor, hass, _ = _monitor([device], heartbeat_interval=5)
+    monitor.track(device)
+    device.ping_sent_at = now - 30
+
+    monitor._check(device)
+    assert monitor.stats()["reaped"] == 0
+    assert device.ping_sent_at is None
+    assert not any("reap" in name for name in hass.tasks)
+
+
+def test_silent_connection_after_ping_is_reaped():
+    now = time.monotonic()
+    async def close(**kwargs):
+        pass
+
+    device = _device(
+        last_activity=now - 60,
+        ws=SimpleNamespace(closed=False, close=close),
+        metrics=SimpleNamespace(count=lambda *args: None),
+    )
+    monitor, hass, _ = _monitor([device], heartbeat_interval=5)
+    monitor.track(device)
+    device.ping_sent_at = now - 30
+
+    monitor._check(device)
+    assert monitor.stats()["reaped"] == 1
+    assert any("reap" in name for name in hass.tasks)
+
+
+def test_run_waiting_on_intent_after_stt_end_is_not_aborted():
+    device = _device(current_pipeline=object(), stream_ended=True, last_audio=time.monotonic() - 60)
+    monitor, hass, _ = _monitor([device], heartbeat_interval=5, pipeline_idle_timeout=20)
+    monitor.track(device)
+
+    monitor._check(device)
+    assert monitor.stats()["pipelines_aborted"] == 0
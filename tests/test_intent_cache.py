@@ -0,0 +1,101 @@
+"""命令快速通道缓存测试"""
+import asyncio
+from types import SimpleNamespace
+
+from homeassistant.helpers import intent
+
+from custom_components.xiaozhi_ha_bridge.intent_cache import IntentFastPath, normalize_utterance
+
+
+def _response(intent_type="HassTurnOn", response_type=intent.IntentResponseType.ACTION_DONE,
+              failed_results=(), speech="已打开客厅灯"):
+    return SimpleNamespace(
+        intent=SimpleNamespace(
+            intent_type=intent_type,
+            slots={"name": {"value": "客厅灯", "text": "客厅灯"}},
+        ),
+        response_type=response_type,
+        failed_results=list(failed_results),
+        speech={"plain": {"speech": speech}} if speech else {},
+    )
+
+
+class _HandledResponse:
+    """intent.async_handle的结果：意图处理本身不生成回复"""
+
+    def __init__(self, response_type=intent.IntentResponseType.ACTION_DONE):
+        self.response_type = response_type
+        self.speech = {}
+
+    def async_set_speech(self, speech):
+        self.speech = {"plain": {"speech": speech}}
+
+
+def test_normalize_ignores_punctuation_space_and_case():
+    assert normalize_utterance(" 打开 客厅灯。") == normalize_utterance("打开客厅灯")
+    assert normalize_utterance("Turn ON the light!") == "turnonthelight"
+
+
+def test_learns_successful_intents_and_hits_on_repeat():
+    fast_path = IntentFastPath(hass=None)
+    assert fast_path.lookup("zh-CN", "打开客厅灯") is None
+    assert fast_path.learn("zh-CN", "打开客厅灯", _response())
+
+    cached = fast_path.lookup("zh-CN", "打开客厅灯！")
+    assert cached.intent_type == "HassTurnOn"
+    assert cached.slots == {"name": {"value": "客厅灯"}}
+    # 不同语言分开缓存
+    assert fast_path.lookup("en-US", "打开客厅灯") is None
+
+
+def test_failed_or_unresolved_responses_are_not_learned():
+    fast_path = IntentFastPath(hass=None)
+    assert not fast_path.learn("zh-CN", "a", _response(response_type=intent.IntentResponseType.ERROR))
+    # 查询类回复随状态变化，不记录
+    assert not fast_path.learn("zh-CN", "d", _response(response_type=intent.IntentResponseType.QUERY_ANSWER))
+    assert not fast_path.learn("zh-CN", "b", _response(failed_results=[object()]))
+    assert not fast_path.learn("zh-CN", "c", SimpleNamespace(intent=None))
+    assert not fast_path.learn("zh-CN", "。", _response())
+    assert fast_path.stats()["entries"] == 0
+
+
+def test_lru_eviction_and_invalidation():
+    fast_path = IntentFastPath(hass=None, maxsize=2)
+    fast_path.learn("zh-CN", "一", _response())
+    fast_path.learn("zh-CN", "二", _response())
+    fast_path.lookup("zh-CN", "一")
+    fast_path.learn("zh-CN", "三", _response())
+    assert fast_path.lookup("zh-CN", "二") is None
+    assert fast_path.lookup("zh-CN", "一") is not None
+
+    fast_path.invalidate()
+    assert fast_path.stats()["entries"] == 0
+    assert fast_path.stats()["invalidations"] == 1
+
+
+def test_replay_uses_the_agents_speech(monkeypatch):
+    async def handle(hass, platform, intent_type, slots, **kwargs):
+        return _HandledResponse()
+
+    monkeypatch.setattr(intent, "async_handle", handle, raising=False)
+    fast_path = IntentFastPath(hass=None)
+    fast_path.learn("zh-CN", "打开客厅灯", _response())
+    cached = fast_path.lookup("zh-CN", "打开客厅灯")
+
+    response = asyncio.run(fast_path.async_execute(cached, "zh-CN", "打开客厅灯", None, device_id="d1"))
+    assert response.speech["plain"]["speech"] == "已打开客厅灯"
+    assert fast_path.stats()["hits"] == 1
+
+
+def test_any_execution_error_falls_back_and_forgets(monkeypatch):
+    async def handle(hass, platform, intent_type, slots, **kwargs):
+        raise TypeError("unexpected keyword argument 'device_id'")
+
+    monkeypatch.setattr(intent, "async_handle", handle, raising=False)
+    fast_path = IntentFastPath(hass=None)
+    fast_path.learn("zh-CN", "打开客厅灯", _response())
+    cached = fast_path.lookup("zh-CN", "打开客厅灯")
+
+    assert asyncio.run(fast_path.async_execute(cached, "zh-CN", "打开客厅灯", None)) is None
+    assert fast_path.stats()["failures"] == 1
+    assert fast_path.lookup("zh-CN", "打开客厅灯") is None
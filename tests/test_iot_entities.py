@@ -0,0 +1,42 @@
+"""IoT实体管理测试"""
+from types import SimpleNamespace
+
+from custom_components.xiaozhi_ha_bridge.iot_entities import IotEntityManager
+from custom_components.xiaozhi_ha_bridge.registry import DeviceRegistry
+
+DESCRIPTORS = [{
+    "name": "Speaker",
+    "description": "扬声器",
+    "properties": {"volume": {"type": "number"}, "mute": {"type": "boolean"}},
+}]
+
+
+def _device(device_id, anonymous=False):
+    return SimpleNamespace(
+        device_id=device_id,
+        anonymous=anonymous,
+        iot=SimpleNamespace(descriptors=DESCRIPTORS),
+    )
+
+
+def _manager():
+    manager = IotEntityManager(SimpleNamespace(entry_id="e1"), DeviceRegistry())
+    added = []
+    manager.register_platform(
+        "sensor", added.extend, lambda manager, device_id, name, description, prop, spec: (device_id, prop)
+    )
+    return manager, added
+
+
+def test_creates_one_entity_per_property_once():
+    manager, added = _manager()
+    manager._add_entities(_device("d1"), ("sensor",))
+    manager._add_entities(_device("d1"), ("sensor",))
+    assert sorted(added) == [("d1", "mute"), ("d1", "volume")]
+
+
+def test_anonymous_devices_get_no_entities():
+    manager, added = _manager()
+    manager._add_entities(_device("unknown-c1", anonymous=True), ("sensor",))
+    assert added == []
+    assert manager.stats()["entities"] == 0
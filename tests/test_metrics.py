@@ -0,0 +1,38 @@
+"""指标输出测试"""
+from custom_components.xiaozhi_ha_bridge.metrics import EntryMetrics, render_prometheus
+
+
+def _samples(text, name):
+    return [line for line in text.splitlines() if line.startswith(name)]
+
+
+def test_component_stats_are_rendered_as_gauges():
+    stats = [
+        ("pipelines", {"entry": "e1"}, {
+            "warmups": 2,
+            "run_start_cold": {"count": 1, "avg_ms": 12.5, "max_ms": None},
+        }),
+        ("pipelines", {"entry": "e2"}, {"warmups": 0, "run_start_cold": {"count": 0}}),
+        ("queue", {}, {"active": True, "policy": "drop_oldest"}),
+    ]
+    text = render_prometheus({"e1": EntryMetrics()}, stats)
+
+    assert text.count("# TYPE xiaozhi_pipelines_warmups gauge") == 1
+    assert _samples(text, "xiaozhi_pipelines_warmups") == [
+        'xiaozhi_pipelines_warmups{entry="e1"} 2',
+        'xiaozhi_pipelines_warmups{entry="e2"} 0',
+    ]
+    assert 'xiaozhi_pipelines_run_start_cold_avg_ms{entry="e1"} 12.5' in text
+    # None与字符串不输出，布尔为0/1，没有标签时不带花括号
+    assert not _samples(text, "xiaozhi_pipelines_run_start_cold_max_ms")
+    assert not _samples(text, "xiaozhi_queue_policy")
+    assert "xiaozhi_queue_active 1" in text.splitlines()
+
+
+def test_stage_histograms_are_still_rendered_first():
+    text = render_prometheus({"e1": EntryMetrics()}, [("pipelines", {"entry": "e1"}, {"warmups": 1})])
+    lines = text.splitlines()
+    assert lines[0].startswith("# HELP xiaozhi_entry_stage_seconds")
+    assert lines.index("# TYPE xiaozhi_pipelines_warmups gauge") > lines.index(
+        "# TYPE xiaozhi_device_stage_seconds histogram"
+    )
@@ -0,0 +1,45 @@
+"""预录音频环形缓冲测试"""
+from custom_components.xiaozhi_ha_bridge.preroll import (
+    FRAME_DURATION_MS,
+    OPUS_MAX_PACKET,
+    PrerollBuffer,
+    preroll_frames,
+)
+
+
+def test_frame_count_rounds_up():
+    assert preroll_frames(0) == 0
+    assert preroll_frames(FRAME_DURATION_MS) == 1
+    assert preroll_frames(FRAME_DURATION_MS + 1) == 2
+
+
+def test_drain_returns_recent_frames_in_order_after_wraparound():
+    buffer = PrerollBuffer(3)
+    for i in range(5):
+        buffer.push(bytes([i]) * (i + 1), now=float(i))
+    assert buffer.stats()["overwritten"] == 2
+    assert buffer.drain(since=0.0) == [b"\x02" * 3, b"\x03" * 4, b"\x04" * 5]
+    assert len(buffer) == 0
+
+
+def test_drain_skips_frames_older_than_since():
+    buffer = PrerollBuffer(4)
+    for i in range(4):
+        buffer.push(bytes([i]), now=float(i))
+    assert buffer.drain(since=2.0) == [b"\x02", b"\x03"]
+    assert buffer.drain(since=0.0) == []
+
+
+def test_push_copies_the_payload():
+    buffer = PrerollBuffer(2)
+    payload = bytearray(b"abc")
+    buffer.push(memoryview(payload), now=1.0)
+    payload[0] = ord("x")
+    assert buffer.drain(since=0.0) == [b"abc"]
+
+
+def test_oversized_frames_are_ignored():
+    buffer = PrerollBuffer(2)
+    buffer.push(bytes(OPUS_MAX_PACKET + 1), now=1.0)
+    assert len(buffer) == 0
+    assert buffer.stats()["oversized"] == 1
@@ -0,0 +1,95 @@
+"""设备注册表测试"""
+import pytest
+
+from custom_components.xiaozhi_ha_bridge.const import (
+    DEVICE_STATUS_CONNECTED,
+    DEVICE_STATUS_LISTENING,
+    DUPLICATE_POLICY_REJECT,
+    DUPLICATE_POLICY_REPLACE,
+)
+from custom_components.xiaozhi_ha_bridge.registry import DeviceRegistry, DuplicateDevice
+
+
+def test_indexes_by_device_client_and_session(make_device):
+    registry = DeviceRegistry()
+    device = make_device("d1")
+    assert registry.add(device, DUPLICATE_POLICY_REPLACE) is None
+    assert registry.get("d1") is device
+    assert registry.get_by_client_id(device.client_id) is device
+    assert registry.get_by_session_id(device.session_id) is device
+    assert "d1" in registry and len(registry) == 1
+
+
+def test_replace_keeps_the_new_connection(make_device):
+    registry = DeviceRegistry()
+    old = make_device("d1", client_id="c-old")
+    new = make_device("d1", client_id="c-new")
+    registry.add(old, DUPLICATE_POLICY_REPLACE)
+    assert registry.add(new, DUPLICATE_POLICY_REPLACE) is old
+    # 旧连接清理时不影响新连接
+    registry.remove(old)
+    assert registry.get("d1") is new
+    assert registry.get_by_client_id("c-old") is None
+    assert registry.stats()["replaced"] == 1
+
+
+def test_reject_policy_raises(make_device):
+    registry = DeviceRegistry()
+    registry.add(make_device("d1"), DUPLICATE_POLICY_REJECT)
+    with pytest.raises(DuplicateDevice):
+        registry.add(make_device("d1"), DUPLICATE_POLICY_REJECT)
+    assert registry.stats()["rejected"] == 1
+
+
+def test_status_index_follows_changes(make_device):
+    registry = DeviceRegistry()
+    device = make_device("d1")
+    registry.add(device, DUPLICATE_POLICY_REPLACE)
+    device.set_status(DEVICE_STATUS_LISTENING)
+    assert registry.with_status(DEVICE_STATUS_LISTENING) == [device]
+    assert registry.with_status(DEVICE_STATUS_CONNECTED) == []
+
+
+def test_park_and_resume(make_device):
+    registry = DeviceRegistry()
+    device = make_device("d1")
+    registry.add(device, DUPLICATE_POLICY_REPLACE)
+
+    assert registry.park(device) is None
+    assert "d1" not in registry
+    assert registry.parked() == [device]
+    assert registry.parked_for("d1") is device
+
+    # session_id必须属于同一device_id
+    assert registry.take_parked(device.session_id, "other") is None
+    assert registry.take_parked("unknown", "d1") is None
+    assert registry.take_parked(device.session_id, "d1") is device
+    assert registry.parked() == []
+    assert registry.parked_for("d1") is None
+    assert registry.stats()["resumed"] == 1
+
+
+def test_parking_again_returns_the_stale_session(make_device):
+    registry = DeviceRegistry()
+    first = make_device("d1")
+    second = make_device("d1")
+    registry.add(first, DUPLICATE_POLICY_REPLACE)
+    registry.park(first)
+    registry.add(second, DUPLICATE_POLICY_REPLACE)
+
+    assert registry.park(second) is first
+    assert registry.parked() == [second]
+    assert registry.take_parked(first.session_id, "d1") is None
+
+
+def test_unpark_only_removes_the_same_object(make_device):
+    registry = DeviceRegistry()
+    first = make_device("d1")
+    second = make_device("d1")
+    registry.add(first, DUPLICATE_POLICY_REPLACE)
+    registry.park(first)
+    registry.add(second, DUPLICATE_POLICY_REPLACE)
+    registry.park(second)
+
+    registry.unpark(first)
+    assert registry.parked_for("d1") is second
@@ -0,0 +1,60 @@
+"""多条目连接路由测试"""
+from custom_components.xiaozhi_ha_bridge.const import (
+    CONF_ALLOWED_TOKENS,
+    CONF_DEVICE_ID_PREFIXES,
+    CONF_REQUIRE_TOKEN,
+)
+from custom_components.xiaozhi_ha_bridge.routing import EntryRoutes, HEADER_ENTRY_ID
+from custom_components.xiaozhi_ha_bridge.runtime import build_runtime
+
+
+def _routes():
+    routes = EntryRoutes()
+    routes.add("a", build_runtime("a", {CONF_DEVICE_ID_PREFIXES: "bldg-"}))
+    routes.add("b", build_runtime("b", {
+        CONF_REQUIRE_TOKEN: True,
+        CONF_ALLOWED_TOKENS: ["token-b"],
+        CONF_DEVICE_ID_PREFIXES: "bldg-b-, lab",
+    }))
+    return routes
+
+
+def test_entry_id_header_wins():
+    routes = _routes()
+    headers = {HEADER_ENTRY_ID: "a", "Authorization": "Bearer token-b", "Device-Id": "bldg-b-1"}
+    assert routes.resolve(headers) == "a"
+    # 不存在的条目不生效，继续按令牌路由
+    headers[HEADER_ENTRY_ID] = "missing"
+    assert routes.resolve(headers) == "b"
+
+
+def test_token_routes_before_prefix():
+    routes = _routes()
+    assert routes.resolve({"Authorization": "Bearer token-b", "Device-Id": "bldg-1"}) == "b"
+    assert routes.resolve({"Authorization": "Bearer other", "Device-Id": "bldg-1"}) == "a"
+
+
+def test_longest_prefix_wins():
+    routes = _routes()
+    assert routes.resolve({"Device-Id": "bldg-b-7"}) == "b"
+    assert routes.resolve({"Device-Id": "bldg-c-7"}) == "a"
+    assert routes.resolve({"Device-Id": "lab-3"}) == "b"
+
+
+def test_default_is_the_earliest_remaining_entry():
+    routes = _routes()
+    assert routes.resolve({"Device-Id": "elsewhere"}) == "a"
+    routes.remove("a")
+    assert routes.resolve({"Device-Id": "elsewhere"}) == "b"
+    assert routes.resolve({"Device-Id": "bldg-1"}) == "b"
+    routes.remove("b")
+    assert routes.resolve({}) is None
+
+
+def test_update_replaces_rules():
+    routes = _routes()
+    routes.add("a", build_runtime("a", {CONF_DEVICE_ID_PREFIXES: "lab"}))
+    # 冲突的前缀按最早设置的条目路由
+    assert routes.resolve({"Device-Id": "lab-3"}) == "a"
+    assert routes.resolve({"Device-Id": "bldg-1"}) == "a"  # 默认条目
+    assert routes.stats()["entries"] == 2
@@ -0,0 +1,37 @@
+"""TTS缓存磁盘层测试"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from custom_components.xiaozhi_ha_bridge.tts_cache import TtsCache, cache_key
+
+
+class _Hass:
+    async def async_add_executor_job(self, target, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, target, *args)
+
+
+def test_disk_entries_survive_a_restart(tmp_path):
+    async def run():
+        key = cache_key("tts.piper", None, "zh-CN", "好的")
+        cache = TtsCache(_Hass(), str(tmp_path), memory_budget=1024, disk_budget=1024)
+        await cache.async_put(key, [b"ab", b"cde"])
+
+        restarted = TtsCache(_Hass(), str(tmp_path), memory_budget=1024, disk_budget=1024)
+        await restarted.async_load()
+        assert await restarted.async_get(key) == (b"ab", b"cde")
+        assert restarted.stats()["hits_disk"] == 1
+
+    asyncio.run(run())
+
+
+def test_concurrent_writes_of_one_entry_do_not_collide(tmp_path):
+    cache = TtsCache(_Hass(), str(tmp_path), memory_budget=0, disk_budget=1024)
+    name = "entry.opus"
+    frames = (b"x" * 40,) * 4
+    with ThreadPoolExecutor(8) as pool:
+        sizes = list(pool.map(lambda _: cache._write_file(name, frames), range(64)))
+
+    assert len(set(sizes)) == 1
+    assert os.listdir(tmp_path) == [name]
+    assert cache._read_file(name) == frames
@@ -0,0 +1,315 @@
+"""连接顶替与会话恢复测试"""
+import asyncio
+from types import SimpleNamespace
+
+from custom_components.xiaozhi_ha_bridge import tts_stream
+from custom_components.xiaozhi_ha_bridge.admission import AdmissionController
+from custom_components.xiaozhi_ha_bridge.const import (
+    CONF_SESSION_RESUME_SECONDS,
+    DOMAIN,
+    DUPLICATE_POLICY_REPLACE,
+)
+from custom_components.xiaozhi_ha_bridge.entity_resolver import EntityResolver
+from custom_components.xiaozhi_ha_bridge.heartbeat import HeartbeatMonitor
+from custom_components.xiaozhi_ha_bridge.intent_cache import IntentFastPath
+from custom_components.xiaozhi_ha_bridge.iot import DescriptorPool, DeviceIot
+from custom_components.xiaozhi_ha_bridge.iot_entities import IotEntityManager
+from custom_components.xiaozhi_ha_bridge.metrics import EntryMetrics
+from custom_components.xiaozhi_ha_bridge.preroll import PrerollBuffer
+from custom_components.xiaozhi_ha_bridge.registry import DeviceRegistry
+from custom_components.xiaozhi_ha_bridge.routing import DATA_ROUTES, EntryRoutes
+from custom_components.xiaozhi_ha_bridge.runtime import build_runtime
+from custom_components.xiaozhi_ha_bridge.tts_cache import TtsCache
+from custom_components.xiaozhi_ha_bridge.tts_stream import TtsStreamer
+from custom_components.xiaozhi_ha_bridge.websocket_api import (
+    MESSAGE_ROUTER,
+    XiaozhiDevice,
+    apply_pipeline_event,
+    async_disconnected,
+    collect_stats,
+    handle_binary_audio,
+    handle_hello,
+    supersede_device,
+)
+
+
+class _Hass:
+    def __init__(self):
+        self.data = {}
+
+    def async_create_background_task(self, target, name, eager_start=False):
+        return asyncio.get_running_loop().create_task(target, name=name)
+
+
+class _Socket:
+    """WebSocket替身；half_open时关闭握手永远等不到回应（服务端尚未察觉的断开）"""
+
+    def __init__(self, half_open=False):
+        self.half_open = half_open
+        self.closed = False
+        self.close_started = False
+        self.sent = []
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+    async def close(self, code=None, message=b""):
+        self.close_started = True
+        if self.half_open:
+            await asyncio.Event().wait()
+        self.closed = True
+
+
+class _Pipelines:
+    def prewarm(self, pipeline_id, tts_engine=None):
+        return None
+
+    def stats(self):
+        return {"pipelines": 0, "warmups": 0}
+
+
+def _entry(hass, **options):
+    entry_data = {
+        "runtime": build_runtime("e1", options),
+        "devices": DeviceRegistry(),
+        "metrics": EntryMetrics(),
+        "iot_descriptors": DescriptorPool(),
+        "iot_entities": None,
+        "pipelines": _Pipelines(),
+        "entity_resolver": EntityResolver(hass),
+        "intent_fast_path": IntentFastPath(hass),
+    }
+    entry_data["heartbeat"] = HeartbeatMonitor(hass, entry_data)
+    entry_data["admission"] = AdmissionController(entry_data)
+    hass.data[DOMAIN] = {"e1": entry_data}
+    return entry_data
+
+
+def _connect(hass, entry_data, ws, client_id):
+    """按ws_handler的顺序建立连接，同一device_id已在线时顶替旧连接"""
+    device = XiaozhiDevice("d1", client_id, ws, "e1")
+    device.entry_data = entry_data
+    device.tts = TtsStreamer(hass, device)
+    device.metrics = entry_data["metrics"].device("d1")
+    device.iot = DeviceIot(entry_data["iot_descriptors"])
+    devices = entry_data["devices"]
+    replaced = devices.add(device, DUPLICATE_POLICY_REPLACE)
+    if replaced is not None:
+        supersede_device(hass, replaced, devices)
+    return device
+
+
+def test_reconnect_while_old_socket_is_half_open_resumes_the_session():
+    async def run():
+        hass = _Hass()
+        entry_data = _entry(hass)
+        devices = entry_data["devices"]
+        old_ws = _Socket(half_open=True)
+        old = _connect(hass, entry_data, old_ws, "c-old")
+        old.conversation_id = "conv-1"
+
+        new_ws = _Socket()
+        new = _connect(hass, entry_data, new_ws, "c-new")
+        await asyncio.sleep(0)
+        # 旧连接在后台关闭，不阻塞新连接
+        assert old_ws.close_started and not old_ws.closed
+
+        resumed = await handle_hello(
+            hass, new_ws, new, {"type": "hello", "session_id": old.session_id}, entry_data["runtime"]
+        )
+        assert resumed is old
+        assert resumed.ws is new_ws
+        assert resumed.conversation_id == "conv-1"
+        assert devices.get("d1") is old
+        assert new_ws.sent[0]["resumed"] is True
+
+        # 旧连接的清理晚于恢复，不影响已接管的会话
+        await async_disconnected(hass, old, old_ws, entry_data)
+        assert devices.get("d1") is old
+
+        # 接管后的连接断开时照常保留会话
+        await async_disconnected(hass, old, new_ws, entry_data)
+        assert devices.parked() == [old]
+        old.resume_handle.cancel()
+
+    asyncio.run(run())
+
+
+def test_hello_without_session_releases_the_superseded_session():
+    async def run():
+        hass = _Hass()
+        entry_data = _entry(hass)
+        devices = entry_data["devices"]
+        old = _connect(hass, entry_data, _Socket(half_open=True), "c-old")
+        new_ws = _Socket()
+        new = _connect(hass, entry_data, new_ws, "c-new")
+        assert devices.parked() == [old]
+
+        assert await handle_hello(hass, new_ws, new, {"type": "hello"}, entry_data["runtime"]) is new
+        assert devices.parked() == []
+        assert old.resume_handle is None
+        assert devices.get("d1") is new
+        assert "resumed" not in new_ws.sent[0]
+
+    asyncio.run(run())
+
+
+def test_superseded_session_is_released_when_resume_is_disabled():
+    async def run():
+        hass = _Hass()
+        entry_data = _entry(hass, **{CONF_SESSION_RESUME_SECONDS: 0})
+        devices = entry_data["devices"]
+        old_ws = _Socket(half_open=True)
+        old = _connect(hass, entry_data, old_ws, "c-old")
+        new = _connect(hass, entry_data, _Socket(), "c-new")
+        await asyncio.sleep(0)
+
+        assert devices.parked() == []
+        assert devices.get("d1") is new
+        assert old.registry is None
+        # 旧连接的清理不再重复释放，也不影响新连接
+        await async_disconnected(hass, old, old_ws, entry_data)
+        assert devices.get("d1") is new
+
+    asyncio.run(run())
+
+
+def test_audio_during_session_start_is_buffered_in_preroll():
+    async def run():
+        hass = _Hass()
+        entry_data = _entry(hass, preroll_ms=120)
+        device = _connect(hass, entry_data, _Socket(), "c1")
+        runtime = entry_data["runtime"]
+        starting = asyncio.Event()
+
+        async def start():
+            await starting.wait()
+
+        device.current_pipeline = object()  # 上一轮会话仍在进行
+        task = device.lane.run_ordered(hass, start, "start", starts_session=True)
+        for i in range(5):
+            await handle_binary_audio(hass, device.ws, device, bytes([1, i]), runtime)
+        await handle_binary_audio(hass, device.ws, device, b"\x00", runtime)
+
+        # 不为每帧创建任务，也不写入旧会话的音频队列；满时覆盖最旧的帧
+        assert device.audio_queue.depth == 0
+        assert len(device.preroll) == device.preroll.capacity == 2
+        assert device.preroll.overwritten == 3
+        assert device.end_pending
+        starting.set()
+        await task
+        assert not device.lane.starting
+
+    asyncio.run(run())
+
+
+class _HitCache:
+    """回复总是命中的TTS缓存"""
+
+    def cacheable(self, text):
+        return True
+
+    async def async_get(self, key):
+        return [b"opus"]
+
+
+def _intent_end(speech):
+    return {"type": "intent-end", "data": {"intent_output": {"response": {
+        "speech": {"plain": {"speech": speech}},
+    }}}}
+
+
+def test_bridged_reply_holds_the_slot_until_synthesis_ends(monkeypatch):
+    monkeypatch.setattr(tts_stream, "OPUS_AVAILABLE", True)
+
+    async def run():
+        hass = _Hass()
+        entry_data = _entry(hass, pipeline_slots=1)
+        entry_data["tts_cache"] = _HitCache()
+        device = _connect(hass, entry_data, _Socket(), "c1")
+        admission = entry_data["admission"]
+        device.admission = await admission.acquire(device)
+        device.bridge_tts = True
+
+        apply_pipeline_event(device, _intent_end("好的"))
+        # 名额转交给回复合成，run-end不再归还
+        assert device.admission is None
+        assert admission.stats()["active"] == 1
+        apply_pipeline_event(device, {"type": "run-end", "data": {}})
+        assert admission.stats()["active"] == 1
+
+        await asyncio.sleep(0.01)
+        assert admission.stats()["active"] == 0
+        assert b"opus" in device.ws.sent
+
+    asyncio.run(run())
+
+
+def test_bridged_reply_cancelled_before_start_releases_the_slot(monkeypatch):
+    monkeypatch.setattr(tts_stream, "OPUS_AVAILABLE", True)
+
+    async def run():
+        hass = _Hass()
+        entry_data = _entry(hass, pipeline_slots=1)
+        entry_data["tts_cache"] = _HitCache()
+        device = _connect(hass, entry_data, _Socket(), "c1")
+        admission = entry_data["admission"]
+        device.admission = await admission.acquire(device)
+        device.bridge_tts = True
+
+        apply_pipeline_event(device, _intent_end("好的"))
+        device.tts.cancel()
+        await asyncio.sleep(0.01)
+        assert admission.stats()["active"] == 0
+
+    asyncio.run(run())
+
+
+def test_stt_end_ends_the_audio_stream():
+    hass = _Hass()
+    entry_data = _entry(hass)
+    device = _connect(hass, entry_data, _Socket(), "c1")
+    device.current_pipeline = object()
+
+    apply_pipeline_event(device, {"type": "stt-end", "data": {}})
+    # 等待意图处理期间空闲检查不会中止会话
+    assert device.stream_ended
+
+
+def test_collect_stats_reads_entry_and_device_components():
+    hass = _Hass()
+    entry_data = _entry(hass)
+    entry_data["tts_cache"] = TtsCache(hass, "unused", memory_budget=1024, disk_budget=0)
+    entry_data["iot_entities"] = IotEntityManager(SimpleNamespace(entry_id="e1"), entry_data["devices"])
+    device = _connect(hass, entry_data, _Socket(), "c1")
+    device.preroll = PrerollBuffer(2)
+    hass.data[DATA_ROUTES] = EntryRoutes()
+    hass.data[DATA_ROUTES].add("e1", entry_data["runtime"])
+
+    samples = {(name, tuple(labels.values())): stats for name, labels, stats in collect_stats(hass)}
+    assert samples[("pipelines", ("e1",))]["warmups"] == 0
+    assert samples[("audio_queue", ("e1", "d1"))]["depth"] == 0
+    assert samples[("log", ("e1",))]["suppressed"] == 0
+    assert samples[("intent_fast_path", ("e1",))]["hits"] == 0
+    assert samples[("routing", ())]["entries"] == 1
+    assert samples[("preroll", ("e1", "d1"))]["capacity"] == 2
+    assert samples[("admission", ("e1",))]["active"] == 0
+    assert samples[("lane", ("e1", "d1"))]["cancelled"] == 0
+
+    # 消息路由的处理统计按消息类型输出
+    MESSAGE_ROUTER.get("ping").observe(0.001)
+    samples = {(name, tuple(labels.values())): stats for name, labels, stats in collect_stats(hass)}
+    assert samples[("dispatch", ("ping",))]["count"] >= 1
+    assert samples[("heartbeat", ("e1",))]["pings"] == 0
+    assert samples[("entity_resolver", ("e1",))]["builds"] == 0
+    assert samples[("iot_entities", ("e1",))]["entities"] == 0
+    assert samples[("iot", ("e1", "d1"))]["updates"] == 0
+    assert samples[("iot_descriptors", ("e1",))]["unique"] == 0
+    assert samples[("registry", ("e1",))]["devices"] == 1
+    assert samples[("transcoder", ("e1", "d1"))]["frames"] == 0
+    assert samples[("tts_cache", ("e1",))]["misses"] == 0
+    assert samples[("tts", ("e1", "d1"))]["streams"] == 0
+    assert samples[("events", ("e1", "d1"))]["events"] == 0